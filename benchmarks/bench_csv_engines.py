@@ -0,0 +1,48 @@
+"""Compare CSV import paths on a large synthetic catalog.
+
+Usage::
+
+    python -m benchmarks.bench_csv_engines [rows]
+
+``legacy`` is the original ``pd.read_csv(path)`` + normalisation with type
+inference; ``pandas`` and ``pyarrow`` are the two engines of
+``csv_handler.import_csv``, both with every column pinned to text.
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.bench_formats import make_catalog
+from core import csv_handler
+
+
+def _legacy_import(path: Path) -> pd.DataFrame:
+    return csv_handler._normalise_dataframe(pd.read_csv(path))  # pylint: disable=protected-access
+
+
+def main(rows: int = 1_000_000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "catalog.csv"
+        csv_handler.export_csv(make_catalog(rows), path)
+        print(f"{rows} rows, {path.stat().st_size / 1_000_000:.1f} MB")
+
+        timings = {}
+        for label, fn in (
+            ("legacy", _legacy_import),
+            ("pandas", lambda p: csv_handler.import_csv(p, engine="pandas")),
+            ("pyarrow", lambda p: csv_handler.import_csv(p, engine="pyarrow")),
+        ):
+            start = time.perf_counter()
+            df = fn(path)
+            timings[label] = time.perf_counter() - start
+            assert len(df) == rows
+            print(f"{label:<10}{timings[label]:>8.2f} s  ({timings['legacy'] / timings[label]:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
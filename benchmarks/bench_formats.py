@@ -0,0 +1,54 @@
+"""Compare load time and file size of CSV, Parquet and Feather catalogs.
+
+Usage::
+
+    python -m benchmarks.bench_formats [rows]
+
+A synthetic catalog of Georgian product names and descriptions (1M rows by
+default) is written in every supported format to a temporary directory and
+then re-imported through ``core.csv_handler``.
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from core import csv_handler
+
+_WORDS = ["ხელნაკეთი", "ბუნებრივი", "ქართული", "ღვინო", "ჩაი", "თაფლი", "ყველი", "ტყავის", "ჩანთა", "სუნამო"]
+
+
+def make_catalog(rows: int) -> pd.DataFrame:
+    names = [f"{_WORDS[i % 10]} {_WORDS[(i // 10) % 10]} #{i % 5000}" for i in range(rows)]
+    descriptions = [" ".join(_WORDS[(i + k) % 10] for k in range(8)) for i in range(rows)]
+    return pd.DataFrame({"name": names, "description": descriptions, "ad": [""] * rows})
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(rows: int = 1_000_000) -> None:
+    df = make_catalog(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"in memory: {csv_handler.memory_usage(df.astype(object)) / 1_000_000:.1f} MB as objects, "
+              f"{csv_handler.memory_usage(csv_handler.compact_strings(df)) / 1_000_000:.1f} MB compacted")
+        print(f"{'format':<10}{'size MB':>10}{'write s':>10}{'load s':>10}{'load name s':>13}")
+        for suffix in (".csv", ".parquet", ".feather"):
+            path = Path(tmp) / f"catalog{suffix}"
+            _, write_s = _timed(csv_handler.export_table, df, path)
+            loaded, load_s = _timed(csv_handler.import_table, path)
+            _, proj_s = _timed(csv_handler.import_table, path, ["name"])
+            assert len(loaded) == rows
+            size_mb = path.stat().st_size / 1_000_000
+            print(f"{suffix[1:]:<10}{size_mb:>10.1f}{write_s:>10.2f}{load_s:>10.2f}{proj_s:>13.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,85 @@
+"""Measure application cold start under the offscreen Qt platform.
+
+Usage::
+
+    python -m benchmarks.bench_startup [--runs N] [--max-seconds S]
+
+Each run starts a fresh interpreter, imports ``gui.qt_main_window``, builds
+and shows the main window and waits for its first paint. The script reports
+import time and time-to-first-paint (median over runs), and fails with exit
+status 1 when the median first paint exceeds ``--max-seconds`` or when pandas
+or openai were imported before the window appeared.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("pandas", "openai")
+
+_PROBE = r"""
+import json, os, sys, time
+start = time.perf_counter()
+from PySide6.QtCore import QEvent, QObject
+from PySide6.QtWidgets import QApplication
+from gui import qt_main_window
+imported = time.perf_counter()
+
+class _FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            print(json.dumps({
+                "import_s": imported - start,
+                "first_paint_s": time.perf_counter() - start,
+                "heavy_loaded": [m for m in %r if m in sys.modules],
+            }), flush=True)
+            os._exit(0)
+        return False
+
+app = QApplication(sys.argv)
+window = qt_main_window.MainWindow()
+watcher = _FirstPaint()
+window.installEventFilter(watcher)
+window.show()
+app.exec()
+""" % (HEAVY_MODULES,)
+
+
+def _run_once() -> dict:
+    with tempfile.TemporaryDirectory() as cfg:
+        env = dict(os.environ, QT_QPA_PLATFORM="offscreen", XDG_CONFIG_HOME=cfg, PYTHONPATH=str(ROOT))
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120, check=True
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=0.75)
+    args = parser.parse_args(argv)
+
+    results = [_run_once() for _ in range(args.runs)]
+    import_s = statistics.median(r["import_s"] for r in results)
+    paint_s = statistics.median(r["first_paint_s"] for r in results)
+    heavy = sorted({m for r in results for m in r["heavy_loaded"]})
+    print(f"import gui.qt_main_window: {import_s:.3f} s (median of {args.runs})")
+    print(f"time to first paint:       {paint_s:.3f} s (budget {args.max_seconds:.2f} s)")
+    print(f"heavy modules before paint: {', '.join(heavy) or 'none'}")
+
+    if heavy or paint_s > args.max_seconds:
+        print("FAIL: start-up budget exceeded", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
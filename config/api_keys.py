@@ -1,16 +1,26 @@
 """API key storage and validation utilities."""
 from __future__ import annotations
 
+import hashlib
 import os
-from typing import Optional
-
-from openai import OpenAI
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Sequence, Tuple
 
 from . import settings
 
 _SECTION = "openai"
 _KEY = "api_key"
 
+DEFAULT_MODELS: Tuple[str, ...] = (
+    "gpt-3.5-turbo",
+    "gpt-3.5-turbo-16k",
+    "gpt-4o-mini",
+    "gpt-4o",
+)
+
 
 def save_api_key(key: str) -> None:
     """Persist the OpenAI API key to the settings file."""
@@ -27,12 +37,152 @@ def load_api_key() -> Optional[str]:
     return config.get(_KEY)
 
 
-def validate_api_key(key: str) -> bool:
-    """Check if the provided OpenAI key is valid by making a lightweight request."""
+@dataclass(frozen=True)
+class KeyInfo:
+    """Outcome of probing an API key."""
+
+    valid: bool
+    models: Tuple[str, ...] = ()
+    rpm: Optional[int] = None  # requests per minute, when the API reports it
+    tpm: Optional[int] = None  # tokens per minute, when the API reports it
+    limits_model: Optional[str] = None  # the model rpm/tpm were reported for
+    error: Optional[str] = None
+    checked_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def reached(self) -> bool:
+        """False when the API could not be reached, so nothing is known about the key."""
+        return self.checked_at != float("-inf")
+
+
+KEY_CACHE_TTL = 15 * 60.0
+_cache: Dict[str, KeyInfo] = {}
+_cache_lock = threading.Lock()
+
+
+def _key_hash(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _probe(key: str, models: Sequence[str]) -> KeyInfo:
+    """Ask for each candidate model by id instead of downloading the full list."""
+    import openai  # imported on first use to keep start-up fast
+
+    client = openai.OpenAI(api_key=key, max_retries=0, timeout=10.0)
+
+    def _retrieve(model: str):
+        try:
+            return model, client.models.with_raw_response.retrieve(model)
+        except (openai.NotFoundError, openai.PermissionDeniedError):
+            return model, None  # key works but cannot use this model
+
     try:
-        # NOTE: Listing models is an inexpensive way to test the key.
-        client = OpenAI(api_key=key)
-        _ = client.models.list()
-        return True
+        with ThreadPoolExecutor(max_workers=max(1, len(models))) as pool:
+            responses = list(pool.map(_retrieve, models))
+    except openai.AuthenticationError as exc:
+        return KeyInfo(valid=False, error=str(exc))
+    except Exception as exc:  # pylint: disable=broad-except
+        # Network problems say nothing about the key; report but do not cache.
+        return KeyInfo(valid=False, error=f"{type(exc).__name__}: {exc}", checked_at=float("-inf"))
+
+    accessible = tuple(model for model, raw in responses if raw is not None)
+    rpm = tpm = None
+    if accessible:
+        rpm, tpm = _probe_limits(client, accessible[0])
+    return KeyInfo(
+        valid=True,
+        models=accessible,
+        rpm=rpm,
+        tpm=tpm,
+        limits_model=accessible[0] if rpm or tpm else None,
+    )
+
+
+def _probe_limits(client, model: str) -> Tuple[Optional[int], Optional[int]]:
+    """Read *model*'s rate limits from a one-token completion.
+
+    Only completions carry the ``x-ratelimit-*`` headers; ``models.retrieve``
+    does not. The request costs a handful of tokens, and any failure just
+    leaves the limits unknown.
+    """
+    try:
+        raw = client.chat.completions.with_raw_response.create(
+            model=model, messages=[{"role": "user", "content": "ok"}], max_tokens=1
+        )
     except Exception:  # pylint: disable=broad-except
-        return False
+        return None, None
+    return _header_int(raw.headers, "x-ratelimit-limit-requests"), _header_int(raw.headers, "x-ratelimit-limit-tokens")
+
+
+def check_api_key(key: str, models: Sequence[str] = DEFAULT_MODELS, *, ttl: float = KEY_CACHE_TTL) -> KeyInfo:
+    """Return a (possibly cached) :class:`KeyInfo` for *key*.
+
+    Verdicts are cached in memory for *ttl* seconds under a SHA-256 of the
+    key, so the key itself is never kept as a cache key.
+    """
+    digest = _key_hash(key)
+    with _cache_lock:
+        cached = _cache.get(digest)
+    if cached is not None and time.monotonic() - cached.checked_at < ttl:
+        return cached
+    info = _probe(key, models)
+    if info.reached:
+        with _cache_lock:
+            _cache[digest] = info
+    return info
+
+
+def store_checked_key(key: str, info: KeyInfo) -> str:
+    """Save *key* with what probing it found, and return a status line for the UI.
+
+    Use it for valid keys and for keys the API could not be reached to check
+    (``not info.reached``). In the latter case the models and limits are
+    unknown and stored empty, and every model stays usable.
+    """
+    save_api_key(key)
+    settings.write_settings(
+        {
+            "api_saved": True,
+            "models": ",".join(info.models),
+            "rpm": info.rpm or 0,
+            "tpm": info.tpm or 0,
+            "limits_model": info.limits_model or "",
+        },
+        section=_SECTION,
+    )
+    if not info.valid:
+        return f"API key saved, not verified: {info.error}"
+    if info.limits_model is None:
+        return "API key saved; rate limits not reported, generation is not throttled"
+    limits = ", ".join(
+        f"{value:,} {unit}/min" for value, unit in ((info.rpm, "requests"), (info.tpm, "tokens")) if value
+    )
+    return f"API key saved; {info.limits_model}: {limits}"
+
+
+def check_api_key_async(
+    key: str,
+    on_done: Callable[[KeyInfo], None],
+    models: Sequence[str] = DEFAULT_MODELS,
+) -> threading.Thread:
+    """Run :func:`check_api_key` on a daemon thread and pass the result to *on_done*.
+
+    *on_done* is called on that worker thread; GUI callers must hand the
+    result over to their own thread.
+    """
+    thread = threading.Thread(target=lambda: on_done(check_api_key(key, models)), daemon=True)
+    thread.start()
+    return thread
+
+
+def validate_api_key(key: str) -> bool:
+    """Check if the provided OpenAI key is valid (blocking, cached)."""
+    return check_api_key(key).valid
@@ -1,18 +1,29 @@
 """Configuration management utilities.
 Responsible for locating the user configuration directory and reading/writing
 application-specific settings such as window size, last used tone, etc.
+
+Parsed settings are kept in memory and only re-read when ``settings.ini``
+changes on disk, so reading a value costs a ``stat`` rather than a parse.
+Writes update the in-memory copy immediately and are flushed to disk shortly
+afterwards (and at exit) through a temporary file and an atomic rename.
 """
 
 from __future__ import annotations
 
+import atexit
 import configparser
 import os
+import tempfile
+import threading
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 
 APP_NAME = "ქართული კუთხე"
 CONFIG_FILE_NAME = "settings.ini"
 DEFAULT_SECTION = "general"
+WRITE_DELAY = 0.5  # seconds to wait for further writes before flushing
+
+_created_dirs: Dict[Path, Path] = {}
 
 
 def _get_config_dir() -> Path:
@@ -23,8 +34,11 @@ def _get_config_dir() -> Path:
         base = Path(xdg_config_home)
     else:
         base = Path.home() / ".config"
-    cfg_dir = base / APP_NAME
-    cfg_dir.mkdir(parents=True, exist_ok=True)
+    cfg_dir = _created_dirs.get(base)
+    if cfg_dir is None:
+        cfg_dir = base / APP_NAME
+        cfg_dir.mkdir(parents=True, exist_ok=True)
+        _created_dirs[base] = cfg_dir
     return cfg_dir
 
 
@@ -32,30 +46,111 @@ def _get_config_path() -> Path:
     return _get_config_dir() / CONFIG_FILE_NAME
 
 
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _SettingsStore:
+    """In-memory copy of ``settings.ini`` with debounced, atomic writes."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._path: Optional[Path] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._parser = configparser.ConfigParser()
+        self._pending: Dict[str, Dict[str, str]] = {}
+        self._timer: Optional[threading.Timer] = None
+
+    def read(self, section: str) -> Dict[str, str]:
+        with self._lock:
+            self._refresh()
+            return dict(self._parser[section]) if self._parser.has_section(section) else {}
+
+    def write(self, data: Dict[str, Any], section: str) -> None:
+        with self._lock:
+            self._refresh()
+            values = {key: str(value) for key, value in data.items()}
+            self._apply(self._parser, {section: values})
+            self._pending.setdefault(section, {}).update(values)
+            if self._timer is None:
+                self._timer = threading.Timer(WRITE_DELAY, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Write pending changes to disk now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            path = self._path or _get_config_path()
+            # Merge into the file as it is now, in case another process changed it.
+            parser = configparser.ConfigParser()
+            if path.exists():
+                parser.read(path, encoding="utf-8")
+            self._apply(parser, self._pending)
+            fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                    parser.write(fp)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self._parser, self._path = parser, path
+            self._signature = _file_signature(path)
+            self._pending = {}
+
+    def _refresh(self) -> None:
+        path = _get_config_path()
+        signature = _file_signature(path)
+        if path == self._path and signature == self._signature:
+            return
+        if self._path is not None and path != self._path:
+            self.flush()  # the config location moved; finish writing the old one
+        parser = configparser.ConfigParser()
+        if signature is not None:
+            parser.read(path, encoding="utf-8")
+        # Unflushed writes win over whatever is on disk.
+        self._apply(parser, self._pending)
+        self._parser, self._path, self._signature = parser, path, signature
+
+    @staticmethod
+    def _apply(parser: configparser.ConfigParser, changes: Dict[str, Dict[str, str]]) -> None:
+        for section, values in changes.items():
+            if not parser.has_section(section):
+                parser.add_section(section)
+            for key, value in values.items():
+                parser.set(section, key, value)
+
+
+_store = _SettingsStore()
+atexit.register(_store.flush)
+
+
 def read_settings(section: str = DEFAULT_SECTION) -> Dict[str, str]:
     """Read settings from the given section.
 
     Returns an empty dict if no settings exist yet.
     """
-    cfg_path = _get_config_path()
-    parser = configparser.ConfigParser()
-    if cfg_path.exists():
-        parser.read(cfg_path)
-    return dict(parser[section]) if parser.has_section(section) else {}
+    return _store.read(section)
 
 
 def write_settings(data: Dict[str, Any], section: str = DEFAULT_SECTION) -> None:
-    """Persist provided key/value pairs to the configuration file."""
-    cfg_path = _get_config_path()
-    parser = configparser.ConfigParser()
-    if cfg_path.exists():
-        parser.read(cfg_path)
+    """Persist provided key/value pairs to the configuration file.
 
-    if not parser.has_section(section):
-        parser.add_section(section)
+    The change is visible to :func:`read_settings` at once; the file itself is
+    written after :data:`WRITE_DELAY` seconds or on :func:`flush_settings`.
+    """
+    _store.write(data, section)
 
-    for key, value in data.items():
-        parser.set(section, key, str(value))
 
-    with cfg_path.open("w") as fp:
-        parser.write(fp)
+def flush_settings() -> None:
+    """Write any pending settings changes to disk immediately."""
+    _store.flush()
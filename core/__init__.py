@@ -1,4 +1,14 @@
 # Tako Georgian Ads Generator core package
 
-from . import csv_handler  # noqa: F401
-from . import ad_generator  # noqa: F401
+# Submodules are imported on first access (``core.csv_handler`` or
+# ``from core import csv_handler``) so that importing the package stays cheap.
+
+import importlib
+
+_SUBMODULES = ("csv_handler", "ad_generator", "job_manifest", "near_dup", "runner", "cache", "pipeline", "service", "watch", "shard", "cli")
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,5 @@
+"""Allow ``python -m core`` to run the headless command-line interface."""
+
+from core.cli import main
+
+raise SystemExit(main())
@@ -1,48 +1,212 @@
 """OpenAI-powered advertisement generation utilities."""
 from __future__ import annotations
 
-from typing import Iterable, List, Tuple
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Tuple, Union
 
 import asyncio
-from openai import OpenAI
 
 from config import api_keys
 from utils.async_utils import gather_with_concurrency
+from utils.quality import QualityError, QualityGate
+from utils.validation import pending_mask
 from prompts.base_prompts import BASE_PROMPT
 from prompts.tone_prompts import TONES
 
-__all__ = ["generate_batch"]
+if TYPE_CHECKING:
+    import pandas as pd
 
+    from utils.rate_limit import RateLimiter
 
-def _build_prompt(name: str, description: str, tone: str) -> str:
+__all__ = [
+    "generate_batch",
+    "generate_chunks",
+    "resolve_api_key",
+    "build_prompt",
+    "estimate_tokens",
+    "AdResult",
+    "BatchUsage",
+    "OpenAIBackend",
+    "MockBackend",
+    "make_backend",
+]
+
+SYSTEM_PROMPT = "შენ ხარ ქართველი მარკეტინგის ასისტენტი და კოპირაიტერი."
+
+
+@dataclass(frozen=True)
+class AdResult:
+    """Generated advertisement plus what it cost."""
+
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+@dataclass
+class BatchUsage:
+    """Requests and tokens spent by :func:`generate_batch`, quality retries included."""
+
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retried: int = 0  # requests re-sent after the quality gate rejected an ad
+    retry_tokens: int = 0  # tokens those re-sent requests cost
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, result: AdResult, *, retry: bool = False) -> None:
+        self.requests += 1
+        self.prompt_tokens += result.prompt_tokens
+        self.completion_tokens += result.completion_tokens
+        if retry:
+            self.retried += 1
+            self.retry_tokens += result.total_tokens
+
+
+def build_prompt(name: str, description: str, tone: str) -> str:
     """Return a fully formatted prompt string in Georgian."""
     tone_descriptor = TONES.get(tone, tone)
     return BASE_PROMPT.format(name=name, description=description, tone=tone_descriptor)
 
 
-async def _generate_single(name: str, description: str, tone: str, *, max_tokens: int, temperature: float, model: str) -> str:
-    """Asynchronously call OpenAI chat completion and return advertisement text."""
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Rough upper bound of the tokens a request counts against the TPM limit.
 
-    prompt = _build_prompt(name, description, tone)
+    Georgian script takes about one token per two characters with the GPT
+    tokenizers; OpenAI also counts *max_tokens* up front. Rate limiters settle
+    the difference once the real usage is known.
+    """
+    return (len(SYSTEM_PROMPT) + len(prompt)) // 2 + max_tokens
 
-    # Use `asyncio.to_thread` because client.chat.completions.create is blocking.
-    def _call_api() -> str:
-        client = OpenAI(api_key=api_keys.load_api_key())
-        response = client.chat.completions.create(
-            model=model,
+
+def resolve_api_key(api_key: Optional[str] = None) -> Optional[str]:
+    """Return *api_key*, or the configured key if none was given.
+
+    Callers resolve the key once per job and pass it down, so the settings
+    are not consulted for every request.
+    """
+    return api_key or api_keys.load_api_key()
+
+
+@lru_cache(maxsize=4)
+def _client(api_key: Optional[str]):
+    from openai import OpenAI  # imported on first use to keep start-up fast
+
+    # One client per key so its connection pool is reused across requests.
+    return OpenAI(api_key=api_key)
+
+
+class OpenAIBackend:
+    """Blocking chat-completion calls with fixed model and sampling parameters."""
+
+    def __init__(self, api_key: Optional[str] = None, *, model: str, max_tokens: int, temperature: float):
+        self.api_key = resolve_api_key(api_key)
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    def complete(self, prompt: str) -> AdResult:
+        start = time.perf_counter()
+        response = _client(self.api_key).chat.completions.create(
+            model=self.model,
             messages=[
-                {
-                    "role": "system",
-                    "content": "შენ ხარ ქართველი მარკეტინგის ასისტენტი და კოპირაიტერი.",
-                },
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
-            temperature=temperature,
-            max_tokens=max_tokens,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+        )
+        usage = response.usage
+        return AdResult(
+            text=response.choices[0].message.content.strip(),
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            latency=time.perf_counter() - start,
+        )
+
+
+class MockBackend:
+    """Offline stand-in for :class:`OpenAIBackend` used for dry runs and local testing.
+
+    Returns a deterministic placeholder ad after *delay* seconds without
+    touching the network.
+    """
+
+    def __init__(self, delay: float = 0.0, *, max_tokens: int = 200, **_ignored):
+        self.delay = delay
+        self.max_tokens = max_tokens
+        self.calls = 0
+
+    def complete(self, prompt: str) -> AdResult:
+        start = time.perf_counter()
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        product = prompt.split("'")[1] if prompt.count("'") >= 2 else prompt[:40]
+        text = f"{product} — საუკეთესო არჩევანი დღესვე!"
+        return AdResult(
+            text=text,
+            prompt_tokens=(len(SYSTEM_PROMPT) + len(prompt)) // 2,
+            completion_tokens=min(len(text) // 2, self.max_tokens),
+            latency=time.perf_counter() - start,
         )
-        return response.choices[0].message.content.strip()
 
-    return await asyncio.to_thread(_call_api)
+
+def make_backend(
+    kind: str = "openai",
+    *,
+    model: str,
+    max_tokens: int,
+    temperature: float,
+    api_key: Optional[str] = None,
+    mock_delay: float = 0.05,
+):
+    """Create an :class:`OpenAIBackend` or, with ``kind="mock"``, a :class:`MockBackend`.
+
+    All arguments are plain values, so a backend description can be handed to
+    a worker process and the backend built there.
+    """
+    if kind == "mock":
+        return MockBackend(mock_delay, max_tokens=max_tokens)
+    if kind != "openai":
+        raise ValueError(f"Unknown backend: {kind}")
+    return OpenAIBackend(api_key, model=model, max_tokens=max_tokens, temperature=temperature)
+
+
+async def _generate_single(
+    name: str,
+    description: str,
+    tone: str,
+    *,
+    max_tokens: int,
+    temperature: float,
+    model: str,
+    api_key: Optional[str],
+    limiter: Optional["RateLimiter"] = None,
+) -> AdResult:
+    """Asynchronously call OpenAI chat completion and return the advertisement."""
+
+    prompt = build_prompt(name, description, tone)
+    backend = OpenAIBackend(api_key, model=model, max_tokens=max_tokens, temperature=temperature)
+    estimate = estimate_tokens(prompt, max_tokens)
+    if limiter is not None:
+        await limiter.wait(estimate)
+
+    # Use `asyncio.to_thread` because client.chat.completions.create is blocking.
+    result = await asyncio.to_thread(backend.complete, prompt)
+    if limiter is not None and result.total_tokens:
+        limiter.settle(estimate, result.total_tokens)
+    return result
 
 
 def generate_batch(
@@ -53,7 +217,12 @@ def generate_batch(
     temperature: float,
     model: str,
     concurrency: int = 3,
-) -> List[str]: 
+    api_key: Optional[str] = None,
+    quality: Optional[QualityGate] = None,
+    retries: int = 2,
+    limiter: Optional["RateLimiter"] = None,
+    usage: Optional[BatchUsage] = None,
+) -> List[Union[str, QualityError]]:
     """Generate advertisement texts for a batch of *data_pairs*.
 
     Parameters
@@ -64,8 +233,92 @@ def generate_batch(
         Tone keyword present in ``prompts.tone_prompts.TONES``.
     concurrency : int, optional
         Maximum number of concurrent OpenAI requests, by default 3.
+    api_key : str, optional
+        Key to use for every request; resolved from the settings once per
+        batch when omitted. Pass it explicitly when calling in a loop.
+    quality : QualityGate, optional
+        Checks the batch's ads together; rejected ones are requested again
+        up to *retries* times, and a :class:`~utils.quality.QualityError`
+        takes the place of any that never pass.
+    limiter : RateLimiter, optional
+        Requests-per-minute and tokens-per-minute limit every request waits
+        for; share one across batches to keep a whole job under the quota.
+    usage : BatchUsage, optional
+        Receives the requests and tokens spent, quality retries counted
+        separately; share one across batches for a job total.
     """
 
-    coroutines = [_generate_single(name, description, tone, max_tokens=max_tokens, temperature=temperature, model=model)
-                  for name, description in data_pairs]
-    return gather_with_concurrency(concurrency, coroutines)
+    api_key = resolve_api_key(api_key)
+    pairs = list(data_pairs)
+
+    def _run(indices: List[int], *, retry: bool = False) -> List[str]:
+        coroutines = [
+            _generate_single(
+                *pairs[i],
+                tone,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                model=model,
+                api_key=api_key,
+                limiter=limiter,
+            )
+            for i in indices
+        ]
+        results = gather_with_concurrency(concurrency, coroutines)
+        if usage is not None:
+            for result in results:
+                usage.add(result, retry=retry)
+        return [result.text for result in results]
+
+    results: List[Union[str, QualityError]] = list(_run(list(range(len(pairs)))))
+    if quality is None:
+        return results
+    pending = list(range(len(pairs)))
+    for attempt in range(retries + 1):
+        verdict = quality.check(
+            [results[i] for i in pending], [pairs[i][0] for i in pending], [pairs[i][1] for i in pending]
+        )
+        pending = [i for i, reason in zip(pending, verdict) if reason]
+        if not pending:
+            break
+        if attempt == retries:
+            for i, reason in zip(pending, verdict[verdict != ""]):
+                results[i] = QualityError(reason)
+            break
+        for i, text in zip(pending, _run(pending, retry=True)):
+            results[i] = text
+    return results
+
+
+def generate_chunks(
+    chunks: Iterable[pd.DataFrame],
+    tone: str,
+    *,
+    max_tokens: int,
+    temperature: float,
+    model: str,
+    concurrency: int = 3,
+    api_key: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """Fill the ``ad`` column of each chunk from ``csv_handler.iter_csv_chunks``.
+
+    Chunks are processed one at a time, so memory stays bounded by the chunk
+    size. Rows whose ad is already present, or whose name or description is
+    empty, are passed through untouched.
+    """
+    api_key = resolve_api_key(api_key)
+    for chunk in chunks:
+        todo = chunk[pending_mask(chunk)]
+        if len(todo):
+            results = generate_batch(
+                list(zip(todo["name"], todo["description"])),
+                tone,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                model=model,
+                concurrency=concurrency,
+                api_key=api_key,
+            )
+            chunk = chunk.copy()
+            chunk.loc[todo.index, "ad"] = results
+        yield chunk
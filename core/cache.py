@@ -0,0 +1,338 @@
+"""Persistent cache of generated advertisements.
+
+Responses are stored under the same content hash the job manifest uses
+(:func:`core.job_manifest.row_key`): product name, description, tone, model and
+sampling parameters. Any front end that produces the same request again gets
+the stored ad and its token usage back without calling the API.
+
+A small in-memory LRU sits in front of the SQLite table so hot entries do not
+touch the database at all.
+
+With a *fuzzy_threshold* the cache also answers requests that differ from a
+stored one only by punctuation, whitespace, casing or small edits. Entries
+stored with their request text are indexed per *scope* (tone, model and
+parameters, see :func:`cache_scope`) by MinHash signatures of the normalized
+text (:class:`core.near_dup.NearDuplicateIndex`); each candidate is confirmed
+by the cosine similarity of the two texts' character trigram counts. Texts
+whose numbers differ (sizes, volumes, prices) never match. Every fuzzy hit is
+logged so it can be audited with :meth:`ResponseCache.fuzzy_audit`.
+
+:func:`import_ads` seeds the cache with ads from earlier exports, so a catalog
+that overlaps with old ones is filled without calling the API.
+"""
+from __future__ import annotations
+
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from config import settings
+from core import csv_handler
+from core.ad_generator import AdResult
+from core.job_manifest import row_key
+from core.near_dup import NearDuplicateIndex, normalize_text
+from utils.quality import QualityGate
+from utils.validation import filled_mask
+
+__all__ = ["ResponseCache", "cache_scope", "default_cache_path", "import_ads", "text_similarity"]
+
+_NGRAM = 3
+_NUMBER = re.compile(r"\d+")
+_ERROR_PREFIX = "Error:"  # what the GUIs write into the ad cell of a failed row
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS requests (
+    key TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_scope ON requests (scope);
+CREATE TABLE IF NOT EXISTS fuzzy_hits (
+    created REAL NOT NULL,
+    key TEXT NOT NULL,
+    matched_key TEXT NOT NULL,
+    similarity REAL NOT NULL,
+    text TEXT NOT NULL,
+    matched_text TEXT NOT NULL
+);
+"""
+
+
+def default_cache_path() -> Path:
+    """Return the cache location inside the user configuration directory."""
+    return settings._get_config_dir() / "responses.sqlite"  # pylint: disable=protected-access
+
+
+def cache_scope(tone: str, model: str, params: Mapping[str, Any]) -> str:
+    """Everything but the product text that a cached ad depends on; fuzzy matches stay within one scope."""
+    return json.dumps([tone, model, dict(params)], ensure_ascii=False, sort_keys=True)
+
+
+def text_similarity(a: str, b: str) -> float:
+    """Cosine similarity of the character trigram counts of two normalized texts."""
+    va, vb = _ngrams(a), _ngrams(b)
+    dot = sum(count * vb[gram] for gram, count in va.items() if gram in vb)
+    norm = math.sqrt(sum(c * c for c in va.values()) * sum(c * c for c in vb.values()))
+    return dot / norm if norm else 0.0
+
+
+def _ngrams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i : i + _NGRAM] for i in range(max(1, len(padded) - _NGRAM + 1)))
+
+
+class ResponseCache:
+    """Thread-safe key → :class:`~core.ad_generator.AdResult` store.
+
+    *fuzzy_threshold* (0–1) enables similarity lookups in :meth:`lookup`;
+    ``None`` keeps the cache exact.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        *,
+        memory_items: int = 10_000,
+        fuzzy_threshold: Optional[float] = None,
+    ):
+        if fuzzy_threshold is not None and not 0 < fuzzy_threshold <= 1:
+            raise ValueError("fuzzy_threshold must be in (0, 1]")
+        self.path = Path(path) if path is not None else default_cache_path()
+        self.fuzzy_threshold = fuzzy_threshold
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, AdResult]" = OrderedDict()
+        self._memory_items = memory_items
+        self._indexes: Dict[str, Tuple[NearDuplicateIndex, List[str]]] = {}  # scope -> index, cluster keys
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def get(self, key: str) -> Optional[AdResult]:
+        """Return the cached result for *key*, or ``None``."""
+        with self._lock:
+            result = self._get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def lookup(self, key: str, text: str, scope: str) -> Tuple[Optional[AdResult], Optional[float]]:
+        """Return ``(result, similarity)`` for a request, falling back to a fuzzy match.
+
+        *text* is the request's product text and *scope* its
+        :func:`cache_scope`. The similarity is only set for fuzzy hits.
+        """
+        with self._lock:
+            result = self._get(key)
+            if result is not None:
+                self.hits += 1
+                return result, None
+            if self.fuzzy_threshold is not None:
+                normalized = normalize_text(text)
+                match = self._nearest(normalized, scope)
+                if match is not None:
+                    matched_key, matched_text, similarity = match
+                    result = self._get(matched_key)
+                    if result is not None:
+                        self.fuzzy_hits += 1
+                        with self._conn:
+                            self._conn.execute(
+                                "INSERT INTO fuzzy_hits (created, key, matched_key, similarity, text, matched_text) "
+                                "VALUES (?, ?, ?, ?, ?, ?)",
+                                (time.time(), key, matched_key, similarity, normalized, matched_text),
+                            )
+                        return result, similarity
+            self.misses += 1
+            return None, None
+
+    def put(self, key: str, result: AdResult, *, text: Optional[str] = None, scope: Optional[str] = None) -> None:
+        """Store *result*; with *text* and *scope* the entry can also be found by :meth:`lookup`."""
+        self.put_many([(key, result, text, scope)])
+
+    def put_many(
+        self, entries: List[Tuple[str, AdResult, Optional[str], Optional[str]]], *, replace: bool = True
+    ) -> int:
+        """Store ``(key, result, text, scope)`` entries in one transaction; return how many were stored.
+
+        Without *replace*, entries whose key is already cached are left alone.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            if not replace:
+                entries = [entry for entry in entries if not self._has(entry[0])]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, text, prompt_tokens, completion_tokens, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(key, result.text, result.prompt_tokens, result.completion_tokens, now) for key, result, _t, _s in entries],
+            )
+            requests = [
+                (key, scope, normalize_text(text))
+                for key, _result, text, scope in entries
+                if text is not None and scope is not None
+            ]
+            # A replaced key keeps its request row, so only new rows are indexed.
+            requests = [
+                request
+                for request in requests
+                if self._conn.execute("INSERT OR IGNORE INTO requests (key, scope, text) VALUES (?, ?, ?)", request).rowcount
+            ]
+            for key, result, _text, _scope in entries:
+                self._remember(key, result)
+            for key, scope, normalized in requests:
+                if scope in self._indexes:
+                    index, keys = self._indexes[scope]
+                    index.add([normalized])
+                    keys.append(key)
+        return len(entries)
+
+    @property
+    def index_evictions(self) -> int:
+        """Entries the similarity indexes evicted from full buckets; such entries are harder to find."""
+        with self._lock:
+            return sum(index.evicted for index, _keys in self._indexes.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, hit counters and hit rates since this cache was opened."""
+        lookups = self.hits + self.fuzzy_hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.fuzzy_hits) / lookups if lookups else 0.0,
+            "fuzzy_hit_rate": self.fuzzy_hits / lookups if lookups else 0.0,
+            "index_evictions": self.index_evictions,
+        }
+
+    def fuzzy_audit(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """The most recent fuzzy hits, newest first, with both texts and their similarity."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT h.created, h.similarity, h.text, h.matched_text, r.text FROM fuzzy_hits h "
+                "LEFT JOIN responses r ON r.key = h.matched_key ORDER BY h.created DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            {"created": created, "similarity": similarity, "text": text, "matched_text": matched, "ad": ad}
+            for created, similarity, text, matched, ad in rows
+        ]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._has(key)
+
+    def _has(self, key: str) -> bool:
+        if key in self._memory:
+            return True
+        return self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+
+    def _get(self, key: str) -> Optional[AdResult]:
+        result = self._memory.get(key)
+        if result is None:
+            row = self._conn.execute(
+                "SELECT text, prompt_tokens, completion_tokens FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                result = AdResult(text=row[0], prompt_tokens=row[1], completion_tokens=row[2])
+                self._remember(key, result)
+        else:
+            self._memory.move_to_end(key)
+        return result
+
+    def _nearest(self, normalized: str, scope: str) -> Optional[Tuple[str, str, float]]:
+        """Best stored ``(key, text, similarity)`` in *scope* at or above the threshold."""
+        if scope not in self._indexes:
+            # Signatures are only a prefilter, so they use a looser threshold than the trigram check.
+            index = NearDuplicateIndex(threshold=max(0.3, self.fuzzy_threshold - 0.3))
+            rows = self._conn.execute("SELECT key, text FROM requests WHERE scope = ?", (scope,)).fetchall()
+            index.add([text for _key, text in rows])
+            self._indexes[scope] = (index, [key for key, _text in rows])
+        index, keys = self._indexes[scope]
+        numbers = _NUMBER.findall(normalized)
+        best: Optional[Tuple[str, str, float]] = None
+        for cluster in index.query([normalized])[0]:
+            candidate = index.source(cluster)
+            if _NUMBER.findall(candidate) != numbers:
+                continue
+            similarity = text_similarity(normalized, candidate)
+            if similarity >= self.fuzzy_threshold and (best is None or similarity > best[2]):
+                best = (keys[cluster], candidate, similarity)
+        return best
+
+    def _remember(self, key: str, result: AdResult) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_items:
+            self._memory.popitem(last=False)
+
+
+def import_ads(
+    cache: ResponseCache,
+    sources: Iterable[str | Path],
+    *,
+    tone: str,
+    model: str,
+    params: Mapping[str, Any],
+    replace: bool = False,
+    quality: Optional[QualityGate] = None,
+    chunk_size: int = csv_handler.DEFAULT_CHUNK_SIZE,
+) -> Tuple[int, int, int]:
+    """Load the ``(name, description, ad)`` rows of exported catalogs into *cache*.
+
+    Each ad is stored as the response to the request *tone*, *model* and
+    *params* would make for its product, so ``generate`` and the service find
+    it under the same key. Rows without a name, description or ad are
+    skipped, and so are products already cached unless *replace* is set.
+    Error messages the GUIs left in the ad column, and ads the *quality* gate
+    rejects, are never imported.
+    Returns ``(rows with an ad, rejected, newly cached)``.
+    """
+    scope = cache_scope(tone, model, params)
+    found = rejected = stored = 0
+    for source in sources:
+        for chunk in csv_handler.iter_table_chunks(source, chunk_size):
+            usable = chunk[filled_mask(chunk["name"]) & filled_mask(chunk["description"]) & filled_mask(chunk["ad"])]
+            found += len(usable)
+            ads = usable["ad"].astype("string").str.strip()
+            keep = ~ads.str.startswith(_ERROR_PREFIX).to_numpy(dtype=bool)
+            if quality is not None and keep.any():
+                keep[keep] = (quality.check(ads[keep], usable["name"][keep], usable["description"][keep]) == "").to_numpy()
+            rejected += int((~keep).sum())
+            usable = usable.assign(ad=ads)[keep]
+            entries = [
+                (
+                    row_key(name, description, tone, model, params),
+                    AdResult(text=str(ad).strip()),
+                    f"{name} {description}",
+                    scope,
+                )
+                for name, description, ad in zip(usable["name"], usable["description"], usable["ad"])
+            ]
+            stored += cache.put_many(entries, replace=replace)
+    return found, rejected, stored
@@ -0,0 +1,860 @@
+"""Headless command-line interface, run as ``python -m core <command>``.
+
+Commands
+--------
+generate
+    Stream a CSV, Parquet or Feather catalog through eligibility filtering and
+    ad generation into an output file of the same kind. Input is read and
+    output written one chunk at a time, so memory use does not grow with the
+    size of the catalog. Finished rows are recorded in the job manifest, so an
+    interrupted run picks up where it stopped when started again.
+    ``--pipeline`` generates in several steps (see :mod:`core.pipeline`).
+stream
+    Read product records as JSON Lines from stdin and write one result record
+    per line to stdout as soon as it completes, for use in pipelines.
+serve
+    Run the local HTTP generation service (see :mod:`core.service`).
+watch
+    Process catalogs dropped into a folder (see :mod:`core.watch`).
+shard
+    Multi-node jobs (see :mod:`core.shard`): ``plan`` splits a catalog into a
+    job directory, ``run`` generates shards of it on any number of machines,
+    ``status`` shows their progress and ``merge`` validates and joins them.
+cache
+    ``import`` seeds the response cache with the ads of exported catalogs and
+    ``audit`` lists its recent fuzzy hits (see :mod:`core.cache`).
+
+Defaults for the model and sampling parameters come from the ``openai``
+section of the settings the GUI writes, including the rate limits detected
+when the API key was validated.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, TextIO
+
+from config import api_keys, settings
+from core import ad_generator, csv_handler
+from core.job_manifest import JobManifest
+from core.runner import Counters, TooManyFailures, generate_file, run_stream
+from prompts.tone_prompts import TONES
+from utils.quality import QualityGate, QualityRules
+from utils.rate_limit import RateLimiter
+from utils.validation import row_is_complete
+
+__all__ = ["main", "build_parser", "Progress"]
+
+DEFAULT_CHUNK_SIZE = 1_000
+
+
+class Progress(Counters):
+    """Throughput and ETA line on stderr, redrawn at most every *interval* seconds."""
+
+    def __init__(self, total: Optional[int], stream: TextIO = sys.stderr, interval: float = 1.0):
+        super().__init__()
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self._start = time.monotonic()
+        self._shown = 0.0
+        self._tty = stream.isatty()
+
+    def update(self, *, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._shown < self.interval:
+            return
+        self._shown = now
+        elapsed = max(now - self._start, 1e-9)
+        parts = [f"{self.rows:,}" + (f"/{self.total:,}" if self.total else "") + " rows"]
+        parts.append(f"{self.generated:,} generated")
+        if self.restored:
+            parts.append(f"{self.restored:,} restored")
+        if self.failed:
+            parts.append(f"{self.failed:,} failed")
+        if self.retried:
+            parts.append(f"{self.retried:,} retried ({self.retry_tokens:,} tokens)")
+        if self.rejected:
+            parts.append(f"{self.rejected:,} rejected")
+        if self.reused or self.adapted:
+            parts.append(f"{self.reused + self.adapted:,} reused")
+        if self.cached:
+            parts.append(f"{self.cached:,} cached")
+        parts.append(f"{self.generated / elapsed:.1f} ads/s")
+        if self.total and self.rows:
+            remaining = max(self.total - self.rows, 0) * elapsed / self.rows
+            parts.append(f"ETA {_format_seconds(remaining)}")
+        line = " | ".join(parts)
+        if self._tty:
+            self.stream.write(f"\r\033[K{line}")
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def finish(self) -> None:
+        self.update(force=True)
+        if self._tty:
+            self.stream.write("\n")
+        elapsed = time.monotonic() - self._start
+        self.stream.write(f"done in {_format_seconds(elapsed)}\n")
+        self.stream.flush()
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}"
+
+
+# ---------- shared options ----------
+def _add_generation_options(parser: argparse.ArgumentParser) -> None:
+    _add_model_options(parser)
+    _add_runtime_options(parser)
+
+
+def _add_model_options(parser: argparse.ArgumentParser) -> None:
+    cfg = settings.read_settings("openai")
+    group = parser.add_argument_group("generation")
+    group.add_argument("--tone", default=next(iter(TONES)), help="tone keyword (default: %(default)s)")
+    group.add_argument("--model", default=cfg.get("model", api_keys.DEFAULT_MODELS[0]), help="default: %(default)s")
+    group.add_argument("--max-tokens", type=int, default=int(cfg.get("max_tokens", 200)), help="default: %(default)s")
+    group.add_argument(
+        "--temperature", type=float, default=float(cfg.get("temperature", 0.8)), help="default: %(default)s"
+    )
+
+
+def _add_runtime_options(parser: argparse.ArgumentParser) -> None:
+    cfg = settings.read_settings("openai")
+    group = parser.add_argument_group("execution")
+    group.add_argument("--concurrency", type=int, default=8, help="parallel requests (default: %(default)s)")
+    group.add_argument(
+        "--rpm", type=float, default=_optional_float(cfg.get("rpm")), help="requests per minute limit"
+    )
+    group.add_argument("--tpm", type=float, default=_optional_float(cfg.get("tpm")), help="tokens per minute limit")
+    group.add_argument(
+        "--backend",
+        choices=("openai", "mock"),
+        default="openai",
+        help="'mock' returns placeholder ads without calling the API",
+    )
+    group.add_argument("--mock-delay", type=float, default=0.05, help=argparse.SUPPRESS)
+
+
+def _add_quality_options(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("quality gate")
+    group.add_argument(
+        "--no-quality-gate",
+        action="store_true",
+        help="accept every ad as returned (default: check script, length, sentences, prefixes, duplicates)",
+    )
+    group.add_argument("--retries", type=int, default=2, help="new attempts for rejected ads (default: %(default)s)")
+    group.add_argument("--min-chars", type=int, default=15, help="shortest acceptable ad (default: %(default)s)")
+    group.add_argument(
+        "--max-chars",
+        type=int,
+        default=300,
+        help="channel length limit; --pipeline shortens to it (default: %(default)s)",
+    )
+
+
+def _add_reuse_option(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--reuse-similar",
+        type=float,
+        nargs="?",
+        const=0.6,
+        metavar="THRESHOLD",
+        help="generate once per group of near-identical products (size, colour, SKU variants) "
+        "and adapt that ad for the rest; optional MinHash similarity threshold (default: 0.6)",
+    )
+
+
+def _add_fuzzy_cache_option(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--fuzzy-cache",
+        type=float,
+        nargs="?",
+        const=0.9,
+        metavar="THRESHOLD",
+        help="also answer requests whose name and description differ from a cached one only by "
+        "punctuation, casing or small edits; optional trigram similarity threshold (default: 0.9)",
+    )
+
+
+def _quality_rules(args: argparse.Namespace) -> Optional[QualityRules]:
+    if args.no_quality_gate:
+        return None
+    return QualityRules(min_chars=args.min_chars, max_chars=args.max_chars)
+
+
+def _optional_float(value: Optional[str]) -> Optional[float]:
+    return float(value) if value else None
+
+
+def _backend_options(args: argparse.Namespace) -> Dict[str, object]:
+    """Keyword arguments for :func:`core.ad_generator.make_backend`, minus the model settings."""
+    options: Dict[str, object] = {"kind": args.backend, "mock_delay": args.mock_delay}
+    if args.backend == "openai":
+        api_key = ad_generator.resolve_api_key()
+        if not api_key:
+            raise SystemExit("error: no OpenAI API key; set OPENAI_API_KEY or save one in the app")
+        options["api_key"] = api_key
+    return options
+
+
+def _backend_factory(args: argparse.Namespace):
+    """Return ``factory(model, max_tokens, temperature)`` for the selected backend."""
+    options = _backend_options(args)
+    return lambda model, max_tokens, temperature: ad_generator.make_backend(
+        model=model, max_tokens=max_tokens, temperature=temperature, **options
+    )
+
+
+def _make_backend(args: argparse.Namespace):
+    return _backend_factory(args)(args.model, args.max_tokens, args.temperature)
+
+
+def _make_limiter(args: argparse.Namespace) -> Optional[RateLimiter]:
+    return RateLimiter(args.rpm, args.tpm) if (args.rpm or args.tpm) else None
+
+
+def _params(args: argparse.Namespace) -> Dict[str, object]:
+    """Request parameters that key manifest rows and cached responses."""
+    params: Dict[str, object] = {"max_tokens": args.max_tokens, "temperature": args.temperature}
+    backend = getattr(args, "backend", "openai")
+    if backend != "openai":
+        # Dry-run placeholders must never be restored by real runs sharing the manifest or cache.
+        params["backend"] = backend
+    return params
+
+
+# ---------- generate ----------
+def _default_output(path: Path) -> Path:
+    return path.with_name(f"{path.stem}_ads{path.suffix}")
+
+
+def _cmd_generate(args: argparse.Namespace) -> int:
+    source = Path(args.input)
+    if not source.exists():
+        print(f"error: {source} does not exist", file=sys.stderr)
+        return 2
+    output = Path(args.output) if args.output else _default_output(source)
+    params = _params(args)
+    rules = _quality_rules(args)
+    near_duplicates = None
+    if args.reuse_similar is not None and args.shards <= 1:
+        from core.near_dup import NearDuplicateIndex
+
+        near_duplicates = NearDuplicateIndex(args.reuse_similar)
+    use_cache = args.cache is not None or args.fuzzy_cache is not None
+    if use_cache and args.shards > 1:
+        print("error: --cache cannot be combined with --shards", file=sys.stderr)
+        return 2
+    pipeline = cache = responses = None
+    if args.pipeline:
+        if args.shards > 1:
+            print("error: --pipeline cannot be combined with --shards", file=sys.stderr)
+            return 2
+        from core.cache import ResponseCache
+        from core.pipeline import default_pipeline
+
+        cache = None if args.no_cache else ResponseCache()
+        pipeline = default_pipeline(
+            _backend_factory(args),
+            model=args.model,
+            max_tokens=args.max_tokens,
+            temperature=args.temperature,
+            helper_model=args.helper_model,
+            max_chars=args.max_chars,
+            concurrency=args.concurrency,
+            cache=cache,
+        )
+        params["pipeline"] = pipeline.signature()
+    if use_cache:
+        from core.cache import ResponseCache
+
+        responses = ResponseCache(args.cache or None, fuzzy_threshold=args.fuzzy_cache)
+    manifest = None if args.no_resume else JobManifest(args.manifest)
+    job_id = manifest.start_job(source.resolve(), args.tone, args.model, params) if manifest else None
+
+    progress = Progress(csv_handler.count_rows(source), interval=args.progress_interval)
+    errors: List[str] = []
+    status = 0
+    try:
+        if args.shards > 1:
+            from core.shard import run_sharded
+
+            run_sharded(
+                source,
+                output,
+                shards=args.shards,
+                backend=_backend_options(args),
+                tone=args.tone,
+                model=args.model,
+                params=params,
+                concurrency=args.concurrency,
+                rpm=args.rpm,
+                tpm=args.tpm,
+                manifest=args.manifest,
+                use_manifest=manifest is not None,
+                chunk_size=args.chunk_size,
+                max_failures=args.max_failures,
+                progress=progress,
+                quality=rules,
+                retries=args.retries,
+                near_duplicates=args.reuse_similar,
+            )
+            rows = progress.rows
+        else:
+            rows = generate_file(
+                source,
+                output,
+                None if pipeline is not None else _make_backend(args),
+                tone=args.tone,
+                model=args.model,
+                params=params,
+                concurrency=args.concurrency,
+                limiter=_make_limiter(args),
+                manifest=manifest,
+                chunk_size=args.chunk_size,
+                progress=progress,
+                errors=errors,
+                max_failures=args.max_failures,
+                pipeline=pipeline,
+                quality=QualityGate(rules) if rules is not None else None,
+                retries=args.retries,
+                near_duplicates=near_duplicates,
+                cache=responses,
+            )
+    except (TooManyFailures, RuntimeError) as exc:
+        print(f"\nerror: {exc}; stopping", file=sys.stderr)
+        status = 1
+    except KeyboardInterrupt:
+        print("\ninterrupted; run the same command again to resume", file=sys.stderr)
+        status = 130
+    else:
+        progress.finish()
+        print(f"wrote {rows:,} rows to {output}", file=sys.stderr)
+        if progress.retried:
+            print(
+                f"quality gate: {progress.retried:,} ads regenerated for {progress.retry_tokens:,} tokens, "
+                f"{progress.rejected:,} left empty",
+                file=sys.stderr,
+            )
+        if args.reuse_similar is not None:
+            _print_reuse_report(progress, near_duplicates)
+        if responses is not None:
+            stats = responses.stats()
+            print(
+                f"response cache: {progress.cached:,} rows filled ({stats['fuzzy_hits']:,} by similarity), "
+                f"{stats['entries']:,} entries"
+                + (f", {stats['index_evictions']:,} evicted from the similarity index" if stats["index_evictions"] else ""),
+                file=sys.stderr,
+            )
+        if progress.failed or progress.rejected:
+            status = 1
+        elif manifest is not None:
+            manifest.finish_job(job_id)
+    finally:
+        if manifest is not None:
+            manifest.close()
+        if cache is not None:
+            cache.close()
+        if responses is not None:
+            responses.close()
+    if pipeline is not None:
+        _print_stage_stats(pipeline)
+    for message in errors:
+        print(f"  {message}", file=sys.stderr)
+    return status
+
+
+def _print_reuse_report(progress: Counters, index) -> None:
+    groups = f" in {index.clusters:,} groups" if index is not None else ""
+    print(
+        f"near-duplicates{groups}: {progress.reused:,} ads adapted locally, {progress.adapted:,} with a short "
+        f"request; about {progress.saved_tokens:,} tokens saved",
+        file=sys.stderr,
+    )
+
+
+def _print_stage_stats(pipeline) -> None:
+    print("stage        calls  cached  bypassed  failed     tokens", file=sys.stderr)
+    for name, stats in pipeline.stats.items():
+        tokens = int(stats["prompt_tokens"] + stats["completion_tokens"])
+        print(
+            f"{name:<10} {int(stats['calls']):>7,} {int(stats['cache_hits']):>7,} {int(stats['bypassed']):>9,} "
+            f"{int(stats['failed']):>7,} {tokens:>10,}",
+            file=sys.stderr,
+        )
+
+
+# ---------- stream ----------
+async def _read_records(stdin: TextIO, out: TextIO, errors: List[object]):
+    """Yield ``(id, name, description)`` from JSON Lines on *stdin*.
+
+    Lines are read one at a time on a worker thread, only when the runner
+    has a free slot, so a slow backend pushes back on the producer. Invalid
+    records are answered on *out* straight away.
+    """
+    loop = asyncio.get_running_loop()
+    line_no = 0
+    while True:
+        line = await loop.run_in_executor(None, stdin.readline)
+        if not line:
+            return
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as exc:
+            _emit(out, {"id": line_no, "error": f"invalid JSON: {exc}"})
+            errors.append(line_no)
+            continue
+        record_id = record.get("id", line_no)
+        name, description = record.get("name"), record.get("description")
+        if not row_is_complete(name, description):
+            _emit(out, {"id": record_id, "error": "missing name or description"})
+            errors.append(line_no)
+            continue
+        yield record_id, str(name), str(description)
+
+
+def _emit(out: TextIO, record: Dict[str, object]) -> None:
+    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    out.flush()
+
+
+def _cmd_stream(args: argparse.Namespace) -> int:
+    backend = _make_backend(args)
+    limiter = _make_limiter(args)
+    stdin, stdout = sys.stdin, sys.stdout
+    stdin.reconfigure(encoding="utf-8")
+    stdout.reconfigure(encoding="utf-8")
+    errors: List[object] = []
+
+    async def _run() -> None:
+        async for record_id, result in run_stream(
+            _read_records(stdin, stdout, errors), backend, args.tone, concurrency=args.concurrency, limiter=limiter
+        ):
+            if isinstance(result, Exception):
+                _emit(stdout, {"id": record_id, "error": f"{type(result).__name__}: {result}"})
+                errors.append(record_id)
+                continue
+            _emit(
+                stdout,
+                {
+                    "id": record_id,
+                    "ad": result.text,
+                    "usage": {
+                        "prompt_tokens": result.prompt_tokens,
+                        "completion_tokens": result.completion_tokens,
+                        "total_tokens": result.total_tokens,
+                    },
+                    "latency": round(result.latency, 3),
+                },
+            )
+
+    try:
+        asyncio.run(_run())
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        return 0  # downstream consumer went away
+    return 1 if errors else 0
+
+
+# ---------- serve ----------
+def _cmd_serve(args: argparse.Namespace) -> int:
+    from core.cache import ResponseCache
+    from core.service import GenerationService, serve
+
+    service = GenerationService(
+        _backend_factory(args),
+        defaults={
+            "tone": args.tone,
+            "model": args.model,
+            "max_tokens": args.max_tokens,
+            "temperature": args.temperature,
+        },
+        concurrency=args.concurrency,
+        limiter=_make_limiter(args),
+        cache=None if args.no_cache else ResponseCache(args.cache, fuzzy_threshold=args.fuzzy_cache),
+        backend_kind=args.backend,
+    )
+    print(f"serving on http://{args.host}:{args.port} (backend: {args.backend})", file=sys.stderr)
+    try:
+        serve(service, args.host, args.port, quiet=args.quiet)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+# ---------- watch ----------
+def _cmd_watch(args: argparse.Namespace) -> int:
+    from core.watch import WatchRunner
+
+    inbox = Path(args.inbox)
+    if not inbox.is_dir():
+        print(f"error: {inbox} is not a directory", file=sys.stderr)
+        return 2
+    runner = WatchRunner(
+        inbox,
+        Path(args.outbox),
+        _make_backend(args),
+        tone=args.tone,
+        model=args.model,
+        params=_params(args),
+        concurrency=args.concurrency,
+        limiter=_make_limiter(args),
+        manifest=JobManifest(args.manifest),
+        chunk_size=args.chunk_size,
+        poll_interval=args.poll,
+        once=args.once,
+    )
+    print(f"watching {inbox} -> {args.outbox}", file=sys.stderr)
+    try:
+        asyncio.run(runner.run())
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        runner.manifest.close()
+    return 0
+
+
+# ---------- shard ----------
+def _cmd_shard_plan(args: argparse.Namespace) -> int:
+    from core.shard import ShardError, plan_job
+
+    source = Path(args.input)
+    if not source.exists():
+        print(f"error: {source} does not exist", file=sys.stderr)
+        return 2
+    try:
+        plan = plan_job(
+            source,
+            args.jobdir,
+            shards=args.shards,
+            strategy=args.strategy,
+            tone=args.tone,
+            model=args.model,
+            params=_params(args),
+            chunk_size=args.chunk_size,
+            quality=_quality_rules(args),
+            retries=args.retries,
+            near_duplicates=args.reuse_similar,
+        )
+    except ShardError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    sizes = ", ".join(f"{entry['rows']:,}" for entry in plan["shards"])
+    print(f"planned {plan['rows']:,} rows in {len(plan['shards'])} shards ({sizes}) in {args.jobdir}", file=sys.stderr)
+    return 0
+
+
+def _cmd_shard_run(args: argparse.Namespace) -> int:
+    import socket
+
+    from core.shard import ShardError, claim_shard, load_plan, run_shard
+
+    node = args.node or socket.gethostname()
+    if args.shard is None and not args.next:
+        print("error: give a shard number or --next", file=sys.stderr)
+        return 2
+    try:
+        plan = load_plan(args.jobdir)
+    except ShardError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    backend = ad_generator.make_backend(
+        model=plan["model"],
+        max_tokens=plan["params"]["max_tokens"],
+        temperature=plan["params"]["temperature"],
+        **_backend_options(args),
+    )
+    limiter = _make_limiter(args)
+    manifest = None if args.no_resume else JobManifest(args.manifest)
+    status = 0
+    try:
+        while True:
+            shard = args.shard if args.shard is not None else claim_shard(args.jobdir, node)
+            if shard is None:
+                break
+            progress = Progress(plan["shards"][shard]["rows"], interval=args.progress_interval)
+            print(f"{node}: shard {shard}", file=sys.stderr)
+            record = run_shard(
+                args.jobdir,
+                shard,
+                backend,
+                node=node,
+                concurrency=args.concurrency,
+                limiter=limiter,
+                manifest=manifest,
+                progress=progress,
+            )
+            progress.finish()
+            print(f"{node}: shard {shard} {record['state']}", file=sys.stderr)
+            for message in record.get("errors", ()):
+                print(f"  {message}", file=sys.stderr)
+            if record["state"] != "done":
+                status = 1
+            if args.shard is not None:
+                break
+    except (ShardError, RuntimeError) as exc:
+        print(f"\nerror: {exc}", file=sys.stderr)
+        status = 1
+    except KeyboardInterrupt:
+        print("\ninterrupted; delete the shard's .claim file to let another node take it", file=sys.stderr)
+        status = 130
+    finally:
+        if manifest is not None:
+            manifest.close()
+    return status
+
+
+def _cmd_shard_status(args: argparse.Namespace) -> int:
+    from core.shard import ShardError, job_status
+
+    try:
+        records = job_status(args.jobdir)
+    except ShardError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    for record in records:
+        line = f"shard {record['id']:>3}  {record['state']:<10} {record['planned_rows']:>10,} rows"
+        if "node" in record:
+            line += f"  node={record['node']}"
+        if "generated" in record:
+            line += f"  generated={record['generated']:,} restored={record['restored']:,} failed={record['failed']:,}"
+            if record.get("retried"):
+                line += f" retried={record['retried']:,} rejected={record['rejected']:,}"
+            if record.get("reused") or record.get("adapted"):
+                line += f" reused={record['reused'] + record['adapted']:,}"
+        if "error" in record:
+            line += f"  error={record['error']}"
+        print(line)
+    return 0 if all(record["state"] == "done" for record in records) else 1
+
+
+def _cmd_shard_merge(args: argparse.Namespace) -> int:
+    from core.shard import ShardError, merge_job
+
+    try:
+        rows = merge_job(args.jobdir, args.output)
+    except ShardError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    print(f"wrote {rows:,} rows to {args.output}", file=sys.stderr)
+    return 0
+
+
+def _add_shard_parser(commands) -> None:
+    shard = commands.add_parser("shard", help="plan, run and merge multi-node jobs")
+    actions = shard.add_subparsers(dest="action", required=True)
+
+    plan = actions.add_parser("plan", help="split a catalog into a job directory")
+    plan.add_argument("input", help="CSV, Parquet or Feather catalog")
+    plan.add_argument("jobdir", help="job directory to create (shared by all nodes)")
+    plan.add_argument("--shards", type=int, required=True, help="number of shards")
+    plan.add_argument(
+        "--strategy",
+        choices=("range", "hash"),
+        default="range",
+        help="contiguous row ranges or hash buckets of name+description (default: %(default)s)",
+    )
+    plan.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per chunk (default: %(default)s)")
+    _add_model_options(plan)
+    _add_quality_options(plan)
+    _add_reuse_option(plan)
+    plan.set_defaults(handler=_cmd_shard_plan)
+
+    run = actions.add_parser(
+        "run",
+        help="generate shards of a planned job",
+        description="Model settings come from the plan; only execution options are taken from this node.",
+    )
+    run.add_argument("jobdir", help="job directory")
+    run.add_argument("shard", type=int, nargs="?", help="shard number to run")
+    run.add_argument("--next", action="store_true", help="claim and run unclaimed shards until none are left")
+    run.add_argument("--node", help="name recorded in the shard status (default: host name)")
+    run.add_argument("--no-resume", action="store_true", help="ignore and do not update the job manifest")
+    run.add_argument("--manifest", help="job manifest path (default: in the config directory)")
+    run.add_argument("--progress-interval", type=float, default=1.0, help=argparse.SUPPRESS)
+    _add_runtime_options(run)
+    run.set_defaults(handler=_cmd_shard_run)
+
+    status = actions.add_parser("status", help="show the progress of every shard")
+    status.add_argument("jobdir", help="job directory")
+    status.set_defaults(handler=_cmd_shard_status)
+
+    merge = actions.add_parser("merge", help="validate all shards and merge them in input order")
+    merge.add_argument("jobdir", help="job directory")
+    merge.add_argument("output", help="merged CSV, Parquet or Feather file")
+    merge.set_defaults(handler=_cmd_shard_merge)
+
+
+# ---------- cache ----------
+def _cmd_cache_audit(args: argparse.Namespace) -> int:
+    from core.cache import ResponseCache
+
+    cache = ResponseCache(args.cache)
+    try:
+        hits = cache.fuzzy_audit(args.limit)
+        print(f"{len(cache):,} cached responses", file=sys.stderr)
+        for hit in hits:
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(hit["created"]))
+            print(f"{when}  {hit['similarity']:.3f}")
+            print(f"    request: {hit['text']}")
+            print(f"    matched: {hit['matched_text']}")
+            print(f"    ad:      {hit['ad']}")
+    finally:
+        cache.close()
+    return 0
+
+
+def _cmd_cache_import(args: argparse.Namespace) -> int:
+    from core.cache import ResponseCache, import_ads
+
+    missing = [path for path in args.inputs if not Path(path).exists()]
+    if missing:
+        print(f"error: {missing[0]} does not exist", file=sys.stderr)
+        return 2
+    cache = ResponseCache(args.cache)
+    try:
+        rules = _quality_rules(args)
+        found, rejected, stored = import_ads(
+            cache,
+            args.inputs,
+            tone=args.tone,
+            model=args.model,
+            params=_params(args),
+            replace=args.replace,
+            quality=QualityGate(rules) if rules is not None else None,
+            chunk_size=args.chunk_size,
+        )
+        total = len(cache)
+    finally:
+        cache.close()
+    print(
+        f"imported {stored:,} of {found:,} ads as {args.tone}/{args.model} "
+        f"({rejected:,} rejected, {found - rejected - stored:,} already cached); {total:,} cached responses",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def _add_cache_parser(commands) -> None:
+    cache = commands.add_parser("cache", help="seed and inspect the response cache")
+    actions = cache.add_subparsers(dest="action", required=True)
+
+    imp = actions.add_parser(
+        "import",
+        help="load the ads of exported catalogs into the response cache",
+        description="Each ad is stored as the answer to the request the given tone, model and sampling "
+        "settings would make for its product, so generate --cache and the service reuse it.",
+    )
+    imp.add_argument("inputs", nargs="+", help="CSV, Parquet or Feather files with name, description and ad")
+    imp.add_argument("--cache", help="response cache path (default: in the config directory)")
+    imp.add_argument("--replace", action="store_true", help="overwrite products that are already cached")
+    imp.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per chunk (default: %(default)s)")
+    _add_model_options(imp)
+    _add_quality_options(imp)
+    imp.set_defaults(handler=_cmd_cache_import)
+
+    audit = actions.add_parser("audit", help="list recent fuzzy cache hits with both texts")
+    audit.add_argument("--cache", help="response cache path (default: in the config directory)")
+    audit.add_argument("--limit", type=int, default=50, help="number of hits to show (default: %(default)s)")
+    audit.set_defaults(handler=_cmd_cache_audit)
+
+
+# ---------- entry point ----------
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m core", description="Georgian ad generator (headless)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="fill the ad column of a catalog file")
+    gen.add_argument("input", help="CSV, Parquet or Feather catalog")
+    gen.add_argument("-o", "--output", help="output file (default: <input>_ads.<ext>)")
+    gen.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per chunk (default: %(default)s)")
+    gen.add_argument("--no-resume", action="store_true", help="ignore and do not update the job manifest")
+    gen.add_argument("--manifest", help="job manifest path (default: in the config directory)")
+    gen.add_argument("--max-failures", type=int, default=None, help="stop after this many failed requests")
+    gen.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="worker processes; the input is split into this many row ranges (default: %(default)s)",
+    )
+    gen.add_argument("--progress-interval", type=float, default=1.0, help=argparse.SUPPRESS)
+    _add_generation_options(gen)
+    _add_quality_options(gen)
+    _add_reuse_option(gen)
+    multi = gen.add_argument_group("multi-step pipeline")
+    multi.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="generate in steps: extract benefits, draft, shorten, validate Georgian",
+    )
+    multi.add_argument("--helper-model", help="model for the extract and shorten steps (default: --model)")
+    multi.add_argument("--no-cache", action="store_true", help="do not cache the responses of each step")
+    responses = gen.add_argument_group("response cache")
+    responses.add_argument(
+        "--cache",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="fill rows from the response cache (default: in the config directory) and add new ads to it",
+    )
+    _add_fuzzy_cache_option(responses)
+    gen.set_defaults(handler=_cmd_generate)
+
+    stream = commands.add_parser(
+        "stream",
+        help="JSON Lines filter: stdin records in, generated ads out",
+        description=(
+            'Reads {"id", "name", "description"} objects from stdin and writes '
+            '{"id", "ad", "usage", "latency"} (or {"id", "error"}) to stdout in completion order. '
+            "--concurrency bounds the number of records in flight."
+        ),
+    )
+    _add_generation_options(stream)
+    stream.set_defaults(handler=_cmd_stream)
+
+    srv = commands.add_parser("serve", help="run the local HTTP generation service")
+    srv.add_argument("--host", default="127.0.0.1", help="default: %(default)s")
+    srv.add_argument("--port", type=int, default=8765, help="default: %(default)s")
+    srv.add_argument("--cache", help="response cache path (default: in the config directory)")
+    srv.add_argument("--no-cache", action="store_true", help="do not cache responses")
+    _add_fuzzy_cache_option(srv)
+    srv.add_argument("--quiet", action="store_true", help="do not log requests")
+    _add_generation_options(srv)
+    srv.set_defaults(handler=_cmd_serve)
+
+    watch = commands.add_parser("watch", help="process catalogs dropped into a folder")
+    watch.add_argument("inbox", help="folder to watch for CSV/Parquet/Feather files")
+    watch.add_argument("outbox", help="folder for generated files and job reports")
+    watch.add_argument("--poll", type=float, default=2.0, help="seconds between folder scans (default: %(default)s)")
+    watch.add_argument("--once", action="store_true", help="process the files present now, then exit")
+    watch.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per chunk (default: %(default)s)")
+    watch.add_argument("--manifest", help="job manifest path (default: in the config directory)")
+    _add_generation_options(watch)
+    watch.set_defaults(handler=_cmd_watch)
+
+    _add_shard_parser(commands)
+    _add_cache_parser(commands)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if getattr(args, "tone", None) is not None and args.tone not in TONES:
+        print(f"error: unknown tone {args.tone!r}; choose from {', '.join(TONES)}", file=sys.stderr)
+        return 2
+    return args.handler(args)
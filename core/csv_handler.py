@@ -8,37 +8,85 @@ The expected CSV structure is three columns in the following order:
 The headers are optional. If no header row exists, the first row of data will
 still be read correctly. Internally we normalise the DataFrame to always carry
 the canonical column names: ``name``, ``description``, ``ad``.
+
+Parquet and Arrow IPC (Feather) files are supported as well through
+:func:`import_table` / :func:`export_table`, which dispatch on the file suffix.
+These columnar formats need the optional ``pyarrow`` package.
 """
 from __future__ import annotations
 
+import codecs
+import csv
+import hashlib
+import os
 from pathlib import Path
+from typing import Callable, Iterator, Optional, Sequence
+
+from utils.lazy import lazy_import
 
-import pandas as pd
+pd = lazy_import("pandas")
 
-__all__ = ["import_csv", "export_csv"]
+__all__ = [
+    "import_csv",
+    "iter_csv_chunks",
+    "export_csv",
+    "import_parquet",
+    "iter_parquet_chunks",
+    "export_parquet",
+    "import_feather",
+    "export_feather",
+    "import_table",
+    "iter_table_chunks",
+    "export_table",
+    "count_rows",
+    "file_digest",
+    "TableWriter",
+    "compact_strings",
+    "memory_usage",
+    "SUPPORTED_SUFFIXES",
+    "AutosaveJournal",
+]
 
 _CANONICAL_COLUMNS = ["name", "description", "ad"]
+_HEADER_ALIASES: dict[str, tuple[str, ...]] = {
+    "name": ("name", "product name", "სახელი", "პროდუქტის სახელი"),
+    "description": ("description", "product description", "აღწერა"),
+    "ad": ("ad", "advertisement", "generated advertisement", "რეკლამა"),
+}
+DEFAULT_CHUNK_SIZE = 10_000
+PARQUET_SUFFIXES = (".parquet", ".pq")
+FEATHER_SUFFIXES = (".feather", ".arrow", ".ipc")
+SUPPORTED_SUFFIXES = (".csv",) + PARQUET_SUFFIXES + FEATHER_SUFFIXES
+_SNIFF_BYTES = 64 * 1024
+
+
+def _canonical_header(value: object) -> Optional[str]:
+     """Return the canonical column name for a header cell, if it is a known alias."""
+     normalised = str(value).lower().strip()
+     for canonical, aliases in _HEADER_ALIASES.items():
+         if normalised in aliases:
+             return canonical
+     return None
 
 
 def _normalise_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-     """Ensure DataFrame has the canonical columns in the correct order."""
-     # If the CSV contained headers that already match in any order, rename them.
+     """Ensure DataFrame has the canonical columns in the correct order.
+
+     Recognised headers are matched by name, in any order; other columns are
+     dropped. Without any recognised header the first three columns are
+     taken as name, description and ad.
+     """
      mapping: dict[str, str] = {}
      for original in df.columns:
-         normalised = str(original).lower().strip()
-         if normalised in ("name", "product name", "სახელი", "პროდუქტის სახელი"):
-             mapping[original] = "name"
-         elif normalised in ("description", "product description", "აღწერა"):
-             mapping[original] = "description"
-         elif normalised in ("ad", "advertisement", "generated advertisement", "რეკლამა"):
-             mapping[original] = "ad"
+         canonical = _canonical_header(original)
+         if canonical is not None and canonical not in mapping.values():
+             mapping[original] = canonical
 
      if mapping:
-         df = df.rename(columns=mapping)
-
-     # In case header row was missing, treat current columns as data and relabel.
-     if len(df.columns) < 3 or not set(_CANONICAL_COLUMNS).issubset(df.columns):
+         df = df[list(mapping)].rename(columns=mapping)
+     else:
          # Assume the CSV had no header row
+         df = df.iloc[:, : len(_CANONICAL_COLUMNS)]
          df.columns = _CANONICAL_COLUMNS[: len(df.columns)]
 
      # Ensure all three expected columns exist
@@ -49,23 +97,651 @@ def _normalise_dataframe(df: pd.DataFrame) -> pd.DataFrame:
      return df[_CANONICAL_COLUMNS]
 
 
-def import_csv(path: str | Path) -> pd.DataFrame:
-     """Read CSV file and return normalised DataFrame."""
+def _sniff_format(path: Path) -> tuple[str, str]:
+     """Guess ``(encoding, delimiter)`` from the first few KB of *path*.
+
+     Files written by :func:`export_csv` start with a UTF-8 BOM and are read
+     as ``utf-8-sig``. Anything that is not valid UTF-8 falls back to cp1252.
+     """
+     with path.open("rb") as fp:
+         prefix = fp.read(_SNIFF_BYTES)
+
+     if prefix.startswith(codecs.BOM_UTF8):
+         encoding = "utf-8-sig"
+     elif prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+         encoding = "utf-16"
+     else:
+         encoding = "utf-8"
+     try:
+         # The prefix may end in the middle of a multi-byte character.
+         sample = codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+     except UnicodeDecodeError:
+         encoding = "cp1252"
+         sample = prefix.decode(encoding, errors="replace")
+
+     # Only sniff complete lines; a truncated final line confuses the Sniffer.
+     if len(prefix) == _SNIFF_BYTES and "\n" in sample:
+         sample = sample[: sample.rindex("\n")]
+     try:
+         delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+     except csv.Error:
+         delimiter = ","
+     return encoding, delimiter
+
+
+def _sniff_layout(path: Path, encoding: str = "utf-8-sig", delimiter: str = ",") -> tuple[bool, dict[int, str], int]:
+     """Inspect the first line of *path* and decide how its columns map.
+
+     Returns ``(has_header, positions, width)`` where *positions* maps a
+     zero-based column index in the file to its canonical column name and
+     *width* is the number of fields in the first row. A first row is treated
+     as a header only when at least one of its cells is a known alias;
+     otherwise columns are assigned positionally (A, B, C).
+     """
+     with path.open("r", encoding=encoding, newline="") as fp:
+         first_row = next(csv.reader(fp, delimiter=delimiter), [])
+
+     positions: dict[int, str] = {}
+     for idx, cell in enumerate(first_row):
+         canonical = _canonical_header(cell)
+         if canonical is not None and canonical not in positions.values():
+             positions[idx] = canonical
+     if positions:
+         return True, positions, len(first_row)
+
+     width = min(len(first_row), len(_CANONICAL_COLUMNS)) or len(_CANONICAL_COLUMNS)
+     return False, dict(enumerate(_CANONICAL_COLUMNS[:width])), len(first_row)
+
+
+def iter_csv_chunks(path: str | Path, chunksize: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+     """Stream a CSV file as normalised DataFrames of at most *chunksize* rows.
+
+     Header detection happens once, from the first line, so the file is parsed
+     a single time and only one chunk is held in memory at a time. Every chunk
+     carries the canonical ``name``, ``description``, ``ad`` columns and keeps
+     the file-wide row index, which makes chunks safe to concatenate.
+     """
      path = Path(path)
      if not path.exists():
          raise FileNotFoundError(path)
+     if path.stat().st_size == 0:
+         return
 
-     try:
-         # Try reading with header first.
-         df = pd.read_csv(path)
-     except pd.errors.ParserError:
-         # Fallback: read without header
-         df = pd.read_csv(path, header=None)
+     encoding, delimiter = _sniff_format(path)
+     has_header, positions, _width = _sniff_layout(path, encoding, delimiter)
+     usecols = sorted(positions)
+     reader = pd.read_csv(
+         path,
+         sep=delimiter,
+         header=None,
+         skiprows=1 if has_header else 0,
+         names=[positions[idx] for idx in usecols],
+         usecols=usecols,
+         dtype=str,
+         keep_default_na=False,
+         encoding=encoding,
+         chunksize=chunksize,
+     )
+     with reader:
+         for chunk in reader:
+             yield _normalise_dataframe(chunk)
 
+
+def _import_csv_pyarrow(path: Path) -> pd.DataFrame:
+     """Parse *path* with the multithreaded pyarrow CSV reader.
+
+     Every column is pinned to ``string`` so no type inference takes place.
+     Raises ``pyarrow.ArrowInvalid`` for ragged rows, which the caller handles
+     by falling back to the pandas parser.
+     """
+     import pyarrow as pa
+     from pyarrow import csv as pa_csv
+
+     encoding, delimiter = _sniff_format(path)
+     has_header, positions, width = _sniff_layout(path, encoding, delimiter)
+     names = [f"f{idx}" for idx in range(width)]
+     include = [names[idx] for idx in sorted(positions)]
+     table = pa_csv.read_csv(
+         path,
+         read_options=pa_csv.ReadOptions(
+             column_names=names,
+             skip_rows=1 if has_header else 0,
+             encoding="utf8" if encoding.startswith("utf-8") else encoding,
+             use_threads=True,
+         ),
+         parse_options=pa_csv.ParseOptions(delimiter=delimiter, newlines_in_values=True),
+         convert_options=pa_csv.ConvertOptions(
+             column_types={name: pa.string() for name in include},
+             include_columns=include,
+             strings_can_be_null=False,
+             quoted_strings_can_be_null=False,
+         ),
+     )
+     df = table.to_pandas()
+     df.columns = [positions[idx] for idx in sorted(positions)]
      return _normalise_dataframe(df)
 
 
-def export_csv(df: pd.DataFrame, path: str | Path) -> None:
-     """Write DataFrame to CSV using UTF-8 encoding."""
+def import_csv(path: str | Path, engine: str = "auto") -> pd.DataFrame:
+     """Read CSV file and return normalised DataFrame.
+
+     *engine* is ``"pyarrow"``, ``"pandas"`` or ``"auto"`` (pyarrow when it is
+     installed). Both engines read every column as text.
+     """
+     path = Path(path)
+     if not path.exists():
+         raise FileNotFoundError(path)
+     if engine not in ("auto", "pyarrow", "pandas"):
+         raise ValueError(f"Unknown CSV engine: {engine}")
+
+     if engine != "pandas" and path.stat().st_size > 0:
+         try:
+             import pyarrow  # noqa: F401
+         except ImportError:
+             if engine == "pyarrow":
+                 raise
+         else:
+             try:
+                 return _import_csv_pyarrow(path)
+             except pyarrow.ArrowInvalid:
+                 pass  # ragged rows; the pandas parser below tolerates them
+
+     chunks = list(iter_csv_chunks(path))
+     if not chunks:
+         return pd.DataFrame(columns=_CANONICAL_COLUMNS)
+     return pd.concat(chunks)
+
+
+def export_csv(
+     df: pd.DataFrame,
+     path: str | Path,
+     *,
+     progress: Optional[Callable[[int, int], None]] = None,
+     chunksize: int = DEFAULT_CHUNK_SIZE,
+) -> None:
+     """Write DataFrame to CSV using UTF-8 encoding.
+
+     The file is written next to *path* first and then renamed over it, so a
+     crash mid-write never leaves a truncated export behind. When *progress*
+     is given, rows are written *chunksize* at a time and ``progress(done,
+     total)`` is called after each chunk; raising from the callback cancels
+     the export and leaves any existing file at *path* untouched.
+     """
      path = Path(path)
-     df.to_csv(path, index=False, encoding="utf-8-sig", header=True)
+     tmp_path = path.with_name(f".{path.name}.tmp")
+     try:
+         if progress is None:
+             df.to_csv(tmp_path, index=False, encoding="utf-8-sig", header=True)
+         else:
+             total = len(df)
+             df.iloc[:0].to_csv(tmp_path, index=False, encoding="utf-8-sig", header=True)
+             for start in range(0, total, chunksize):
+                 df.iloc[start : start + chunksize].to_csv(
+                     tmp_path, mode="a", index=False, encoding="utf-8", header=False
+                 )
+                 progress(min(start + chunksize, total), total)
+         os.replace(tmp_path, path)
+     finally:
+         tmp_path.unlink(missing_ok=True)
+
+
+def _require_pyarrow() -> None:
+     try:
+         import pyarrow  # noqa: F401
+     except ImportError as exc:  # pragma: no cover - depends on environment
+         raise ImportError("Parquet/Arrow support requires the 'pyarrow' package (pip install pyarrow)") from exc
+
+
+def _project(file_columns: Sequence[str], columns: Optional[Sequence[str]]) -> dict[str, str]:
+     """Map physical column names to canonical ones, limited to *columns*.
+
+     Known header aliases are matched by name; files without any recognised
+     name fall back to positional assignment, just like header-less CSV files.
+     """
+     mapping: dict[str, str] = {}
+     for original in file_columns:
+         canonical = _canonical_header(original)
+         if canonical is not None and canonical not in mapping.values():
+             mapping[original] = canonical
+     if not mapping:
+         mapping = dict(zip(file_columns, _CANONICAL_COLUMNS))
+     wanted = set(columns) if columns is not None else set(_CANONICAL_COLUMNS)
+     return {original: canonical for original, canonical in mapping.items() if canonical in wanted}
+
+
+def _finish_columnar(df: pd.DataFrame, mapping: dict[str, str], columns: Optional[Sequence[str]]) -> pd.DataFrame:
+     df = df.rename(columns=mapping)
+     for col in df.columns:
+         df[col] = df[col].fillna("").astype(str)
+     df = _normalise_dataframe(df)
+     return df if columns is None else df[list(columns)]
+
+
+def import_parquet(path: str | Path, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+     """Read a Parquet file, loading only the canonical *columns* requested."""
+     _require_pyarrow()
+     import pyarrow.parquet as pq
+
+     path = Path(path)
+     if not path.exists():
+         raise FileNotFoundError(path)
+     mapping = _project(pq.read_schema(path).names, columns)
+     df = pd.read_parquet(path, columns=list(mapping))
+     return _finish_columnar(df, mapping, columns)
+
+
+def iter_parquet_chunks(
+     path: str | Path,
+     chunksize: int = DEFAULT_CHUNK_SIZE,
+     columns: Optional[Sequence[str]] = None,
+) -> Iterator[pd.DataFrame]:
+     """Stream a Parquet file as normalised DataFrames, like :func:`iter_csv_chunks`."""
+     _require_pyarrow()
+     import pyarrow.parquet as pq
+
+     path = Path(path)
+     if not path.exists():
+         raise FileNotFoundError(path)
+     parquet_file = pq.ParquetFile(path)
+     mapping = _project(parquet_file.schema_arrow.names, columns)
+     offset = 0
+     for batch in parquet_file.iter_batches(batch_size=chunksize, columns=list(mapping)):
+         df = batch.to_pandas()
+         df.index = pd.RangeIndex(offset, offset + len(df))
+         offset += len(df)
+         yield _finish_columnar(df, mapping, columns)
+
+
+def export_parquet(
+     df: pd.DataFrame,
+     path: str | Path,
+     *,
+     progress: Optional[Callable[[int, int], None]] = None,
+) -> None:
+     """Write DataFrame to Parquet (atomically, like :func:`export_csv`).
+
+     *progress* is called once the file is written but before it replaces
+     *path*, so raising from it still leaves any existing file untouched.
+     """
+     _require_pyarrow()
+     path = Path(path)
+     tmp_path = path.with_name(f".{path.name}.tmp")
+     try:
+         df.to_parquet(tmp_path, index=False)
+         if progress is not None:
+             progress(len(df), len(df))
+         os.replace(tmp_path, path)
+     finally:
+         tmp_path.unlink(missing_ok=True)
+
+
+def import_feather(path: str | Path, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+     """Read an Arrow IPC (Feather) file, loading only the canonical *columns* requested."""
+     _require_pyarrow()
+     import pyarrow as pa
+
+     path = Path(path)
+     if not path.exists():
+         raise FileNotFoundError(path)
+     with pa.memory_map(str(path)) as source:
+         names = pa.ipc.open_file(source).schema.names
+     mapping = _project(names, columns)
+     df = pd.read_feather(path, columns=list(mapping))
+     return _finish_columnar(df, mapping, columns)
+
+
+def iter_feather_chunks(
+     path: str | Path,
+     chunksize: int = DEFAULT_CHUNK_SIZE,
+     columns: Optional[Sequence[str]] = None,
+) -> Iterator[pd.DataFrame]:
+     """Stream an Arrow IPC (Feather) file as normalised DataFrames of *chunksize* rows.
+
+     The file is memory-mapped and read one record batch at a time, so only
+     the rows of the current chunk are converted to pandas.
+     """
+     _require_pyarrow()
+     import pyarrow as pa
+
+     path = Path(path)
+     if not path.exists():
+         raise FileNotFoundError(path)
+     offset = 0
+
+     def _emit(batches) -> pd.DataFrame:
+         nonlocal offset
+         df = pa.Table.from_batches(batches).to_pandas()
+         df.index = pd.RangeIndex(offset, offset + len(df))
+         offset += len(df)
+         return _finish_columnar(df, mapping, columns)
+
+     with pa.memory_map(str(path)) as source:
+         reader = pa.ipc.open_file(source)
+         mapping = _project(reader.schema.names, columns)
+         pending: list = []
+         pending_rows = 0
+         for i in range(reader.num_record_batches):
+             batch = reader.get_batch(i).select(list(mapping))
+             start = 0
+             while start < batch.num_rows:
+                 take = min(chunksize - pending_rows, batch.num_rows - start)
+                 pending.append(batch.slice(start, take))
+                 pending_rows += take
+                 start += take
+                 if pending_rows == chunksize:
+                     yield _emit(pending)
+                     pending, pending_rows = [], 0
+         if pending:
+             yield _emit(pending)
+
+
+def export_feather(
+     df: pd.DataFrame,
+     path: str | Path,
+     *,
+     progress: Optional[Callable[[int, int], None]] = None,
+) -> None:
+     """Write DataFrame to an Arrow IPC (Feather) file; *progress* as in :func:`export_parquet`."""
+     _require_pyarrow()
+     path = Path(path)
+     tmp_path = path.with_name(f".{path.name}.tmp")
+     try:
+         df.reset_index(drop=True).to_feather(tmp_path)
+         if progress is not None:
+             progress(len(df), len(df))
+         os.replace(tmp_path, path)
+     finally:
+         tmp_path.unlink(missing_ok=True)
+
+
+def import_table(
+     path: str | Path,
+     columns: Optional[Sequence[str]] = None,
+     *,
+     compact: bool = True,
+) -> pd.DataFrame:
+     """Import a CSV, Parquet or Feather file based on its suffix.
+
+     With *compact* (the default) the result goes through
+     :func:`compact_strings` before it is returned.
+     """
+     suffix = Path(path).suffix.lower()
+     if suffix in PARQUET_SUFFIXES:
+         df = import_parquet(path, columns)
+     elif suffix in FEATHER_SUFFIXES:
+         df = import_feather(path, columns)
+     else:
+         df = import_csv(path)
+         df = df if columns is None else df[list(columns)]
+     return compact_strings(df) if compact else df
+
+
+def iter_table_chunks(path: str | Path, chunksize: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+     """Stream any supported file format as normalised chunks."""
+     suffix = Path(path).suffix.lower()
+     if suffix in PARQUET_SUFFIXES:
+         return iter_parquet_chunks(path, chunksize)
+     if suffix in FEATHER_SUFFIXES:
+         return iter_feather_chunks(path, chunksize)
+     return iter_csv_chunks(path, chunksize)
+
+
+def export_table(
+     df: pd.DataFrame,
+     path: str | Path,
+     *,
+     progress: Optional[Callable[[int, int], None]] = None,
+) -> None:
+     """Export to CSV, Parquet or Feather based on the suffix of *path*.
+
+     *progress* is reported per chunk for CSV and otherwise once, before the
+     file is put in place; raising from it cancels the export.
+     """
+     suffix = Path(path).suffix.lower()
+     if suffix in PARQUET_SUFFIXES:
+         export_parquet(df, path, progress=progress)
+     elif suffix in FEATHER_SUFFIXES:
+         export_feather(df, path, progress=progress)
+     else:
+         export_csv(df, path, progress=progress)
+
+
+def count_rows(path: str | Path) -> Optional[int]:
+     """Return the number of data rows in *path* without loading it.
+
+     Exact for Parquet and Feather (read from the file metadata). For CSV the
+     physical lines are counted, which over-counts descriptions that contain
+     line breaks; treat it as an estimate. Returns ``None`` when unknown.
+     """
+     path = Path(path)
+     suffix = path.suffix.lower()
+     try:
+         if suffix in PARQUET_SUFFIXES:
+             import pyarrow.parquet as pq
+
+             return pq.ParquetFile(path).metadata.num_rows
+         if suffix in FEATHER_SUFFIXES:
+             import pyarrow as pa
+
+             with pa.memory_map(str(path)) as source:
+                 reader = pa.ipc.open_file(source)
+                 return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+         if path.stat().st_size == 0:
+             return 0
+         lines = 0
+         last = b"\n"
+         with path.open("rb") as fp:
+             for block in iter(lambda: fp.read(1 << 20), b""):
+                 lines += block.count(b"\n")
+                 last = block[-1:]
+         lines += last != b"\n"
+         encoding, delimiter = _sniff_format(path)
+         has_header, _positions, _width = _sniff_layout(path, encoding, delimiter)
+         return lines - has_header
+     except (OSError, ImportError):
+         return None
+
+
+def file_digest(path: str | Path) -> str:
+     """Return the SHA-256 hex digest of *path*'s content."""
+     digest = hashlib.sha256()
+     with Path(path).open("rb") as fp:
+         for block in iter(lambda: fp.read(1 << 20), b""):
+             digest.update(block)
+     return digest.hexdigest()
+
+
+class TableWriter:
+     """Write a CSV, Parquet or Feather file chunk by chunk.
+
+     Only the chunk being written is held in memory. Rows go to a temporary
+     file next to *path* that replaces *path* on :meth:`close`; if the writer
+     is discarded with :meth:`abort` (or the ``with`` block raises) any
+     existing file at *path* is left untouched.
+     """
+
+     def __init__(self, path: str | Path):
+         self.path = Path(path)
+         self.rows = 0
+         self._tmp = self.path.with_name(f".{self.path.name}.tmp")
+         self._suffix = self.path.suffix.lower()
+         self._writer = None
+         self._fp = None
+         self._header_written = False
+         if self._suffix in PARQUET_SUFFIXES + FEATHER_SUFFIXES:
+             _require_pyarrow()
+         else:
+             self._fp = self._tmp.open("w", encoding="utf-8-sig", newline="")
+
+     def write(self, chunk: pd.DataFrame) -> None:
+         """Append *chunk*'s canonical columns to the output."""
+         chunk = chunk[[col for col in _CANONICAL_COLUMNS if col in chunk.columns]]
+         if self._fp is not None:
+             chunk.to_csv(self._fp, index=False, header=not self._header_written)
+             self._header_written = True
+             self._fp.flush()
+         elif len(chunk) or self._writer is None:
+             self._write_arrow(chunk)
+         self.rows += len(chunk)
+
+     def _write_arrow(self, chunk: pd.DataFrame) -> None:
+         import pyarrow as pa
+
+         table = pa.table(
+             {col: pa.array(chunk[col].fillna("").astype(str).tolist(), type=pa.string()) for col in chunk.columns}
+         )
+         if self._writer is None:
+             if self._suffix in PARQUET_SUFFIXES:
+                 import pyarrow.parquet as pq
+
+                 self._writer = pq.ParquetWriter(str(self._tmp), table.schema)
+             else:
+                 self._writer = pa.ipc.new_file(str(self._tmp), table.schema)
+         self._writer.write_table(table)
+
+     def close(self) -> None:
+         """Finish the file and move it into place."""
+         if self._fp is not None:
+             if not self._header_written:
+                 pd.DataFrame(columns=_CANONICAL_COLUMNS).to_csv(self._fp, index=False)
+             self._fp.close()
+         elif self._writer is None:
+             self._write_arrow(pd.DataFrame({col: [] for col in _CANONICAL_COLUMNS}))
+             self._writer.close()
+         else:
+             self._writer.close()
+         os.replace(self._tmp, self.path)
+
+     def abort(self) -> None:
+         """Discard everything written so far."""
+         if self._fp is not None:
+             self._fp.close()
+         elif self._writer is not None:
+             self._writer.close()
+         self._tmp.unlink(missing_ok=True)
+
+     def __enter__(self) -> "TableWriter":
+         return self
+
+     def __exit__(self, exc_type, exc, tb) -> None:
+         if exc_type is None:
+             self.close()
+         else:
+             self.abort()
+
+
+def compact_strings(df: pd.DataFrame, *, dictionary_ratio: float = 0.5) -> pd.DataFrame:
+     """Return *df* with its text columns stored compactly.
+
+     Columns become Arrow-backed strings (one contiguous UTF-8 buffer instead
+     of a Python object per cell). ``name`` and ``description`` columns whose
+     share of distinct values is below *dictionary_ratio* are additionally
+     dictionary encoded as ``category``. The ``ad`` column is never dictionary
+     encoded because the generator writes new values into it.
+     """
+     try:
+         import pyarrow  # noqa: F401
+     except ImportError:
+         return df
+
+     df = df.copy()
+     for col in df.columns:
+         series = df[col].fillna("").astype("string[pyarrow]")
+         if col != "ad" and len(series) and series.nunique() / len(series) < dictionary_ratio:
+             series = series.astype("category")
+         df[col] = series
+     return df
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+     """Return the number of bytes held by *df*, including string payloads."""
+     return int(df.memory_usage(deep=True, index=True).sum())
+
+
+class AutosaveJournal:
+     """Append-only autosave for a running generation job.
+
+     :meth:`start` writes one snapshot of the sheet; afterwards every finished
+     row is appended to ``<path>.journal`` as a ``(row, ad)`` record, so the
+     cost of saving is proportional to the new results rather than to the
+     sheet size. Once the journal grows past ``compact_ratio`` times the
+     snapshot it is folded back into the snapshot, which keeps the total I/O
+     of a job linear. :meth:`finalize` applies outstanding records and writes
+     the result atomically to the destination file.
+     """
+
+     def __init__(self, path: str | Path, *, compact_ratio: float = 0.5, min_compact: int = 500):
+         self.path = Path(path)
+         self.journal_path = self.path.with_name(self.path.name + ".journal")
+         self._compact_ratio = compact_ratio
+         self._min_compact = min_compact
+         self._snapshot_rows = 0
+         self._entries = 0
+         self._fp = None
+         self._writer = None
+
+     def start(self, df: pd.DataFrame) -> None:
+         """Write the initial snapshot and begin an empty journal."""
+         export_csv(df, self.path)
+         self._snapshot_rows = len(df)
+         self._open_journal("w")
+
+     def append(self, row: int, ad: str) -> None:
+         """Record the ad for positional *row*."""
+         if self._writer is None:
+             self._open_journal("a")
+         self._writer.writerow((row, ad))
+         self._fp.flush()
+         self._entries += 1
+         if self._entries >= max(self._min_compact, self._snapshot_rows * self._compact_ratio):
+             self.compact()
+
+     def recover(self) -> pd.DataFrame:
+         """Return the snapshot with all journaled rows applied."""
+         df = import_csv(self.path).reset_index(drop=True)
+         if self.journal_path.exists():
+             with self.journal_path.open("r", encoding="utf-8", newline="") as fp:
+                 for record in csv.reader(fp):
+                     if len(record) != 2:
+                         continue  # torn final line after a crash
+                     row = int(record[0])
+                     if 0 <= row < len(df):
+                         df.at[row, "ad"] = record[1]
+         return df
+
+     def compact(self) -> None:
+         """Fold the journal into the snapshot and start a fresh journal."""
+         self._close_journal()
+         df = self.recover()
+         export_csv(df, self.path)
+         self._snapshot_rows = len(df)
+         self._open_journal("w")
+
+     def finalize(self, destination: str | Path | None = None) -> pd.DataFrame:
+         """Fold the journal into the autosave and optionally export to *destination*.
+
+         *destination* is written in the format its suffix names, like :func:`export_table`.
+         """
+         self._close_journal()
+         df = self.recover()
+         export_csv(df, self.path)
+         self.journal_path.unlink(missing_ok=True)
+         if destination is not None:
+             export_table(df, destination)
+         return df
+
+     def close(self) -> None:
+         self._close_journal()
+
+     def _open_journal(self, mode: str) -> None:
+         self._close_journal()
+         self._fp = self.journal_path.open(mode, encoding="utf-8", newline="")
+         self._writer = csv.writer(self._fp)
+         if mode == "w":
+             self._entries = 0
+
+     def _close_journal(self) -> None:
+         if self._fp is not None:
+             self._fp.close()
+         self._fp = None
+         self._writer = None
@@ -0,0 +1,148 @@
+"""Durable job manifest used to resume interrupted generation runs.
+
+Every generated row is recorded under a content hash of everything that
+determines its output: product name, description, tone, model and sampling
+parameters. A row that was already completed therefore never has to be sent to
+the API again, whether the job crashed halfway through or the same catalog was
+simply re-imported later.
+
+The manifest lives in a small SQLite database inside the user configuration
+directory, so it survives restarts without any extra dependency.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from config import settings
+
+__all__ = ["row_key", "JobManifest", "default_manifest_path"]
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT,
+    tone TEXT NOT NULL,
+    model TEXT NOT NULL,
+    params TEXT NOT NULL,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS rows (
+    key TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    result TEXT,
+    updated REAL NOT NULL
+);
+"""
+
+
+def row_key(name: str, description: str, tone: str, model: str, params: Mapping[str, Any]) -> str:
+    """Return a stable hex digest identifying one generation request."""
+    payload = json.dumps(
+        [str(name).strip(), str(description).strip(), tone, model, dict(params)],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def default_manifest_path() -> Path:
+    """Return the manifest location inside the user configuration directory."""
+    return settings._get_config_dir() / "jobs.sqlite"  # pylint: disable=protected-access
+
+
+class JobManifest:
+    """Thread-safe wrapper around the SQLite manifest.
+
+    The GUI thread registers jobs while worker threads record results, so a
+    single connection is shared behind a lock.
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path) if path is not None else default_manifest_path()
+        self._lock = threading.Lock()
+        # Shard worker processes share the file; wait for their writes instead of failing.
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30.0)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    # ---------- jobs ----------
+    def start_job(self, source: str | Path | None, tone: str, model: str, params: Mapping[str, Any]) -> int:
+        """Register a new job and return its id."""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO jobs (source, tone, model, params, created) VALUES (?, ?, ?, ?, ?)",
+                (None if source is None else str(source), tone, model, json.dumps(dict(params)), time.time()),
+            )
+            return int(cur.lastrowid)
+
+    def finish_job(self, job_id: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET finished = ? WHERE id = ?", (time.time(), job_id))
+
+    def last_unfinished_job(self) -> Optional[Dict[str, Any]]:
+        """Return the most recent job that never finished, or ``None``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, source, tone, model, params FROM jobs WHERE finished IS NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, source, tone, model, params = row
+        return {"id": job_id, "source": source, "tone": tone, "model": model, "params": json.loads(params)}
+
+    # ---------- rows ----------
+    def completed(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Return ``{key: result}`` for every key that already finished."""
+        found: Dict[str, str] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement.
+            for start in range(0, len(unique), 500):
+                part = unique[start : start + 500]
+                placeholders = ",".join("?" * len(part))
+                found.update(
+                    self._conn.execute(
+                        f"SELECT key, result FROM rows WHERE status = ? AND key IN ({placeholders})",
+                        (STATUS_DONE, *part),
+                    ).fetchall()
+                )
+        return found
+
+    def mark_pending(self, keys: Iterable[str]) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO rows (key, status, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET status = excluded.status, updated = excluded.updated "
+                "WHERE rows.status != 'done'",
+                [(key, STATUS_PENDING, now) for key in keys],
+            )
+
+    def mark_done(self, key: str, result: str) -> None:
+        self._set(key, STATUS_DONE, result)
+
+    def mark_failed(self, key: str, error: str) -> None:
+        self._set(key, STATUS_FAILED, error)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _set(self, key: str, status: str, result: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rows (key, status, result, updated) VALUES (?, ?, ?, ?)",
+                (key, status, result, time.time()),
+            )
@@ -0,0 +1,234 @@
+"""Near-duplicate product detection for ad reuse.
+
+Catalogs often list the same product many times, differing only in a size,
+colour or SKU token. :class:`NearDuplicateIndex` groups such rows so the ad is
+generated once per group (for its first row, the *representative*) and then
+adapted for the other variants:
+
+* locally, by swapping the differing tokens in the representative's ad
+  (:func:`adapt_ad`), when every swap can be made safely;
+* otherwise with a short request (:data:`prompts.base_prompts.ADAPT_PROMPT`)
+  that only rewrites those details.
+
+Rows are compared by MinHash signatures of character shingles of their
+normalized ``name + description``; locality-sensitive hashing over bands of the
+signature finds candidate groups without comparing every pair. Rows are
+assigned in input order and the index grows as the catalog is streamed
+through it, so a variant is matched to a representative from any earlier
+chunk.
+"""
+from __future__ import annotations
+
+import difflib
+import re
+import unicodedata
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from prompts.base_prompts import ADAPT_PROMPT
+from utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+__all__ = [
+    "NearDuplicateIndex",
+    "adapt_ad",
+    "adapt_prompt",
+    "format_changes",
+    "normalize_text",
+    "variant_changes",
+]
+
+_WORD = r"0-9A-Za-zА-яЁёა-ჿ"
+_SEPARATORS = re.compile(rf"[^{_WORD}]+")
+_TOKENS = re.compile(rf"[{_WORD}]+")
+_BUCKET_LIMIT = 8  # clusters kept per LSH bucket, the oldest evicted first; bounds the work per row
+
+
+def normalize_text(text: str) -> str:
+    """NFC, lower case, punctuation and runs of whitespace collapsed to one space."""
+    text = unicodedata.normalize("NFC", str(text)).lower()
+    return _SEPARATORS.sub(" ", text).strip()
+
+
+class NearDuplicateIndex:
+    """Streaming MinHash/LSH clustering of catalog rows.
+
+    Two rows belong together when the estimated Jaccard similarity of their
+    *shingle*-character n-gram sets is at least *threshold*. The signature has
+    *num_perm* values, split into *bands* LSH bands. Matches are only a
+    candidate for reuse: :func:`variant_changes` decides whether an ad can
+    actually be adapted, so a loose threshold costs little.
+    """
+
+    def __init__(self, threshold: float = 0.6, *, num_perm: int = 64, bands: int = 16, shingle: int = 4, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle = shingle
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, Deque[int]]] = [{} for _ in range(bands)]
+        self.evicted = 0  # bucket entries pushed out by newer clusters
+        self._signatures = np.zeros((1024, num_perm), dtype=np.uint32)  # grown by doubling
+        self._sources: List[str] = []  # representative's "name description"
+        self._ads: List[Optional[str]] = []
+        self.rows = 0
+
+    @property
+    def clusters(self) -> int:
+        return len(self._sources)
+
+    def signatures(self, texts: Sequence[str]) -> "np.ndarray":
+        """Return the ``(len(texts), num_perm)`` MinHash signatures of *texts*."""
+        k = self.shingle
+        padded = [text.ljust(k) for text in map(normalize_text, texts)]
+        if not padded:
+            return np.zeros((0, self.num_perm), dtype=np.uint32)
+        codes = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+        counts = lengths - k + 1
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        # Polynomial hash of every k code points (wrapping at 2**64), then keep
+        # only the windows that lie inside one text.
+        window = len(codes) - k + 1
+        rolling = np.zeros(window, dtype=np.uint64)
+        for j in range(k):
+            rolling = rolling * np.uint64(1_000_003) + codes[j : j + window]
+        positions = np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+        shingles = rolling[positions]
+        signature = np.empty((len(padded), self.num_perm), dtype=np.uint32)
+        for p in range(self.num_perm):
+            hashed = (self._a[p] * shingles + self._b[p]) >> np.uint64(32)  # multiply-shift hashing
+            signature[:, p] = np.minimum.reduceat(hashed, offsets)
+        return signature
+
+    def assign(self, names: Sequence[str], descriptions: Sequence[str]) -> List[Tuple[int, bool]]:
+        """Return ``(cluster, is_new)`` for each row, adding new clusters to the index.
+
+        A row that matches no earlier row starts a new cluster and is its
+        representative (``is_new`` is true).
+        """
+        texts = [f"{name} {description}" for name, description in zip(names, descriptions)]
+        assigned: List[Tuple[int, bool]] = []
+        for text, signature in zip(texts, self.signatures(texts)):
+            keys = self._band_keys(signature)
+            matches = self._matches(keys, signature)
+            if matches:
+                assigned.append((matches[0], False))
+            else:
+                assigned.append((self._insert(text, signature, keys), True))
+        self.rows += len(texts)
+        return assigned
+
+    def query(self, texts: Sequence[str]) -> List[List[int]]:
+        """Return, for each text, the clusters at or above the threshold, most similar first."""
+        return [self._matches(self._band_keys(signature), signature) for signature in self.signatures(texts)]
+
+    def add(self, texts: Sequence[str]) -> List[int]:
+        """Add every text as a cluster of its own and return their numbers."""
+        return [
+            self._insert(text, signature, self._band_keys(signature))
+            for text, signature in zip(texts, self.signatures(texts))
+        ]
+
+    def _band_keys(self, signature) -> List[bytes]:
+        width = self.num_perm // self.bands
+        return [signature[band * width : (band + 1) * width].tobytes() for band in range(self.bands)]
+
+    def _matches(self, keys: List[bytes], signature) -> List[int]:
+        candidates = {cluster for band, key in enumerate(keys) for cluster in self._buckets[band].get(key, ())}
+        if not candidates:
+            return []
+        ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        scores = (self._signatures[ids] == signature).sum(axis=1)
+        keep = scores >= self.threshold * self.num_perm
+        order = np.argsort(-scores[keep], kind="stable")
+        return [int(cluster) for cluster in ids[keep][order]]
+
+    def _insert(self, text: str, signature, keys: List[bytes]) -> int:
+        cluster = len(self._sources)
+        if cluster == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.zeros_like(self._signatures)])
+        self._signatures[cluster] = signature
+        self._sources.append(text)
+        self._ads.append(None)
+        for band, key in enumerate(keys):
+            bucket = self._buckets[band].get(key)
+            if bucket is None:
+                bucket = self._buckets[band][key] = deque(maxlen=_BUCKET_LIMIT)
+            elif len(bucket) == _BUCKET_LIMIT:
+                self.evicted += 1  # the oldest cluster leaves this bucket
+            bucket.append(cluster)
+        return cluster
+
+    def source(self, cluster: int) -> str:
+        """The representative's ``name description`` text."""
+        return self._sources[cluster]
+
+    def ad(self, cluster: int) -> Optional[str]:
+        return self._ads[cluster]
+
+    def set_ad(self, cluster: int, text: str) -> None:
+        self._ads[cluster] = text
+
+
+def variant_changes(source: str, target: str) -> Optional[List[Tuple[str, str]]]:
+    """Token substitutions that turn *source* into *target*.
+
+    Returns ``None`` unless the texts differ only by replaced tokens (no
+    words added or removed), which is what makes an ad safe to adapt.
+    """
+    old, new = _TOKENS.findall(source), _TOKENS.findall(target)
+    changes: List[Tuple[str, str]] = []
+    matcher = difflib.SequenceMatcher(None, [t.lower() for t in old], [t.lower() for t in new], autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        if op != "replace" or i2 - i1 != j2 - j1:
+            return None
+        changes.extend(zip(old[i1:i2], new[j1:j2]))
+    # A colour named in both the name and the description is one change, not two.
+    return list(dict.fromkeys(changes))
+
+
+def _is_code(token: str) -> bool:
+    """Sizes and SKUs: anything with a digit, or very short tokens like 'xl'."""
+    return any(ch.isdigit() for ch in token) or len(token) <= 3
+
+
+def adapt_ad(ad: str, changes: Sequence[Tuple[str, str]]) -> Optional[str]:
+    """Apply *changes* to *ad* locally, or return ``None`` if that is not safe.
+
+    A token found verbatim is swapped. A Georgian word ending in a vowel may
+    appear declined (``წითელი`` → ``წითელ მაისურს``), so its stem is swapped
+    when both words end in the same vowel. Codes the ad does not mention are
+    fine to ignore; any other word the ad does not mention means the ad may
+    describe it indirectly, so the caller should ask the model instead.
+    """
+    for old, new in changes:
+        exact = re.compile(rf"(?<![{_WORD}]){re.escape(old)}(?![{_WORD}])", re.IGNORECASE)
+        if exact.search(ad):
+            ad = exact.sub(lambda _match: new, ad)
+            continue
+        if len(old) > 4 and len(new) > 2 and old[-1] == new[-1] and old[-1] in "აეიოუ":
+            stem = re.compile(rf"(?<![{_WORD}]){re.escape(old[:-1])}", re.IGNORECASE)
+            if stem.search(ad):
+                ad = stem.sub(lambda _match: new[:-1], ad)
+                continue
+        if not _is_code(old):
+            return None
+    return ad
+
+
+def format_changes(changes: Sequence[Tuple[str, str]]) -> str:
+    return ", ".join(f"{old} → {new}" for old, new in changes)
+
+
+def adapt_prompt(ad: str, changes: str, _tone: str = "") -> str:
+    """Request that rewrites *ad* for another variant; for ``run_stream(prompt=...)``."""
+    return ADAPT_PROMPT.format(ad=ad, changes=changes)
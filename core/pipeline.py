@@ -0,0 +1,338 @@
+"""Multi-step generation pipelines.
+
+A :class:`Pipeline` is a small DAG of :class:`Stage` objects, for example
+*extract benefits → draft → shorten to channel length → validate*. A stage is
+either a model call (a prompt template plus its own backend, so cheap steps can
+use a cheaper model) or a local function.
+
+Rows stream through the graph: every row is driven by its own task, which
+starts a stage as soon as the stages it depends on have finished for that row.
+Each model stage limits its own concurrency, so while one row is shortened the
+next is drafted and the one after that has its benefits extracted; no stage
+waits for the whole sheet.
+
+Model stages may share a :class:`~core.cache.ResponseCache`. Entries are keyed
+by the rendered prompt, model and sampling parameters, so re-running a sheet
+after changing only the last stage repeats only that stage.
+
+:meth:`Pipeline.stream` has the same contract as
+:func:`core.runner.run_stream`, which lets :func:`core.runner.generate_file`
+use either.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from core.ad_generator import AdResult, estimate_tokens
+from core.cache import ResponseCache
+from core.runner import map_bounded
+from prompts.pipeline_prompts import BENEFITS_PROMPT, DRAFT_PROMPT, SHORTEN_PROMPT
+from prompts.tone_prompts import TONES
+from utils.quality import georgian_ratio
+from utils.rate_limit import RateLimiter
+
+__all__ = ["Stage", "Pipeline", "StageError", "default_pipeline", "georgian_check"]
+
+_STAT_FIELDS = ("calls", "cache_hits", "bypassed", "failed", "prompt_tokens", "completion_tokens", "seconds")
+
+Values = Dict[str, Any]
+
+
+class StageError(RuntimeError):
+    """A stage failed or rejected its input; the message names the stage."""
+
+
+@dataclass
+class Stage:
+    """One step of a :class:`Pipeline`.
+
+    Give either *prompt* and *backend* (a model call; the template is filled
+    from the row's ``name``, ``description`` and ``tone``, the pipeline
+    context and the outputs of earlier stages, by stage name) or *func*, a
+    local ``func(values) -> str`` that may raise :class:`StageError` to reject
+    the row. *bypass* may return a text to use instead of calling the model,
+    or ``None`` to call it.
+    """
+
+    name: str
+    prompt: Optional[str] = None
+    backend: Any = None
+    func: Optional[Callable[[Values], str]] = None
+    depends: Sequence[str] = ()
+    concurrency: int = 4
+    cache: Optional[ResponseCache] = None
+    bypass: Optional[Callable[[Values], Optional[str]]] = None
+
+    def __post_init__(self):
+        if (self.prompt is None) == (self.func is None):
+            raise ValueError(f"stage {self.name!r} needs exactly one of prompt and func")
+        if self.prompt is not None and self.backend is None:
+            raise ValueError(f"stage {self.name!r} has a prompt but no backend")
+        self.depends = tuple(self.depends)
+
+    def describe(self) -> List[Any]:
+        """Everything that determines this stage's output, for signatures and cache keys."""
+        if self.func is not None:
+            return [self.name, "func", getattr(self.func, "__qualname__", repr(self.func)), list(self.depends)]
+        backend = self.backend
+        return [
+            self.name,
+            self.prompt,
+            list(self.depends),
+            getattr(backend, "model", type(backend).__name__),
+            getattr(backend, "max_tokens", None),
+            getattr(backend, "temperature", None),
+        ]
+
+    def cache_key(self, prompt: str) -> str:
+        _name, _template, _depends, *model = self.describe()
+        payload = json.dumps(["stage", prompt, *model], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Pipeline:
+    """A DAG of stages whose *output* stage (by default the last one) gives the ad."""
+
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        *,
+        output: Optional[str] = None,
+        context: Optional[Mapping[str, Any]] = None,
+    ):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages or stage.name in ("name", "description", "tone"):
+                raise ValueError(f"duplicate or reserved stage name {stage.name!r}")
+            self.stages[stage.name] = stage
+        for stage in stages:
+            for dependency in stage.depends:
+                if dependency not in self.stages:
+                    raise ValueError(f"stage {stage.name!r} depends on unknown stage {dependency!r}")
+        self.order = _topological_order(self.stages)
+        self.output = output or self.order[-1]
+        if self.output not in self.stages:
+            raise ValueError(f"unknown output stage {self.output!r}")
+        self.context = dict(context or {})
+        self.stats: Dict[str, Dict[str, float]] = {name: dict.fromkeys(_STAT_FIELDS, 0) for name in self.order}
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def signature(self) -> str:
+        """Short digest of the stages and context, used to key manifest rows."""
+        payload = json.dumps(
+            [[self.stages[name].describe() for name in self.order], self.output, self.context],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    async def stream(
+        self,
+        items: Union[Iterable[Tuple[Any, str, str]], AsyncIterable[Tuple[Any, str, str]]],
+        tone: str,
+        *,
+        concurrency: Optional[int] = None,
+        limiter: Optional[RateLimiter] = None,
+    ) -> AsyncIterator[Tuple[Any, Union[AdResult, Exception]]]:
+        """Run every ``(key, name, description)`` item through the pipeline.
+
+        Yields ``(key, result)`` in completion order; the result's text is the
+        output stage's and its token counts are summed over all stages.
+        *concurrency* bounds the rows in flight and defaults to the sum of
+        the model stages' concurrency, enough to keep every stage busy.
+        """
+        loop = asyncio.get_running_loop()
+        model_stages = [stage for stage in self.stages.values() if stage.prompt is not None]
+        pools = {
+            stage.name: ThreadPoolExecutor(max_workers=max(1, stage.concurrency), thread_name_prefix=f"stage-{stage.name}")
+            for stage in model_stages
+        }
+        if self._slots_loop is not loop:  # streams overlapping on one loop share the stage limits
+            self._slots = {stage.name: asyncio.Semaphore(max(1, stage.concurrency)) for stage in model_stages}
+            self._slots_loop = loop
+        slots = self._slots
+        width = concurrency or sum(max(1, stage.concurrency) for stage in model_stages) or 1
+        tone_text = TONES.get(tone, tone)
+
+        async def _call(stage: Stage, values: Values) -> AdResult:
+            stats = self.stats[stage.name]
+            if stage.func is not None:
+                return AdResult(text=stage.func(values))
+            if stage.bypass is not None:
+                text = stage.bypass(values)
+                if text is not None:
+                    stats["bypassed"] += 1
+                    return AdResult(text=text)
+            prompt = stage.prompt.format_map(values)
+            key = stage.cache_key(prompt) if stage.cache is not None else None
+            if key is not None:
+                cached = stage.cache.get(key)
+                if cached is not None:
+                    stats["cache_hits"] += 1
+                    return AdResult(text=cached.text)  # already paid for
+            estimate = estimate_tokens(prompt, getattr(stage.backend, "max_tokens", 0))
+            async with slots[stage.name]:
+                if limiter is not None:
+                    await limiter.wait(estimate)
+                result = await loop.run_in_executor(pools[stage.name], stage.backend.complete, prompt)
+            if limiter is not None and result.total_tokens:
+                limiter.settle(estimate, result.total_tokens)
+            stats["calls"] += 1
+            stats["prompt_tokens"] += result.prompt_tokens
+            stats["completion_tokens"] += result.completion_tokens
+            stats["seconds"] += result.latency
+            if key is not None:
+                stage.cache.put(key, result)
+            return result
+
+        async def _stage(stage: Stage, values: Values) -> AdResult:
+            try:
+                return await _call(stage, values)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001 - reported per row
+                self.stats[stage.name]["failed"] += 1
+                raise StageError(f"{stage.name}: {exc}") from exc
+
+        async def _row(key: Any, name: str, description: str) -> Tuple[Any, Union[AdResult, Exception]]:
+            start = time.perf_counter()
+            values: Values = {**self.context, "name": name, "description": description, "tone": tone_text}
+            results: Dict[str, AdResult] = {}
+            running: Dict[asyncio.Future, str] = {}
+            waiting = list(self.order)
+            try:
+                while waiting or running:
+                    for stage_name in [s for s in waiting if all(d in results for d in self.stages[s].depends)]:
+                        waiting.remove(stage_name)
+                        running[asyncio.ensure_future(_stage(self.stages[stage_name], dict(values)))] = stage_name
+                    done, _pending = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        stage_name = running.pop(task)
+                        results[stage_name] = task.result()
+                        values[stage_name] = results[stage_name].text
+            except Exception as exc:  # noqa: BLE001 - reported per row
+                for task in running:
+                    task.cancel()
+                return key, exc
+            return key, AdResult(
+                text=values[self.output],
+                prompt_tokens=sum(result.prompt_tokens for result in results.values()),
+                completion_tokens=sum(result.completion_tokens for result in results.values()),
+                latency=time.perf_counter() - start,
+            )
+
+        rows = map_bounded(items, _row, concurrency=width)
+        try:
+            async for item in rows:
+                yield item
+        finally:
+            await rows.aclose()
+            for pool in pools.values():
+                pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _topological_order(stages: Mapping[str, Stage]) -> List[str]:
+    """Stage names with every stage after its dependencies, keeping declaration order otherwise."""
+    order: List[str] = []
+    remaining = list(stages)
+    while remaining:
+        ready = [name for name in remaining if all(d in order for d in stages[name].depends)]
+        if not ready:
+            raise ValueError(f"stages form a cycle: {', '.join(remaining)}")
+        order.append(ready[0])
+        remaining.remove(ready[0])
+    return order
+
+
+# ---------- default pipeline ----------
+
+
+def georgian_check(source: str, *, min_ratio: float = 0.8) -> Callable[[Values], str]:
+    """Return a local stage function that passes the text of stage *source* through.
+
+    The text is stripped of surrounding quotes; it is rejected when it is
+    empty or less than *min_ratio* of its letters are Mkhedruli, by the same
+    rule as the quality gate (:func:`utils.quality.georgian_ratio`).
+    """
+
+    def check(values: Values) -> str:
+        text = str(values[source]).strip().strip("\"'„“”«»").strip()
+        ratio = georgian_ratio(text, f"{values.get('name', '')} {values.get('description', '')}")
+        if ratio is None:
+            raise StageError("empty output")
+        if ratio < min_ratio:
+            raise StageError(f"only {ratio:.0%} of the letters are Georgian")
+        return text
+
+    check.__qualname__ = f"georgian_check({source!r}, min_ratio={min_ratio})"
+    return check
+
+
+def default_pipeline(
+    backend_factory: Callable[[str, int, float], Any],
+    *,
+    model: str,
+    max_tokens: int,
+    temperature: float,
+    helper_model: Optional[str] = None,
+    max_chars: int = 200,
+    concurrency: int = 8,
+    cache: Optional[ResponseCache] = None,
+) -> Pipeline:
+    """Benefits → draft → shorten → validate, with the helper steps on *helper_model*.
+
+    *backend_factory* is called as ``factory(model, max_tokens, temperature)``.
+    The shorten step only calls the model for drafts longer than *max_chars*.
+    """
+    helper_model = helper_model or model
+    return Pipeline(
+        [
+            Stage(
+                "benefits",
+                prompt=BENEFITS_PROMPT,
+                backend=backend_factory(helper_model, 120, 0.3),
+                concurrency=concurrency,
+                cache=cache,
+            ),
+            Stage(
+                "draft",
+                prompt=DRAFT_PROMPT,
+                backend=backend_factory(model, max_tokens, temperature),
+                depends=("benefits",),
+                concurrency=concurrency,
+                cache=cache,
+            ),
+            Stage(
+                "shorten",
+                prompt=SHORTEN_PROMPT,
+                backend=backend_factory(helper_model, max_tokens, 0.2),
+                depends=("draft",),
+                concurrency=max(1, concurrency // 2),
+                cache=cache,
+                bypass=lambda values: values["draft"] if len(values["draft"]) <= max_chars else None,
+            ),
+            Stage("validate", func=georgian_check("shorten"), depends=("shorten",)),
+        ],
+        context={"max_chars": max_chars},
+    )
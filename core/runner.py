@@ -0,0 +1,448 @@
+"""Streaming asynchronous generation runner.
+
+:func:`run_stream` takes an (a)synchronous iterable of ``(key, name,
+description)`` requests and yields ``(key, result)`` pairs as soon as each one
+completes, where *result* is an :class:`~core.ad_generator.AdResult` or the
+exception that request raised. At most *concurrency* requests are in flight;
+the input is only pulled when a slot frees up, so a slow backend throttles the
+reader instead of letting work pile up in memory.
+
+The backend is any object with a blocking ``complete(prompt) -> AdResult``
+method (:class:`~core.ad_generator.OpenAIBackend`,
+:class:`~core.ad_generator.MockBackend`); calls run on a private thread pool
+sized to *concurrency*.
+
+:func:`generate_file` builds on it to fill a whole catalog file chunk by chunk,
+which is what the headless ``generate`` command and its shard workers run.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from core import csv_handler
+from core.ad_generator import AdResult, build_prompt, estimate_tokens
+from core.cache import ResponseCache, cache_scope
+from core.job_manifest import JobManifest, row_key
+from core.near_dup import NearDuplicateIndex, adapt_ad, adapt_prompt, format_changes, variant_changes
+from utils.quality import QualityGate
+from utils.rate_limit import RateLimiter
+from utils.validation import pending_mask
+
+__all__ = ["run_stream", "map_bounded", "generate_file", "Counters", "TooManyFailures"]
+
+MAX_REPORTED_ERRORS = 5
+
+K = TypeVar("K", bound=Hashable)
+Request = Tuple[K, str, str]
+
+
+async def _aiter(items: Union[Iterable[Request], AsyncIterable[Request]]) -> AsyncIterator[Request]:
+    if hasattr(items, "__aiter__"):
+        async for item in items:  # type: ignore[union-attr]
+            yield item
+    else:
+        for item in items:  # type: ignore[union-attr]
+            yield item
+
+
+async def run_stream(
+    items: Union[Iterable[Request], AsyncIterable[Request]],
+    backend,
+    tone: str,
+    *,
+    concurrency: int = 3,
+    limiter: Optional[RateLimiter] = None,
+    prompt: Callable[[str, str, str], str] = build_prompt,
+    slots: Optional[asyncio.Semaphore] = None,
+) -> AsyncIterator[Tuple[K, Union[AdResult, Exception]]]:
+    """Generate ads for *items*, yielding results in completion order.
+
+    *prompt* turns an item's two texts and the tone into the request; by
+    default they are the product name and description. *slots*, shared by
+    several streams, bounds their backend calls together.
+    """
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="ad-gen")
+    max_tokens = getattr(backend, "max_tokens", 0)
+
+    async def _one(key: K, name: str, description: str) -> Tuple[K, Union[AdResult, Exception]]:
+        text = prompt(name, description, tone)
+        estimate = estimate_tokens(text, max_tokens)
+        if slots is not None:
+            await slots.acquire()
+        try:
+            if limiter is not None:
+                await limiter.wait(estimate)
+            result = await loop.run_in_executor(pool, backend.complete, text)
+        except Exception as exc:  # noqa: BLE001 - reported per request
+            return key, exc
+        finally:
+            if slots is not None:
+                slots.release()
+        if limiter is not None and result.total_tokens:
+            limiter.settle(estimate, result.total_tokens)
+        return key, result
+
+    results = map_bounded(items, _one, concurrency=concurrency)
+    try:
+        async for item in results:
+            yield item
+    finally:
+        await results.aclose()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def map_bounded(
+    items: Union[Iterable[Request], AsyncIterable[Request]],
+    worker: Callable[..., Awaitable[Tuple[K, Any]]],
+    *,
+    concurrency: int,
+) -> AsyncIterator[Tuple[K, Any]]:
+    """Run ``worker(*item)`` for each item with at most *concurrency* running.
+
+    Yields the workers' return values in completion order. Items are only
+    pulled when a slot is free.
+    """
+    source = _aiter(items)
+    in_flight: set[asyncio.Future] = set()
+    fetch: Optional[asyncio.Future] = None  # pending read of the next request
+    exhausted = False
+    try:
+        while True:
+            if fetch is None and not exhausted and len(in_flight) < concurrency:
+                fetch = asyncio.ensure_future(source.__anext__())
+            waiting = in_flight | ({fetch} if fetch is not None else set())
+            if not waiting:
+                break
+            # Wait for the input and the running requests together, so a source
+            # that blocks (an idle stdin, an empty watch folder) never holds
+            # back results that are already finished.
+            done, _pending = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if fetch in done:
+                try:
+                    item = fetch.result()
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    in_flight.add(asyncio.ensure_future(worker(*item)))
+                done.discard(fetch)
+                fetch = None
+            for task in done:
+                in_flight.discard(task)
+                yield task.result()
+    finally:
+        for task in in_flight:
+            task.cancel()
+        if fetch is not None:
+            fetch.cancel()
+
+
+class TooManyFailures(RuntimeError):
+    """Raised by :func:`generate_file` once *max_failures* requests failed."""
+
+
+class Counters:
+    """Progress counters updated by :func:`generate_file`.
+
+    Subclasses override :meth:`update` to display or publish them.
+    """
+
+    def __init__(self) -> None:
+        self.rows = 0
+        self.generated = 0
+        self.restored = 0
+        self.failed = 0
+        self.retried = 0  # requests re-sent after the quality gate rejected an ad
+        self.retry_tokens = 0  # tokens those re-sent requests cost
+        self.rejected = 0  # rows left empty because every attempt was rejected
+        self.reused = 0  # near-duplicate rows given an adapted ad locally
+        self.adapted = 0  # near-duplicate rows adapted with a short request
+        self.saved_tokens = 0  # estimated tokens those rows did not cost
+        self.cached = 0  # rows answered from the response cache
+
+    def update(self, *, force: bool = False) -> None:
+        """Called whenever the counters changed."""
+
+
+class _Average:
+    """Running mean of the tokens a full generation costs."""
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.count = 0
+
+    def add(self, value: int) -> None:
+        self.total += value
+        self.count += 1
+
+    def average(self) -> int:
+        return self.total // self.count if self.count else 0
+
+
+def generate_file(
+    source: str | Path,
+    output: str | Path,
+    backend,
+    *,
+    tone: str,
+    model: str,
+    params: Mapping[str, Any],
+    concurrency: int = 8,
+    limiter: Optional[RateLimiter] = None,
+    manifest: Optional[JobManifest] = None,
+    chunk_size: int = 1_000,
+    progress: Optional[Counters] = None,
+    errors: Optional[List[str]] = None,
+    max_failures: Optional[int] = None,
+    pipeline=None,
+    quality: Optional[QualityGate] = None,
+    retries: int = 2,
+    near_duplicates: Optional[NearDuplicateIndex] = None,
+    cache: Optional[ResponseCache] = None,
+) -> int:
+    """Fill the ads of *source* and write the result to *output*; return the row count.
+
+    Input is read and output written one chunk at a time, on one event loop:
+    the next chunk starts while the current one finishes, so *concurrency*
+    requests stay in flight across chunk boundaries. With a *manifest*,
+    rows it already knows are restored instead of generated and new results
+    are recorded in it. Failed rows keep an empty ad; the first few messages
+    are appended to *errors*. With a :class:`~core.pipeline.Pipeline`, rows
+    go through its stages instead of a single *backend* call.
+
+    With a *quality* gate, each chunk's new ads are checked together and only
+    the rejected rows are requested again, up to *retries* times; rows that
+    never pass stay empty and are counted in ``progress.rejected``.
+
+    With a *near_duplicates* index, only the first row of each group of
+    near-identical products is generated; the others get its ad with their
+    differing tokens swapped in, locally or with a short request, and the
+    tokens that saved are estimated in ``progress.saved_tokens``.
+
+    With a response *cache*, rows it can answer (exactly or, if it is fuzzy,
+    by similarity) are filled from it, once the *quality* gate accepts the
+    cached ad, and counted in ``progress.cached``; new ads are added to it.
+    """
+    progress = progress if progress is not None else Counters()
+    errors = errors if errors is not None else []
+    full_cost = _Average()
+    scope = cache_scope(tone, model, params)
+    slots: Optional[asyncio.Semaphore] = None  # shared by the chunks in flight
+    ready: Dict[int, asyncio.Future] = {}  # cluster -> done once its representative's ad is known
+
+    async def _fill(chunk):
+        todo = chunk[pending_mask(chunk)]
+        if not len(todo):
+            return chunk
+        chunk = chunk.copy()
+        rows: List[Tuple[Any, str, str]] = list(zip(todo.index, todo["name"], todo["description"]))
+
+        keys: Dict[Any, str] = {}
+        if manifest is not None or cache is not None:
+            keys = {idx: row_key(name, desc, tone, model, params) for idx, name, desc in rows}
+        if manifest is not None:
+            done = manifest.completed(keys.values())
+            restored = {idx: done[key] for idx, key in keys.items() if key in done}
+            if restored:
+                chunk.loc[list(restored), "ad"] = list(restored.values())
+                progress.restored += len(restored)
+                rows = [row for row in rows if row[0] not in restored]
+        products = {idx: (name, desc) for idx, name, desc in rows}
+        cached: Dict[Any, AdResult] = {}
+        if cache is not None:
+            for idx, name, desc in rows:
+                result, _similarity = cache.lookup(keys[idx], f"{name} {desc}", scope)
+                if result is not None:
+                    cached[idx] = result
+            if quality is not None and cached:
+                # Cached ads may come from old exports; rejected ones are generated afresh.
+                verdict = quality.check(
+                    [result.text for result in cached.values()],
+                    [products[idx][0] for idx in cached],
+                    [products[idx][1] for idx in cached],
+                )
+                cached = {idx: result for (idx, result), reason in zip(cached.items(), verdict) if not reason}
+            progress.cached += len(cached)
+            rows = [row for row in rows if row[0] not in cached]
+        if manifest is not None:
+            manifest.mark_pending(keys[idx] for idx, _n, _d in rows)
+
+        async def _collect(batch: List[Tuple[Any, str, str]], kind: str = "first") -> Dict[Any, AdResult]:
+            """Request *batch*; *kind* is ``first``, ``retry`` or ``adapt``."""
+            ads: Dict[Any, AdResult] = {}
+            if kind == "adapt":
+                results = run_stream(
+                    batch, backend, tone, concurrency=concurrency, limiter=limiter, prompt=adapt_prompt, slots=slots
+                )
+            elif pipeline is not None:
+                results = pipeline.stream(batch, tone, limiter=limiter)
+            else:
+                results = run_stream(batch, backend, tone, concurrency=concurrency, limiter=limiter, slots=slots)
+            async for idx, result in results:
+                if isinstance(result, Exception):
+                    if kind == "adapt":
+                        continue  # the row is generated in full instead
+                    progress.failed += 1
+                    if kind == "retry":
+                        progress.generated -= 1  # counted when its first attempt succeeded
+                    if manifest is not None:
+                        manifest.mark_failed(keys[idx], str(result))
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(f"row {idx}: {type(result).__name__}: {result}")
+                    if max_failures is not None and progress.failed > max_failures:
+                        raise TooManyFailures(f"more than {max_failures} failed requests")
+                else:
+                    ads[idx] = result
+                    if kind == "retry":
+                        progress.retry_tokens += result.total_tokens
+                    elif kind == "first":  # adapted ads are counted by _reuse once the gate accepts them
+                        progress.generated += 1
+                        full_cost.add(result.total_tokens)
+                progress.update()
+            return ads
+
+        async def _generate(batch: List[Tuple[Any, str, str]]) -> Dict[Any, AdResult]:
+            ads = await _collect(batch) if batch else {}
+            if quality is None or not ads:
+                return ads
+            fresh = ads
+            for attempt in range(retries + 1):
+                verdict = quality.check(
+                    [result.text for result in fresh.values()],
+                    [products[idx][0] for idx in fresh],
+                    [products[idx][1] for idx in fresh],
+                )
+                rejected = {idx: reason for idx, reason in zip(fresh, verdict) if reason}
+                if not rejected:
+                    break
+                for idx in rejected:
+                    del ads[idx]
+                if attempt == retries:
+                    for idx, reason in rejected.items():
+                        progress.rejected += 1
+                        progress.generated -= 1
+                        if manifest is not None:
+                            manifest.mark_failed(keys[idx], f"quality: {reason}")
+                        if len(errors) < MAX_REPORTED_ERRORS:
+                            errors.append(f"row {idx}: rejected by quality gate ({reason})")
+                    break
+                progress.retried += len(rejected)
+                fresh = await _collect([(idx, *products[idx]) for idx in rejected], "retry")
+                ads.update(fresh)
+            return ads
+
+        async def _reuse(members: Dict[Any, int]) -> Dict[Any, AdResult]:
+            """Adapt the representatives' ads for *members* (row -> cluster)."""
+            # Representatives may still be generating in the previous chunk.
+            waiting = {ready[cluster] for cluster in members.values() if cluster in ready}
+            if waiting:
+                await asyncio.wait(waiting)
+            local: Dict[Any, AdResult] = {}
+            requests: List[Tuple[Any, str, str]] = []
+            for idx, cluster in members.items():
+                base = near_duplicates.ad(cluster)
+                name, description = products[idx]
+                changes = variant_changes(near_duplicates.source(cluster), f"{name} {description}")
+                if base is None or changes is None:
+                    continue
+                text = adapt_ad(base, changes)
+                if text is not None:
+                    local[idx] = AdResult(text=text)
+                elif backend is not None:
+                    requests.append((idx, base, format_changes(changes)))
+            adapted = await _collect(requests, "adapt") if requests else {}
+            ads = {**local, **adapted}
+            if quality is not None and ads:
+                verdict = quality.check(
+                    [result.text for result in ads.values()],
+                    [products[idx][0] for idx in ads],
+                    [products[idx][1] for idx in ads],
+                    duplicates=False,  # a SKU- or size-only variant keeps its base ad's text
+                )
+                ads = {idx: result for (idx, result), reason in zip(ads.items(), verdict) if not reason}
+            for idx, result in ads.items():
+                if idx in local:
+                    progress.reused += 1
+                    progress.saved_tokens += full_cost.average()
+                else:
+                    progress.adapted += 1
+                    progress.saved_tokens += max(0, full_cost.average() - result.total_tokens)
+            progress.update()
+            # Rows that could not be adapted, or whose adapted ad was rejected, are generated in full.
+            ads.update(await _generate([(idx, *products[idx]) for idx in members if idx not in ads]))
+            return ads
+
+        if near_duplicates is None or not rows:
+            ads = await _generate(rows)
+        else:
+            clusters = near_duplicates.assign([name for _i, name, _d in rows], [desc for _i, _n, desc in rows])
+            members = {idx: cluster for (idx, _n, _d), (cluster, new) in zip(rows, clusters) if not new}
+            started = [cluster for cluster, new in clusters if new]
+            loop = asyncio.get_running_loop()
+            ready.update((cluster, loop.create_future()) for cluster in started)
+            try:
+                ads = await _generate([row for row in rows if row[0] not in members])
+                for (idx, _n, _d), (cluster, new) in zip(rows, clusters):
+                    if new and idx in ads:
+                        near_duplicates.set_ad(cluster, ads[idx].text)
+            finally:
+                for cluster in started:
+                    ready.pop(cluster).set_result(None)
+            ads.update(await _reuse(members))
+        if cache is not None and ads:
+            cache.put_many([(keys[idx], result, " ".join(products[idx]), scope) for idx, result in ads.items()])
+        ads.update(cached)
+        if ads:
+            chunk.loc[list(ads), "ad"] = [result.text for result in ads.values()]
+            if manifest is not None:
+                for idx, result in ads.items():
+                    manifest.mark_done(keys[idx], result.text)
+        return chunk
+
+    async def _run() -> int:
+        nonlocal slots
+        slots = asyncio.Semaphore(max(1, concurrency))
+        in_flight: Deque[Tuple[int, asyncio.Future]] = deque()  # at most the chunk being finished and the next
+
+        def _written(rows: int) -> None:
+            progress.rows += rows
+            progress.update()
+
+        with csv_handler.TableWriter(output) as writer:
+            try:
+                for chunk in csv_handler.iter_table_chunks(source, chunk_size):
+                    in_flight.append((len(chunk), asyncio.ensure_future(_fill(chunk))))
+                    if len(in_flight) > 1:
+                        rows, task = in_flight.popleft()
+                        writer.write(await task)
+                        _written(rows)
+                while in_flight:
+                    rows, task = in_flight.popleft()
+                    writer.write(await task)
+                    _written(rows)
+            finally:
+                for _rows, task in in_flight:
+                    task.cancel()
+        return writer.rows
+
+    return asyncio.run(_run())
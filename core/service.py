@@ -0,0 +1,308 @@
+"""Local HTTP generation service.
+
+One process serves every internal tool, so they share a single OpenAI
+connection pool, one rate limiter and one response cache. Identical requests
+that arrive while the first one is still running are coalesced: they wait for
+that call instead of paying for their own.
+
+Endpoints (JSON in, JSON out)::
+
+    POST /v1/generate        {"name", "description", "tone"?, "model"?,
+                              "max_tokens"?, "temperature"?}
+                             -> {"ad", "usage", "latency", "cached", "coalesced",
+                                 "similarity"? (fuzzy cache hits)}
+    POST /v1/generate/batch  {"items": [...], plus defaults for the items}
+                             -> {"results": [...]} in input order
+    GET  /metrics            counters and latency figures
+    GET  /v1/cache/fuzzy     recent fuzzy cache hits, for auditing
+    GET  /healthz            {"status": "ok"}
+
+Run it with ``python -m core serve`` (``--backend mock`` for local testing).
+The server uses only the standard library.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.ad_generator import AdResult, build_prompt, estimate_tokens
+from core.cache import ResponseCache, cache_scope
+from core.job_manifest import row_key
+from prompts.tone_prompts import TONES
+from utils.rate_limit import RateLimiter
+from utils.validation import row_is_complete
+
+__all__ = ["GenerationService", "make_server", "serve"]
+
+MAX_BODY_BYTES = 4 * 1024 * 1024
+MAX_BATCH_ITEMS = 1_000
+
+BackendFactory = Callable[[str, int, float], Any]
+
+
+class RequestError(ValueError):
+    """Raised for malformed client requests (answered with HTTP 400)."""
+
+
+class GenerationService:
+    """Shared generation state behind the HTTP handlers.
+
+    *backend_factory* is called as ``factory(model, max_tokens, temperature)``
+    and must return an object with a blocking ``complete(prompt)`` method;
+    backends are created once per parameter combination and reused.
+    *backend_kind* other than ``"openai"`` (e.g. ``"mock"``) is part of every
+    cache key, so test responses are never served to real clients.
+    """
+
+    def __init__(
+        self,
+        backend_factory: BackendFactory,
+        *,
+        defaults: Dict[str, Any],
+        concurrency: int = 8,
+        limiter: Optional[RateLimiter] = None,
+        cache: Optional[ResponseCache] = None,
+        backend_kind: str = "openai",
+    ):
+        self.defaults = dict(defaults)
+        self.backend_kind = backend_kind
+        self.limiter = limiter
+        self.cache = cache
+        self._backend_factory = backend_factory
+        self._backends: Dict[Tuple[str, int, float], Any] = {}
+        self._upstream = threading.BoundedSemaphore(max(1, concurrency))
+        self._batch_pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._started = time.time()
+        self._counters: Dict[str, float] = dict.fromkeys(
+            (
+                "requests",
+                "batch_requests",
+                "cache_hits",
+                "fuzzy_cache_hits",
+                "coalesced",
+                "upstream_calls",
+                "errors",
+                "prompt_tokens",
+                "completion_tokens",
+                "upstream_latency_total",
+            ),
+            0,
+        )
+
+    # ---------- generation ----------
+    def generate(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate (or reuse) the ad for one request item."""
+        name, description = item.get("name"), item.get("description")
+        if not row_is_complete(name, description):
+            raise RequestError("'name' and 'description' are required")
+        tone = item.get("tone", self.defaults["tone"])
+        if tone not in TONES:
+            raise RequestError(f"unknown tone {tone!r}")
+        model = str(item.get("model", self.defaults["model"]))
+        try:
+            max_tokens = int(item.get("max_tokens", self.defaults["max_tokens"]))
+            temperature = float(item.get("temperature", self.defaults["temperature"]))
+        except (TypeError, ValueError) as exc:
+            raise RequestError(f"invalid sampling parameter: {exc}") from exc
+        self._count("requests")
+
+        params: Dict[str, Any] = {"max_tokens": max_tokens, "temperature": temperature}
+        if self.backend_kind != "openai":
+            params["backend"] = self.backend_kind  # same keys as the CLI's dry runs
+        key = row_key(name, description, tone, model, params)
+        text, scope = f"{name} {description}", cache_scope(tone, model, params)
+        if self.cache is not None:
+            cached, similarity = self.cache.lookup(key, text, scope)
+            if cached is not None:
+                self._count("cache_hits")
+                if similarity is not None:
+                    self._count("fuzzy_cache_hits")
+                    return {**_response(cached, cached=True), "similarity": round(similarity, 3)}
+                return _response(cached, cached=True)
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        if not owner:
+            self._count("coalesced")
+            return _response(future.result(), coalesced=True)
+
+        try:
+            result = self._call_upstream(str(name), str(description), tone, model, max_tokens, temperature)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            if self.cache is not None:
+                self.cache.put(key, result, text=text, scope=scope)
+            return _response(result)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def generate_batch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate every item of a batch concurrently; results keep input order."""
+        items = body.get("items")
+        if not isinstance(items, list) or not items:
+            raise RequestError("'items' must be a non-empty list")
+        if len(items) > MAX_BATCH_ITEMS:
+            raise RequestError(f"at most {MAX_BATCH_ITEMS} items per batch")
+        shared = {k: v for k, v in body.items() if k != "items"}
+        self._count("batch_requests")
+
+        def _one(item: Any) -> Dict[str, Any]:
+            if not isinstance(item, dict):
+                return {"error": "each item must be an object"}
+            try:
+                return self.generate({**shared, **item})
+            except RequestError as exc:
+                return {"error": str(exc)}
+            except Exception as exc:  # noqa: BLE001 - reported per item
+                return {"error": f"{type(exc).__name__}: {exc}"}
+
+        return {"results": list(self._batch_pool.map(_one, items))}
+
+    def _call_upstream(
+        self, name: str, description: str, tone: str, model: str, max_tokens: int, temperature: float
+    ) -> AdResult:
+        backend = self._backend(model, max_tokens, temperature)
+        prompt = build_prompt(name, description, tone)
+        estimate = estimate_tokens(prompt, max_tokens)
+        with self._upstream:
+            if self.limiter is not None:
+                self.limiter.acquire(estimate)
+            self._count("upstream_calls")
+            try:
+                result = backend.complete(prompt)
+            except Exception:
+                self._count("errors")
+                raise
+        if self.limiter is not None and result.total_tokens:
+            self.limiter.settle(estimate, result.total_tokens)
+        self._count("prompt_tokens", result.prompt_tokens)
+        self._count("completion_tokens", result.completion_tokens)
+        self._count("upstream_latency_total", result.latency)
+        return result
+
+    def _backend(self, model: str, max_tokens: int, temperature: float):
+        params = (model, max_tokens, temperature)
+        with self._lock:
+            backend = self._backends.get(params)
+            if backend is None:
+                backend = self._backends[params] = self._backend_factory(*params)
+        return backend
+
+    # ---------- metrics ----------
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            data: Dict[str, Any] = dict(self._counters)
+            data["in_flight"] = len(self._in_flight)
+        calls = data["upstream_calls"]
+        data["upstream_latency_avg"] = data.pop("upstream_latency_total") / calls if calls else 0.0
+        data["uptime_seconds"] = time.time() - self._started
+        if self.cache is not None:
+            data["cache_hit_rate"] = data["cache_hits"] / data["requests"] if data["requests"] else 0.0
+            data["fuzzy_cache_hit_rate"] = data["fuzzy_cache_hits"] / data["requests"] if data["requests"] else 0.0
+            data["fuzzy_index_evictions"] = self.cache.index_evictions
+        if self.limiter is not None:
+            data["limits"] = {"rpm": self.limiter.rpm, "tpm": self.limiter.tpm}
+        return data
+
+    def close(self) -> None:
+        self._batch_pool.shutdown(wait=False, cancel_futures=True)
+        if self.cache is not None:
+            self.cache.close()
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+
+def _response(result: AdResult, *, cached: bool = False, coalesced: bool = False) -> Dict[str, Any]:
+    return {
+        "ad": result.text,
+        "usage": {
+            "prompt_tokens": result.prompt_tokens,
+            "completion_tokens": result.completion_tokens,
+            "total_tokens": result.total_tokens,
+        },
+        "latency": round(result.latency, 3),
+        "cached": cached,
+        "coalesced": coalesced,
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "QartuliKutxe/1.0"
+    protocol_version = "HTTP/1.1"
+    service: GenerationService  # set on the subclass created by make_server()
+    quiet = False
+
+    def do_GET(self):  # noqa: N802
+        if self.path == "/healthz":
+            self._send(HTTPStatus.OK, {"status": "ok"})
+        elif self.path == "/metrics":
+            self._send(HTTPStatus.OK, self.service.metrics())
+        elif self.path == "/v1/cache/fuzzy" and self.service.cache is not None:
+            self._send(HTTPStatus.OK, {"hits": self.service.cache.fuzzy_audit()})
+        else:
+            self._send(HTTPStatus.NOT_FOUND, {"error": "not found"})
+
+    def do_POST(self):  # noqa: N802
+        routes = {"/v1/generate": self.service.generate, "/v1/generate/batch": self.service.generate_batch}
+        handler = routes.get(self.path)
+        if handler is None:
+            self._send(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_BODY_BYTES:
+                raise RequestError("request body too large")
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise RequestError("expected a JSON object")
+            self._send(HTTPStatus.OK, handler(body))
+        except (RequestError, ValueError) as exc:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": str(exc)})
+        except Exception as exc:  # noqa: BLE001
+            self._send(HTTPStatus.BAD_GATEWAY, {"error": f"{type(exc).__name__}: {exc}"})
+
+    def _send(self, status: HTTPStatus, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(service: GenerationService, host: str = "127.0.0.1", port: int = 8765, *, quiet: bool = False):
+    """Return a ``ThreadingHTTPServer`` bound to *host*:*port* serving *service*."""
+    handler = type("Handler", (_Handler,), {"service": service, "quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(service: GenerationService, host: str = "127.0.0.1", port: int = 8765, *, quiet: bool = False) -> None:
+    """Serve until interrupted."""
+    server = make_server(service, host, port, quiet=quiet)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
@@ -0,0 +1,594 @@
+"""Multi-process sharded generation for very large catalogs.
+
+A single process spends much of a big job parsing input, decoding API
+responses and writing results, all under one GIL. :func:`run_sharded` splits
+the input into contiguous row ranges, runs :func:`core.runner.generate_file`
+on each range in its own process and concatenates the shard outputs in order,
+so the merged file has exactly the input's row order.
+
+The worker processes share one :meth:`~utils.rate_limit.RateLimiter.shared`
+limiter (token buckets in lock-protected files), which keeps the whole group
+within the account's RPM/TPM limits, and one job manifest, so an interrupted
+run resumes like a single-process one.
+
+Jobs spanning several machines use a *job directory* instead
+(:func:`plan_job`, :func:`run_shard`, :func:`merge_job`)::
+
+    job.json                 the plan: source checksum, generation settings,
+                             strategy and every shard's input checksum
+    shard-NNN.feather        shard input
+    shard-NNN-out.feather    shard output
+    shard-NNN.status.json    per-shard progress, node and output checksum
+    shard-NNN.claim          created by the node that took the shard
+    assignment.npy           row -> shard map (hash strategy only)
+
+The plan is written once and never modified; each node only writes the
+files of the shard it claimed, so the directory can live on a shared volume
+or be copied around. Shards are either contiguous row ranges or hash buckets
+of ``(name, description)``, which sends a product to the same shard every
+time the catalog is re-planned. :func:`merge_job` verifies every checksum and
+row count and then restores the original row order, producing the same
+bytes regardless of which node ran which shard or in what order.
+"""
+from __future__ import annotations
+
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import traceback
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from core import ad_generator, csv_handler
+from core.job_manifest import JobManifest
+from core.near_dup import NearDuplicateIndex
+from core.runner import Counters, generate_file
+from utils.lazy import lazy_import
+from utils.quality import QualityGate, QualityRules
+from utils.rate_limit import RateLimiter
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+__all__ = [
+    "split_table",
+    "merge_tables",
+    "run_sharded",
+    "plan_job",
+    "claim_shard",
+    "run_shard",
+    "job_status",
+    "merge_job",
+    "ShardError",
+]
+
+SHARD_SUFFIX = ".feather"
+PLAN_NAME = "job.json"
+ASSIGNMENT_NAME = "assignment.npy"
+STRATEGIES = ("range", "hash")
+_FIELDS = (
+    "rows",
+    "generated",
+    "restored",
+    "failed",
+    "retried",
+    "retry_tokens",
+    "rejected",
+    "reused",
+    "adapted",
+    "saved_tokens",
+)
+
+
+class ShardError(RuntimeError):
+    """Raised when one or more shard workers failed."""
+
+
+def split_table(
+    source: str | Path,
+    parts: int,
+    directory: str | Path,
+    *,
+    chunk_size: int = csv_handler.DEFAULT_CHUNK_SIZE,
+) -> List[Path]:
+    """Split *source* into *parts* contiguous Feather files inside *directory*.
+
+    The input is streamed once. Shard sizes follow :func:`csv_handler.count_rows`;
+    when that is only an estimate (CSV) the last shard absorbs the difference,
+    which affects balance but never order.
+    """
+    directory = Path(directory)
+    total = csv_handler.count_rows(source) or 0
+    quota = max(1, math.ceil(total / parts))
+    paths = [directory / f"shard-{index:03d}{SHARD_SUFFIX}" for index in range(parts)]
+    writers = [csv_handler.TableWriter(path) for path in paths]
+    try:
+        current = 0
+        for chunk in csv_handler.iter_table_chunks(source, chunk_size):
+            while len(chunk):
+                room = len(chunk) if current == parts - 1 else quota - writers[current].rows
+                writers[current].write(chunk.iloc[:room])
+                chunk = chunk.iloc[room:]
+                if current < parts - 1 and writers[current].rows >= quota:
+                    current += 1
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    for writer in writers:
+        writer.close()
+    return paths
+
+
+def merge_tables(parts: Sequence[str | Path], destination: str | Path) -> int:
+    """Concatenate *parts* in order into *destination*; return the row count."""
+    with csv_handler.TableWriter(destination) as writer:
+        for part in parts:
+            for chunk in csv_handler.iter_table_chunks(part):
+                writer.write(chunk)
+    return writer.rows
+
+
+def _near_duplicates(threshold: Optional[float]) -> Optional[NearDuplicateIndex]:
+    return NearDuplicateIndex(threshold) if threshold is not None else None
+
+
+class _SharedCounters(Counters):
+    """Publishes a worker's counters into its slot of a shared array."""
+
+    def __init__(self, array, slot: int):
+        super().__init__()
+        self._array = array
+        self._offset = slot * len(_FIELDS)
+
+    def update(self, *, force: bool = False) -> None:
+        for offset, field in enumerate(_FIELDS):
+            self._array[self._offset + offset] = getattr(self, field)
+
+
+def _work(slot: int, source: str, output: str, job: Dict[str, Any], counters) -> None:
+    """Worker process entry point: generate one shard."""
+    try:
+        backend = ad_generator.make_backend(
+            model=job["model"],
+            max_tokens=job["params"]["max_tokens"],
+            temperature=job["params"]["temperature"],
+            **job["backend"],
+        )
+        limiter = None
+        if job["rpm"] or job["tpm"]:
+            limiter = RateLimiter.shared(job["limiter_dir"], job["rpm"], job["tpm"])
+        manifest = JobManifest(job["manifest"]) if job["use_manifest"] else None
+        try:
+            generate_file(
+                source,
+                output,
+                backend,
+                tone=job["tone"],
+                model=job["model"],
+                params=job["params"],
+                concurrency=job["concurrency"],
+                limiter=limiter,
+                manifest=manifest,
+                chunk_size=job["chunk_size"],
+                progress=_SharedCounters(counters, slot),
+                max_failures=job["max_failures"],
+                quality=QualityGate(job["quality"]) if job["quality"] is not None else None,
+                retries=job["retries"],
+                near_duplicates=_near_duplicates(job["near_duplicates"]),
+            )
+        finally:
+            if manifest is not None:
+                manifest.close()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+        sys.exit(1)
+
+
+def run_sharded(
+    source: str | Path,
+    output: str | Path,
+    *,
+    shards: int,
+    backend: Mapping[str, Any],
+    tone: str,
+    model: str,
+    params: Mapping[str, Any],
+    concurrency: int = 8,
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+    manifest: Optional[str | Path] = None,
+    use_manifest: bool = True,
+    chunk_size: int = 1_000,
+    max_failures: Optional[int] = None,
+    progress: Optional[Counters] = None,
+    poll_interval: float = 0.5,
+    quality: Optional[QualityRules] = None,
+    retries: int = 2,
+    near_duplicates: Optional[float] = None,
+) -> Counters:
+    """Generate *source* into *output* with *shards* worker processes.
+
+    *backend* holds the :func:`core.ad_generator.make_backend` arguments
+    besides the model settings. *concurrency* is the total number of requests
+    in flight across all workers. With *quality* rules every worker runs its
+    own quality gate, so duplicates are only detected within a shard; the
+    same goes for *near_duplicates*, the similarity threshold for reusing ads
+    of near-identical rows. Returns the summed counters.
+    """
+    output = Path(output)
+    progress = progress if progress is not None else Counters()
+    job = {
+        "backend": dict(backend),
+        "tone": tone,
+        "model": model,
+        "params": dict(params),
+        "concurrency": max(1, concurrency // shards),
+        "rpm": rpm,
+        "tpm": tpm,
+        "manifest": None if manifest is None else str(manifest),
+        "use_manifest": use_manifest,
+        "chunk_size": chunk_size,
+        "max_failures": max_failures,
+        "quality": quality,
+        "retries": retries,
+        "near_duplicates": near_duplicates,
+    }
+    ctx = multiprocessing.get_context("spawn")
+    workdir = Path(tempfile.mkdtemp(prefix=f".{output.name}.", suffix=".shards", dir=output.parent))
+    try:
+        job["limiter_dir"] = str(workdir)
+        inputs = split_table(source, shards, workdir, chunk_size=chunk_size)
+        outputs = [path.with_name(f"{path.stem}-out{SHARD_SUFFIX}") for path in inputs]
+        counters = ctx.Array("q", shards * len(_FIELDS), lock=False)
+        workers = [
+            ctx.Process(target=_work, args=(slot, str(src), str(dst), job, counters), name=f"shard-{slot}")
+            for slot, (src, dst) in enumerate(zip(inputs, outputs))
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                _collect(counters, shards, progress)
+                time.sleep(poll_interval)
+        except BaseException:
+            for worker in workers:
+                worker.terminate()
+            raise
+        finally:
+            for worker in workers:
+                worker.join()
+        _collect(counters, shards, progress)
+
+        failed = [worker.name for worker in workers if worker.exitcode != 0]
+        if failed:
+            raise ShardError(f"{', '.join(failed)} failed; finished rows are kept in the manifest")
+        merge_tables(outputs, output)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return progress
+
+
+def _collect(counters, shards: int, progress: Counters) -> None:
+    width = len(_FIELDS)
+    for offset, field in enumerate(_FIELDS):
+        setattr(progress, field, sum(counters[slot * width + offset] for slot in range(shards)))
+    progress.update()
+
+
+# ---------- multi-node jobs ----------
+def _shard_files(jobdir: Path, shard: int) -> Dict[str, Path]:
+    stem = f"shard-{shard:03d}"
+    return {
+        "input": jobdir / f"{stem}{SHARD_SUFFIX}",
+        "output": jobdir / f"{stem}-out{SHARD_SUFFIX}",
+        "status": jobdir / f"{stem}.status.json",
+        "claim": jobdir / f"{stem}.claim",
+    }
+
+
+def _write_json(path: Path, data: Mapping[str, Any]) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def load_plan(jobdir: str | Path) -> Dict[str, Any]:
+    path = Path(jobdir) / PLAN_NAME
+    plan = _read_json(path)
+    if plan is None:
+        raise ShardError(f"{path} not found; create the job with 'shard plan' first")
+    return plan
+
+
+def split_by_hash(
+    source: str | Path,
+    parts: int,
+    directory: str | Path,
+    *,
+    chunk_size: int = csv_handler.DEFAULT_CHUNK_SIZE,
+) -> Tuple[List[Path], "np.ndarray"]:
+    """Split *source* into *parts* Feather files by a hash of name and description.
+
+    Returns the shard paths and the row -> shard assignment needed to merge
+    the outputs back into input order.
+    """
+    directory = Path(directory)
+    paths = [directory / f"shard-{index:03d}{SHARD_SUFFIX}" for index in range(parts)]
+    writers = [csv_handler.TableWriter(path) for path in paths]
+    assignment = []
+    try:
+        for chunk in csv_handler.iter_table_chunks(source, chunk_size):
+            keys = chunk["name"].astype(str).str.strip() + "\x1f" + chunk["description"].astype(str).str.strip()
+            buckets = (pd.util.hash_pandas_object(keys, index=False).to_numpy() % parts).astype("uint16")
+            assignment.append(buckets)
+            for bucket in np.unique(buckets):
+                writers[bucket].write(chunk[buckets == bucket])
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    for writer in writers:
+        writer.close()
+    return paths, (np.concatenate(assignment) if assignment else np.zeros(0, dtype="uint16"))
+
+
+def plan_job(
+    source: str | Path,
+    jobdir: str | Path,
+    *,
+    shards: int,
+    strategy: str = "range",
+    tone: str,
+    model: str,
+    params: Mapping[str, Any],
+    chunk_size: int = csv_handler.DEFAULT_CHUNK_SIZE,
+    quality: Optional[QualityRules] = None,
+    retries: int = 2,
+    near_duplicates: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Split *source* into a job directory that nodes can process independently."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    source, jobdir = Path(source), Path(jobdir)
+    jobdir.mkdir(parents=True, exist_ok=True)
+    if (jobdir / PLAN_NAME).exists():
+        raise ShardError(f"{jobdir} already holds a job")
+    if strategy == "hash":
+        inputs, assignment = split_by_hash(source, shards, jobdir, chunk_size=chunk_size)
+        np.save(jobdir / ASSIGNMENT_NAME, assignment)
+    else:
+        inputs = split_table(source, shards, jobdir, chunk_size=chunk_size)
+    entries = [
+        {"id": index, "input": path.name, "rows": csv_handler.count_rows(path), "sha256": csv_handler.file_digest(path)}
+        for index, path in enumerate(inputs)
+    ]
+    plan = {
+        "version": 1,
+        "source": str(source.resolve()),
+        "source_sha256": csv_handler.file_digest(source),
+        "source_suffix": source.suffix.lower(),
+        "rows": sum(entry["rows"] for entry in entries),
+        "strategy": strategy,
+        "tone": tone,
+        "model": model,
+        "params": dict(params),
+        "quality": asdict(quality) if quality is not None else None,
+        "retries": retries,
+        "near_duplicates": near_duplicates,
+        "created": time.time(),
+        "shards": entries,
+    }
+    _write_json(jobdir / PLAN_NAME, plan)
+    return plan
+
+
+def claim_shard(jobdir: str | Path, node: str) -> Optional[int]:
+    """Claim the first shard nobody has claimed yet; return its id or ``None``.
+
+    A claim is the exclusive creation of ``shard-NNN.claim``, which is atomic
+    on local and NFS file systems alike. Delete the claim file to hand a
+    shard of a crashed node to another one.
+    """
+    jobdir = Path(jobdir)
+    for entry in load_plan(jobdir)["shards"]:
+        files = _shard_files(jobdir, entry["id"])
+        status = _read_json(files["status"])
+        if status is not None and status.get("state") == "done":
+            continue
+        try:
+            fd = os.open(files["claim"], os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            continue
+        with os.fdopen(fd, "w", encoding="utf-8") as fp:
+            fp.write(f"{node} {time.time()}\n")
+        return entry["id"]
+    return None
+
+
+def run_shard(
+    jobdir: str | Path,
+    shard: int,
+    backend,
+    *,
+    node: Optional[str] = None,
+    concurrency: int = 8,
+    limiter: Optional[RateLimiter] = None,
+    manifest: Optional[JobManifest] = None,
+    progress: Optional[Counters] = None,
+) -> Dict[str, Any]:
+    """Generate one shard of a planned job and record its status.
+
+    Tone, model and sampling parameters come from the plan, so every node
+    produces the same result for the same shard. A shard that is already
+    done with an intact output is left alone.
+    """
+    jobdir = Path(jobdir)
+    plan = load_plan(jobdir)
+    try:
+        entry = plan["shards"][shard]
+    except IndexError:
+        raise ShardError(f"the job has no shard {shard}") from None
+    files = _shard_files(jobdir, shard)
+    previous = _read_json(files["status"])
+    if (
+        previous is not None
+        and previous.get("state") == "done"
+        and files["output"].exists()
+        and csv_handler.file_digest(files["output"]) == previous.get("output_sha256")
+    ):
+        return previous
+    if csv_handler.file_digest(files["input"]) != entry["sha256"]:
+        raise ShardError(f"input of shard {shard} does not match its checksum in the plan")
+
+    progress = progress if progress is not None else Counters()
+    status: Dict[str, Any] = {
+        "id": shard,
+        "state": "running",
+        "node": node or socket.gethostname(),
+        "pid": os.getpid(),
+        "started": time.time(),
+    }
+    _write_json(files["status"], status)
+    errors: List[str] = []
+    rules = plan.get("quality")
+    if rules is not None:
+        rules = QualityRules(**{**rules, "forbidden_prefixes": tuple(rules["forbidden_prefixes"])})
+    params = dict(plan["params"])
+    if isinstance(backend, ad_generator.MockBackend):
+        params["backend"] = "mock"  # keep placeholders out of the real rows in the manifest
+    try:
+        rows = generate_file(
+            files["input"],
+            files["output"],
+            backend,
+            tone=plan["tone"],
+            model=plan["model"],
+            params=params,
+            concurrency=concurrency,
+            limiter=limiter,
+            manifest=manifest,
+            progress=progress,
+            errors=errors,
+            quality=QualityGate(rules) if rules is not None else None,
+            retries=plan.get("retries", 2),
+            near_duplicates=_near_duplicates(plan.get("near_duplicates")),
+        )
+    except BaseException as exc:
+        status.update(state="failed", finished=time.time(), error=f"{type(exc).__name__}: {exc}")
+        _write_json(files["status"], status)
+        raise
+    status.update(
+        state="done" if not (progress.failed or progress.rejected) else "incomplete",
+        finished=time.time(),
+        rows=rows,
+        generated=progress.generated,
+        restored=progress.restored,
+        failed=progress.failed,
+        retried=progress.retried,
+        retry_tokens=progress.retry_tokens,
+        rejected=progress.rejected,
+        reused=progress.reused,
+        adapted=progress.adapted,
+        saved_tokens=progress.saved_tokens,
+        errors=errors,
+        output_sha256=csv_handler.file_digest(files["output"]),
+    )
+    _write_json(files["status"], status)
+    return status
+
+
+def job_status(jobdir: str | Path) -> List[Dict[str, Any]]:
+    """Return one status record per shard (``state`` is ``pending`` if never run)."""
+    jobdir = Path(jobdir)
+    records = []
+    for entry in load_plan(jobdir)["shards"]:
+        files = _shard_files(jobdir, entry["id"])
+        status = _read_json(files["status"]) or {"id": entry["id"], "state": "pending"}
+        if status["state"] == "pending" and files["claim"].exists():
+            status["state"] = "claimed"
+        status["planned_rows"] = entry["rows"]
+        records.append(status)
+    return records
+
+
+def _verify(jobdir: Path, plan: Dict[str, Any]) -> List[Path]:
+    problems: List[str] = []
+    outputs: List[Path] = []
+    for entry in plan["shards"]:
+        files = _shard_files(jobdir, entry["id"])
+        status = _read_json(files["status"]) or {}
+        outputs.append(files["output"])
+        if status.get("state") != "done":
+            problems.append(f"shard {entry['id']}: {status.get('state', 'pending')}")
+        elif not files["output"].exists():
+            problems.append(f"shard {entry['id']}: output missing")
+        elif csv_handler.file_digest(files["output"]) != status.get("output_sha256"):
+            problems.append(f"shard {entry['id']}: output checksum mismatch")
+        elif csv_handler.count_rows(files["output"]) != entry["rows"]:
+            problems.append(f"shard {entry['id']}: expected {entry['rows']} rows")
+    if problems:
+        raise ShardError("cannot merge: " + "; ".join(problems))
+    return outputs
+
+
+class _RowStream:
+    """Hands out the rows of a shard output in order, any number at a time."""
+
+    def __init__(self, path: Path):
+        self._chunks = csv_handler.iter_table_chunks(path)
+        self._buffer = None
+
+    def take(self, count: int):
+        pieces = []
+        while count:
+            if self._buffer is None or not len(self._buffer):
+                self._buffer = next(self._chunks).reset_index(drop=True)
+            piece, self._buffer = self._buffer.iloc[:count], self._buffer.iloc[count:]
+            pieces.append(piece)
+            count -= len(piece)
+        return pd.concat(pieces, ignore_index=True) if len(pieces) != 1 else pieces[0].reset_index(drop=True)
+
+
+def merge_job(jobdir: str | Path, destination: str | Path, *, chunk_size: int = csv_handler.DEFAULT_CHUNK_SIZE) -> int:
+    """Validate every shard of the job in *jobdir* and merge them in input order."""
+    jobdir = Path(jobdir)
+    plan = load_plan(jobdir)
+    outputs = _verify(jobdir, plan)
+    if plan["strategy"] == "range":
+        rows = merge_tables(outputs, destination)
+    else:
+        assignment = np.load(jobdir / ASSIGNMENT_NAME, mmap_mode="r")
+        streams = [_RowStream(path) for path in outputs]
+        with csv_handler.TableWriter(destination) as writer:
+            for start in range(0, len(assignment), chunk_size):
+                block = np.asarray(assignment[start : start + chunk_size])
+                counts = np.bincount(block, minlength=len(streams))
+                grouped = pd.concat(
+                    [streams[shard].take(int(count)) for shard, count in enumerate(counts) if count],
+                    ignore_index=True,
+                )
+                # grouped holds the block's rows ordered by shard; undo that permutation.
+                order = np.argsort(block, kind="stable")
+                writer.write(grouped.iloc[np.argsort(order)])
+        rows = writer.rows
+    if rows != plan["rows"]:
+        Path(destination).unlink(missing_ok=True)
+        raise ShardError(f"merged {rows} rows but the plan has {plan['rows']}")
+    return rows
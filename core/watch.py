@@ -0,0 +1,341 @@
+"""Watch-folder job runner.
+
+:class:`WatchRunner` polls an *inbox* directory for CSV, Parquet and Feather
+catalogs and runs every new file through the generation pipeline, writing
+``<stem>_ads<suffix>`` plus a ``<stem><suffix>.report.json`` job report into
+an *outbox* directory.
+
+All files share one concurrency budget and one rate limiter. Rows are taken
+from the active files in turn (round robin), so a huge catalog dropped first
+does not starve a small one dropped a minute later. Each file is read and
+written one chunk at a time.
+
+Rows are identified by the same content hash as the job manifest
+(:func:`core.job_manifest.row_key`), so rows that were generated before, in
+any file or front end, are filled from the manifest instead of the API. A file
+whose content is byte-for-byte identical to one already processed is skipped
+entirely; the outbox keeps an index of processed files for that purpose.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from core import csv_handler
+from core.job_manifest import JobManifest, row_key
+from core.runner import run_stream
+from utils.rate_limit import RateLimiter
+from utils.validation import pending_mask
+
+__all__ = ["WatchRunner"]
+
+INDEX_NAME = ".processed.json"
+_MAX_REPORTED_ERRORS = 20
+
+
+class _Chunk:
+    """One chunk of a file, waiting for its outstanding rows."""
+
+    def __init__(self, df):
+        self.df = df
+        self.ads: Dict[Any, str] = {}
+        self.remaining = 0
+
+
+class _FileJob:
+    """Reads one catalog chunk by chunk and writes results in input order."""
+
+    def __init__(self, seq: int, path: Path, digest: str, runner: "WatchRunner"):
+        self.seq = seq
+        self.path = path
+        self.digest = digest
+        self.output = runner.outbox / f"{path.stem}_ads{path.suffix}"
+        self.report_path = runner.outbox / f"{path.name}.report.json"  # a.csv and a.parquet keep apart
+        self._runner = runner
+        self._chunks: Iterator = csv_handler.iter_table_chunks(path, runner.chunk_size)
+        self._writer = csv_handler.TableWriter(self.output)
+        self._unwritten: Dict[int, _Chunk] = {}  # chunk number -> chunk, in input order
+        self._rows: Deque[Tuple[int, Any, str, str]] = deque()  # rows not yet sent
+        self._loaded = 0
+        self._written = 0
+        self.input_done = False
+        self.finished = False
+        self.keys: Dict[Tuple[int, Any], str] = {}
+        self.stats: Dict[str, Any] = {
+            "source": str(path),
+            "output": str(self.output),
+            "sha256": digest,
+            "rows": 0,
+            "eligible": 0,
+            "generated": 0,
+            "restored": 0,
+            "failed": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "started": time.time(),
+        }
+        self.errors: List[str] = []
+
+    def next_row(self) -> Optional[Tuple[Tuple[int, int, Any], str, str]]:
+        """Return the next row to generate, or ``None`` once the input is exhausted."""
+        while not self._rows:
+            if self.input_done:
+                return None
+            try:
+                df = next(self._chunks)
+            except StopIteration:
+                self.input_done = True
+                self._flush()
+                return None
+            self._load(df)
+        chunk_seq, idx, name, description = self._rows.popleft()
+        return (self.seq, chunk_seq, idx), name, description
+
+    def _load(self, df) -> None:
+        chunk = _Chunk(df)
+        chunk_seq = self._loaded
+        self._loaded += 1
+        self.stats["rows"] += len(df)
+        todo = df[pending_mask(df)]
+        self.stats["eligible"] += len(todo)
+        runner = self._runner
+        keys = {
+            idx: row_key(name, desc, runner.tone, runner.model, runner.params)
+            for idx, name, desc in zip(todo.index, todo["name"], todo["description"])
+        }
+        done = runner.manifest.completed(keys.values()) if keys else {}
+        outstanding: List[str] = []
+        for idx, name, desc in zip(todo.index, todo["name"], todo["description"]):
+            key = keys[idx]
+            if key in done:
+                chunk.ads[idx] = done[key]
+                self.stats["restored"] += 1
+            else:
+                self.keys[(chunk_seq, idx)] = key
+                self._rows.append((chunk_seq, idx, name, desc))
+                outstanding.append(key)
+        chunk.remaining = len(outstanding)
+        runner.manifest.mark_pending(outstanding)
+        self._unwritten[chunk_seq] = chunk
+        self._flush()
+
+    def record(self, chunk_seq: int, idx: Any, result) -> None:
+        key = self.keys.pop((chunk_seq, idx))
+        chunk = self._unwritten[chunk_seq]
+        chunk.remaining -= 1
+        if isinstance(result, Exception):
+            self.stats["failed"] += 1
+            self._runner.manifest.mark_failed(key, str(result))
+            if len(self.errors) < _MAX_REPORTED_ERRORS:
+                self.errors.append(f"row {idx}: {type(result).__name__}: {result}")
+        else:
+            chunk.ads[idx] = result.text
+            self.stats["generated"] += 1
+            self.stats["prompt_tokens"] += result.prompt_tokens
+            self.stats["completion_tokens"] += result.completion_tokens
+            self._runner.manifest.mark_done(key, result.text)
+        self._flush()
+
+    def discard(self) -> None:
+        """Remove the partly written output of an interrupted run."""
+        self._writer.abort()
+
+    def fail(self, exc: Exception) -> None:
+        self._writer.abort()
+        self.errors.append(f"{type(exc).__name__}: {exc}")
+        self.input_done = self.finished = True
+        self.stats["error"] = str(exc)
+        self._write_report()
+
+    def _flush(self) -> None:
+        while self._written in self._unwritten and self._unwritten[self._written].remaining == 0:
+            chunk = self._unwritten.pop(self._written)
+            self._written += 1
+            df = chunk.df
+            if chunk.ads:
+                df = df.copy()
+                df.loc[list(chunk.ads), "ad"] = list(chunk.ads.values())
+            self._writer.write(df)
+        if self.input_done and not self._unwritten and not self.finished:
+            self._writer.close()
+            self.finished = True
+            self._write_report()
+
+    def _write_report(self) -> None:
+        self.stats["finished"] = time.time()
+        self.stats["seconds"] = round(self.stats["finished"] - self.stats["started"], 3)
+        self.stats["errors"] = self.errors
+        tmp = self.report_path.with_name(f".{self.report_path.name}.tmp")
+        tmp.write_text(json.dumps(self.stats, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self.report_path)
+
+
+class WatchRunner:
+    """Poll *inbox* and process catalogs dropped into it.
+
+    A file is picked up once its size and modification time stayed the same
+    for one poll interval, so files still being copied are not read early.
+    With ``once=True`` the files present at start are processed and
+    :meth:`run` returns.
+    """
+
+    def __init__(
+        self,
+        inbox: Path,
+        outbox: Path,
+        backend,
+        *,
+        tone: str,
+        model: str,
+        params: Dict[str, Any],
+        concurrency: int = 8,
+        limiter: Optional[RateLimiter] = None,
+        manifest: Optional[JobManifest] = None,
+        chunk_size: int = 1_000,
+        poll_interval: float = 2.0,
+        once: bool = False,
+        log: TextIO = sys.stderr,
+    ):
+        self.inbox = Path(inbox)
+        self.outbox = Path(outbox)
+        self.outbox.mkdir(parents=True, exist_ok=True)
+        self.backend = backend
+        self.tone = tone
+        self.model = model
+        self.params = dict(params)
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self.manifest = manifest if manifest is not None else JobManifest()
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.once = once
+        self.log = log
+        self._index_path = self.outbox / INDEX_NAME
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+        self._candidates: Dict[str, Tuple[int, int]] = {}
+        self._jobs: Dict[int, _FileJob] = {}
+        self._rotation: Deque[_FileJob] = deque()
+        self._entries: Dict[int, Dict[str, Any]] = {}  # index entries of running jobs
+        self._seq = 0
+
+    # ---------- discovery ----------
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self._index_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self) -> None:
+        tmp = self._index_path.with_name(f"{INDEX_NAME}.tmp")
+        tmp.write_text(json.dumps(self._index, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self._index_path)
+
+    def _discover(self) -> None:
+        active = {job.path.name for job in self._jobs.values()}
+        for path in sorted(self.inbox.iterdir()):
+            name = path.name
+            if (
+                name.startswith(".")
+                or name in active
+                or path.suffix.lower() not in csv_handler.SUPPORTED_SUFFIXES
+                or not path.is_file()
+            ):
+                continue
+            stat = path.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            known = self._index.get(name)
+            if known is not None and (known["size"], known["mtime_ns"]) == signature:
+                continue
+            if not self.once and self._candidates.get(name) != signature:
+                self._candidates[name] = signature  # check again on the next poll
+                continue
+            self._candidates.pop(name, None)
+            digest = csv_handler.file_digest(path)
+            entry = {"size": signature[0], "mtime_ns": signature[1], "sha256": digest}
+            known_digests = [other.get("sha256") for other in self._index.values()]
+            known_digests += [other["sha256"] for other in self._entries.values()]
+            if digest in known_digests:
+                self._say(f"{name}: identical to a processed file, skipped")
+                self._index[name] = entry
+                self._save_index()
+                continue
+            self._start(path, entry)
+
+    def _start(self, path: Path, entry: Dict[str, Any]) -> None:
+        self._seq += 1
+        try:
+            job = _FileJob(self._seq, path, entry["sha256"], self)
+        except Exception as exc:  # noqa: BLE001 - unreadable file; note it and move on
+            self._say(f"{path.name}: cannot open ({exc})")
+            self._index[path.name] = entry
+            self._save_index()
+            return
+        self._jobs[job.seq] = job
+        self._rotation.append(job)
+        self._entries[job.seq] = entry
+        self._say(f"{path.name}: queued")
+
+    # ---------- scheduling ----------
+    async def _requests(self):
+        """Yield rows from the active files in turn, polling for new files when idle."""
+        next_poll = 0.0
+        while True:
+            if time.monotonic() >= next_poll:
+                self._discover()
+                next_poll = time.monotonic() + self.poll_interval
+            row = None
+            while self._rotation and row is None:
+                job = self._rotation.popleft()
+                try:
+                    row = job.next_row()
+                except Exception as exc:  # noqa: BLE001 - a broken file must not stop the others
+                    job.fail(exc)
+                    row = None
+                if row is None:
+                    self._check_finished(job)
+                else:
+                    self._rotation.append(job)
+            if row is not None:
+                yield row
+                continue
+            if self.once and not self._candidates:
+                return
+            await asyncio.sleep(max(0.0, next_poll - time.monotonic()))
+
+    def _check_finished(self, job: _FileJob) -> None:
+        if not job.finished or job.seq not in self._jobs:
+            return
+        del self._jobs[job.seq]
+        self._index[job.path.name] = self._entries.pop(job.seq)
+        self._save_index()
+        stats = job.stats
+        self._say(
+            f"{job.path.name}: {stats['generated']:,} generated, {stats['restored']:,} restored, "
+            f"{stats['failed']:,} failed -> {job.report_path.name}"
+        )
+
+    async def run(self) -> None:
+        try:
+            async for (seq, chunk_seq, idx), result in run_stream(
+                self._requests(), self.backend, self.tone, concurrency=self.concurrency, limiter=self.limiter
+            ):
+                job = self._jobs.get(seq)
+                if job is None:
+                    continue  # the file failed while this row was in flight
+                job.record(chunk_seq, idx, result)
+                self._check_finished(job)
+            for job in list(self._jobs.values()):
+                self._check_finished(job)
+        finally:
+            # Unfinished files are not in the index, so the next run starts them over.
+            for job in self._jobs.values():
+                if not job.finished:
+                    job.discard()
+
+    def _say(self, message: str) -> None:
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", file=self.log, flush=True)
@@ -4,7 +4,7 @@ from __future__ import annotations
 import threading
 import time
 from pathlib import Path
-from typing import List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import customtkinter as ctk
 import pandas as pd
@@ -13,12 +13,20 @@ from tkinter import filedialog, messagebox
 from config import api_keys, settings
 from core import csv_handler, ad_generator
 from prompts.tone_prompts import TONES
-from utils.validation import row_is_complete
+from utils.quality import QualityGate
+from utils.ui_updates import DRAIN_INTERVAL_MS, UpdateQueue
 
 from .spreadsheet_ttk import SpreadsheetWidgetTTK
 from .components.tone_selector import ToneSelector
 from .components.buttons import PrimaryButton, SuccessButton
 
+FILE_TYPES = [
+    ("Catalog files", "*.csv *.parquet *.pq *.feather *.arrow"),
+    ("CSV files", "*.csv"),
+    ("Parquet files", "*.parquet *.pq"),
+    ("Arrow/Feather files", "*.feather *.arrow"),
+]
+
 
 class MainApp(ctk.CTk):
     """Main application window."""
@@ -49,10 +57,10 @@ class MainApp(ctk.CTk):
         self.generate_btn.pack(side="left", padx=8, pady=10)
 
         from .components.buttons import SecondaryButton, SuccessButton
-        import_btn = SecondaryButton(top_frame, text="Import CSV", command=self._on_import)
+        import_btn = SecondaryButton(top_frame, text="Import…", command=self._on_import)
         import_btn.pack(side="left", padx=8, pady=10)
 
-        export_btn = SuccessButton(top_frame, text="Export CSV", command=self._on_export)
+        export_btn = SuccessButton(top_frame, text="Export…", command=self._on_export)
         export_btn.pack(side="left", padx=8, pady=10)
 
         api_btn = SecondaryButton(top_frame, text="Enter API Key", command=self._ask_api_key)
@@ -67,28 +75,34 @@ class MainApp(ctk.CTk):
         self.sheet = SpreadsheetWidgetTTK(content)
         self.sheet.pack(fill="both", expand=True, padx=16, pady=(0, 16))
 
+        # Worker threads never touch Tk directly; results are applied in batches.
+        self._updates: UpdateQueue[int] = UpdateQueue()
+        self._export_path: Optional[Path] = None
+        self.after(DRAIN_INTERVAL_MS, self._drain_updates)
+
     # -------------------- Button Callbacks -------------------- #
 
     def _on_import(self):
-        file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
+        file_path = filedialog.askopenfilename(filetypes=FILE_TYPES)
         if not file_path:
             return
         try:
-            df = csv_handler.import_csv(file_path)
+            df = csv_handler.import_table(file_path)
             self.sheet.load_dataframe(df)
             self.status_var.set(f"Loaded {Path(file_path).name}")
         except Exception as exc:  # pylint: disable=broad-except
-            messagebox.showerror("Error", f"Failed to load CSV: {exc}")
+            messagebox.showerror("Error", f"Failed to load file: {exc}")
 
     def _on_export(self):
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=FILE_TYPES)
         if not file_path:
             return
         try:
-            csv_handler.export_csv(self.sheet.as_dataframe(), file_path)
-            self.status_var.set("Exported CSV successfully")
+            csv_handler.export_table(self.sheet.as_dataframe(), file_path)
+            self._export_path = Path(file_path)  # a finished generation run is written here too
+            self.status_var.set(f"Exported {Path(file_path).name} successfully")
         except Exception as exc:  # pylint: disable=broad-except
-            messagebox.showerror("Error", f"Failed to export CSV: {exc}")
+            messagebox.showerror("Error", f"Failed to export file: {exc}")
 
     def _ask_api_key(self):
         # Custom light-styled modal for API key entry
@@ -113,12 +127,27 @@ class MainApp(ctk.CTk):
             if not key:
                 messagebox.showwarning("Empty", "Please paste your API key.")
                 return
-            if api_keys.validate_api_key(key):
-                api_keys.save_api_key(key)
-                messagebox.showinfo("Success", "API key saved!")
-                modal.destroy()
-            else:
-                messagebox.showerror("Invalid", "Provided API key is invalid.")
+            result: list = []
+            api_keys.check_api_key_async(key, result.append)
+            modal.configure(cursor="watch")
+            self.status_var.set("Validating API key…")
+
+            def poll():
+                if not result:
+                    modal.after(100, poll)
+                    return
+                info = result[0]
+                modal.configure(cursor="")
+                if info.valid or not info.reached:  # an unreachable API says nothing about the key
+                    status = api_keys.store_checked_key(key, info)
+                    self.status_var.set(status)
+                    messagebox.showinfo("Success", status)
+                    modal.destroy()
+                else:
+                    self.status_var.set("API key rejected")
+                    messagebox.showerror("Invalid", info.error or "Provided API key is invalid.")
+
+            poll()
 
         buttons = ctk.CTkFrame(wrapper, fg_color="#FFFDF4")
         buttons.pack(fill="x")
@@ -129,7 +158,8 @@ class MainApp(ctk.CTk):
         cancel_btn.pack(side="right", padx=(0, 8))
 
     def _on_generate(self):
-        if not api_keys.load_api_key():
+        api_key = api_keys.load_api_key()
+        if not api_key:
             messagebox.showwarning("Missing API Key", "Please enter your OpenAI API key first.")
             return
 
@@ -139,36 +169,67 @@ class MainApp(ctk.CTk):
             return
 
         tone = self.tone_selector.current_tone()
+        # Snapshot once, then journal each finished row (see AutosaveJournal)
+        journal = csv_handler.AutosaveJournal(Path.home() / "tako_ads_autosave.csv")
+        journal.start(self.sheet.as_dataframe())
+        cfg = settings.read_settings(section="openai")  # model and sampling as last used in the app
+        params = {
+            "model": cfg.get("model", api_keys.DEFAULT_MODELS[0]),
+            "max_tokens": int(cfg.get("max_tokens", 200)),
+            "temperature": float(cfg.get("temperature", 0.8)),
+        }
+        self.status_var.set("Generating ads…")
         # Run generation in background thread to keep UI responsive
-        threading.Thread(target=self._generate_ads_thread, args=(rows, tone), daemon=True).start()
+        threading.Thread(target=self._generate_ads_thread, args=(rows, tone, journal, api_key, params, self._export_path), daemon=True).start()
+
+    def _drain_updates(self):
+        """Apply results queued by the worker thread in one batch per tick."""
+        results, status = self._updates.drain()
+        self.sheet.set_ads(results)
+        if status:
+            self.status_var.set(status)
+        self.after(DRAIN_INTERVAL_MS, self._drain_updates)
 
     # -------------------- Generation Logic -------------------- #
 
-    def _generate_ads_thread(self, rows: List[Tuple[str, str, str]], tone: str):
-        self.status_var.set("Generating ads…")
+    def _generate_ads_thread(
+        self,
+        rows: List[Tuple[int, str, str]],
+        tone: str,
+        journal: csv_handler.AutosaveJournal,
+        api_key: str,
+        params: Dict[str, Any],
+        destination: Optional[Path] = None,
+    ):
         batch_size = 5
         idx = 0
+        quality = QualityGate()  # one gate per run, so duplicates are caught across batches
         while idx < len(rows):
             batch = rows[idx : idx + batch_size]
             data_pairs = [(name, desc) for (_, name, desc) in batch]
             try:
-                results = ad_generator.generate_batch(data_pairs, tone, concurrency=3)
+                results = ad_generator.generate_batch(
+                    data_pairs, tone, concurrency=3, api_key=api_key, quality=quality, **params
+                )
             except Exception as exc:  # pylint: disable=broad-except
-                messagebox.showerror("Generation Error", str(exc))
+                # Only the Tk thread may show dialogs; report through the update queue.
+                for row, _, _ in batch:
+                    self._updates.put(row, f"Error: {exc}")
+                    journal.append(row, f"Error: {exc}")
+                self._updates.put_status(f"Generation error: {exc}")
                 break
 
-            for (item_id, _, _), ad_text in zip(batch, results):
+            for (row, _, _), ad_text in zip(batch, results):
                 if isinstance(ad_text, Exception):
                     ad_out = f"Error: {ad_text}"
                 else:
                     ad_out = ad_text
-                self.sheet.set_ad(item_id, ad_out)
-
-            # Save progress after each batch
-            temp_path = Path.home() / "tako_ads_autosave.csv"
-            csv_handler.export_csv(self.sheet.as_dataframe(), temp_path)
-            self.status_var.set(f"Processed {idx + len(batch)}/{len(rows)} rows…")
+                self._updates.put(row, ad_out)
+                journal.append(row, ad_out)
+            self._updates.put_status(f"Processed {idx + len(batch)}/{len(rows)} rows…")
             idx += batch_size
             time.sleep(2)  # rate limiting gap between batches
+        else:
+            self._updates.put_status("Generation complete ✔")
 
-        self.status_var.set("Generation complete ✔")
+        journal.finalize(destination)
@@ -5,10 +5,9 @@ import sys
 import threading
 import time
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 
-import pandas as pd
-from PySide6.QtCore import Qt, Slot, QObject, Signal
+from PySide6.QtCore import Qt, Slot, QObject, Signal, QTimer
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import (
     QApplication,
@@ -20,11 +19,11 @@ from PySide6.QtWidgets import (
     QLineEdit,
     QMainWindow,
     QMessageBox,
+    QProgressBar,
     QPushButton,
     QSpinBox,
     QStatusBar,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QVBoxLayout,
     QWidget,
     QDialog,
@@ -33,22 +32,31 @@ from PySide6.QtWidgets import (
 
 from config import api_keys, settings
 from core import ad_generator, csv_handler
+from core.job_manifest import JobManifest, row_key
 from prompts.tone_prompts import TONES
-from utils.validation import row_is_complete
-
-COLUMNS = ["name", "description", "ad"]
-AVAILABLE_MODELS = [
-    "gpt-3.5-turbo",
-    "gpt-3.5-turbo-16k",
-    "gpt-4o-mini",
-    "gpt-4o",
-]
+from utils.lazy import preload
+from utils.quality import QualityGate
+from utils.rate_limit import RateLimiter
+from utils.ui_updates import DRAIN_INTERVAL_MS, UpdateQueue
+from utils.validation import pending_mask
+
+from .qt_table_model import SheetTableModel, consolidate_chunks
+
+AVAILABLE_MODELS = list(api_keys.DEFAULT_MODELS)
+FILE_FILTER = (
+    "Catalog files (*.csv *.parquet *.pq *.feather *.arrow);;"
+    "CSV files (*.csv);;Parquet files (*.parquet *.pq);;Arrow/Feather files (*.feather *.arrow)"
+)
 
 
 class _Worker(QObject):
-    finished = Signal()
-    progress = Signal(int, int)
-    result_row = Signal(int, str)
+    """Runs generation off the GUI thread and posts results to *updates*.
+
+    Rows an earlier job already finished are looked up in the manifest here
+    too, since hashing a large sheet's row keys would stall the window.
+    """
+
+    finished = Signal(str)  # final status line
 
     def __init__(
         self,
@@ -58,20 +66,50 @@ class _Worker(QObject):
         model: str,
         max_tokens: int,
         temperature: float,
+        manifest: JobManifest,
+        source: Optional[str],
+        updates: UpdateQueue[int],
+        api_key: str,
+        limiter: Optional[RateLimiter] = None,
     ):
         super().__init__()
         self._rows = pending_rows
+        self._api_key = api_key
+        self._limiter = limiter
+        self._updates = updates
+        self._keys: dict[int, str] = {}
+        self._manifest = manifest
+        self._source = source
         self._tone = tone
         self._model = model
         self._max_tokens = max_tokens
         self._temperature = temperature
+        self._quality = QualityGate()
+        self._usage = ad_generator.BatchUsage()
 
     def run(self):
+        params = {"max_tokens": self._max_tokens, "temperature": self._temperature}
+        keys = [row_key(name, desc, self._tone, self._model, params) for _r, name, desc in self._rows]
+        done = self._manifest.completed(keys)
+        rows: List[Tuple[int, str, str]] = []
+        for row, key in zip(self._rows, keys):
+            if key in done:
+                self._updates.put(row[0], done[key])
+            else:
+                rows.append(row)
+                self._keys[row[0]] = key
+        if not rows:
+            self.finished.emit(f"Restored {len(done)} rows from previous job ✔")
+            return
+        self._manifest.mark_pending(self._keys.values())
+        job_id = self._manifest.start_job(self._source, self._tone, self._model, params)
+        self._updates.put_status(f"Generating… ({len(done)} rows restored)" if done else "Generating…")
+
         batch_size = 5
         idx = 0
-        total = len(self._rows)
+        total = len(rows)
         while idx < total:
-            batch = self._rows[idx : idx + batch_size]
+            batch = rows[idx : idx + batch_size]
             try:
                 results = ad_generator.generate_batch(
                     [(n, d) for (_, n, d) in batch],
@@ -80,18 +118,111 @@ class _Worker(QObject):
                     temperature=self._temperature,
                     model=self._model,
                     concurrency=3,
+                    api_key=self._api_key,
+                    quality=self._quality,
+                    limiter=self._limiter,
+                    usage=self._usage,
                 )
             except Exception as exc:  # noqa: BLE001
                 for row_idx, *_ in batch:
-                    self.result_row.emit(row_idx, f"Error: {exc}")
+                    self._manifest.mark_failed(self._keys[row_idx], str(exc))
+                    self._updates.put(row_idx, f"Error: {exc}")
                 break
             else:
                 for (row_idx, _n, _d), ad_text in zip(batch, results):
-                    self.result_row.emit(row_idx, ad_text if not isinstance(ad_text, Exception) else f"Error: {ad_text}")
+                    if isinstance(ad_text, Exception):
+                        self._manifest.mark_failed(self._keys[row_idx], str(ad_text))
+                        self._updates.put(row_idx, f"Error: {ad_text}")
+                    else:
+                        self._manifest.mark_done(self._keys[row_idx], ad_text)
+                        self._updates.put(row_idx, ad_text)
             idx += batch_size
-            self.progress.emit(min(idx, total), total)
+            usage = self._usage
+            status = f"Processed {min(idx, total)}/{total}… {usage.total_tokens:,} tokens"
+            if usage.retried:
+                status += f", {usage.retry_tokens:,} on {usage.retried} quality retries"
+            self._updates.put_status(status)
             time.sleep(1.0)
-        self.finished.emit()
+        else:
+            self._manifest.finish_job(job_id)
+        self.finished.emit("Done ✔")
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _ImportWorker(QObject):
+    """Streams a catalog file in chunks so the table fills while it loads."""
+
+    chunk_loaded = Signal(object)
+    consolidated = Signal(object)
+    progress = Signal(str)
+    failed = Signal(str)
+    finished = Signal(bool)
+
+    def __init__(self, path: str, cancel: threading.Event):
+        super().__init__()
+        self._path = path
+        self._cancel = cancel
+
+    def run(self):
+        chunks = []
+        completed = True
+        try:
+            for chunk in csv_handler.iter_table_chunks(self._path):
+                if self._cancel.is_set():
+                    completed = False
+                    break
+                self.chunk_loaded.emit(chunk)
+                chunks.append(chunk)
+                self.progress.emit(f"Loading {Path(self._path).name}… {sum(map(len, chunks)):,} rows")
+            if chunks:
+                # Join the chunks here rather than on the GUI thread.
+                self.consolidated.emit(consolidate_chunks(chunks))
+        except Exception as exc:  # noqa: BLE001
+            self.failed.emit(str(exc))
+            return
+        self.finished.emit(completed)
+
+
+class _ExportWorker(QObject):
+    """Writes the sheet on a background thread, reporting progress per chunk."""
+
+    progress = Signal(int, int)
+    failed = Signal(str)
+    finished = Signal(bool)
+
+    def __init__(self, df, path: str, cancel: threading.Event):
+        super().__init__()
+        self._df = df
+        self._path = path
+        self._cancel = cancel
+
+    def _report(self, done: int, total: int) -> None:
+        if self._cancel.is_set():
+            raise _Cancelled
+        self.progress.emit(done, total)
+
+    def run(self):
+        try:
+            csv_handler.export_table(self._df, self._path, progress=self._report)
+        except _Cancelled:
+            self.finished.emit(False)
+            return
+        except Exception as exc:  # noqa: BLE001
+            self.failed.emit(str(exc))
+            return
+        self.finished.emit(True)
+
+
+class _KeyCheck(QObject):
+    """Carries a background key check result back to the GUI thread."""
+
+    done = Signal(str, object)
+
+    def start(self, key: str) -> None:
+        api_keys.check_api_key_async(key, lambda info: self.done.emit(key, info), AVAILABLE_MODELS)
 
 
 class ApiKeyDialog(QDialog):
@@ -165,17 +296,20 @@ class MainWindow(QMainWindow):
         self.generate_btn.clicked.connect(self._on_generate)
         hbox.addWidget(self.generate_btn)
 
-        imp_btn = QPushButton("Import CSV", clicked=self._on_import)
-        hbox.addWidget(imp_btn)
-        exp_btn = QPushButton("Export CSV", clicked=self._on_export)
-        hbox.addWidget(exp_btn)
+        self.import_btn = QPushButton("Import…", clicked=self._on_import)
+        self.import_btn.setToolTip("Open a CSV, Parquet or Feather catalog")
+        hbox.addWidget(self.import_btn)
+        self.export_btn = QPushButton("Export…", clicked=self._on_export)
+        self.export_btn.setToolTip("Save the sheet as CSV, Parquet or Feather")
+        hbox.addWidget(self.export_btn)
         api_btn = QPushButton("Enter API Key", clicked=self._on_api_key)
         hbox.addWidget(api_btn)
         hbox.addStretch()
 
         # Spreadsheet
-        self.table = QTableWidget(50, 3)
-        self.table.setHorizontalHeaderLabels(["Product Name", "Description", "Ad (output)"])
+        self.model = SheetTableModel(50, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.verticalHeader().hide()
         vbox.addWidget(self.table, 1)
@@ -184,116 +318,306 @@ class MainWindow(QMainWindow):
         self._status = QStatusBar(self)
         self.setStatusBar(self._status)
         self._status.showMessage("Ready")
+        self._io_progress = QProgressBar(self)
+        self._io_progress.setMaximumWidth(200)
+        self._io_progress.hide()
+        self._status.addPermanentWidget(self._io_progress)
+        self._io_cancel_btn = QPushButton("Cancel", clicked=self._on_cancel_io)
+        self._io_cancel_btn.hide()
+        self._status.addPermanentWidget(self._io_cancel_btn)
+        self._io_cancel: threading.Event | None = None
+        self._io_worker: QObject | None = None
+        self._io_target = ""
+        self._on_loaded: Optional[Callable[[], None]] = None
+        self._close_after_export = False
+        self._closing = False
 
         self._worker_thread: threading.Thread | None = None
-
-    # ---------- CSV ----------
+        self._updates: UpdateQueue[int] = UpdateQueue()
+        self._drain_timer = QTimer(self)
+        self._drain_timer.setInterval(DRAIN_INTERVAL_MS)
+        self._drain_timer.timeout.connect(self._drain_updates)
+        self._source_path: str | None = None
+        self._manifest = JobManifest()
+        self._key_check = _KeyCheck(self)
+        self._key_check.done.connect(self._on_key_checked)
+        known_models = settings.read_settings(section="openai").get("models")
+        if known_models:
+            self._apply_model_access(known_models.split(","))
+        QTimer.singleShot(0, self._offer_resume)
+
+    # ---------- FILES ----------
     @Slot()
     def _on_import(self):
-        fn, _ = QFileDialog.getOpenFileName(self, "Open CSV", filter="CSV files (*.csv)")
+        fn, _ = QFileDialog.getOpenFileName(self, "Open catalog", filter=FILE_FILTER)
         if not fn:
             return
-        try:
-            df = csv_handler.import_csv(fn)
-        except Exception as exc:  # noqa
-            QMessageBox.critical(self, "Error", str(exc))
+        self._load_file(fn)
+
+    def _load_file(self, fn: str, on_loaded: Optional[Callable[[], None]] = None) -> None:
+        """Stream *fn* into the table on a worker thread; call *on_loaded* when complete."""
+        worker = _ImportWorker(fn, self._begin_io(busy=True))
+        self.model.begin_streaming()
+        worker.chunk_loaded.connect(self.model.append_chunk)
+        worker.consolidated.connect(self.model.adopt_consolidated)
+        worker.progress.connect(self._status.showMessage)
+        worker.failed.connect(self._on_io_failed)
+        worker.finished.connect(self._on_import_finished)
+        self._io_target = fn
+        self._on_loaded = on_loaded
+        self._start_io(worker)
+
+    @Slot(bool)
+    def _on_import_finished(self, completed: bool):
+        fn, on_loaded = self._io_target, self._on_loaded
+        self._on_loaded = None
+        self.model.finish_streaming()
+        self._end_io()
+        df = self.model.dataframe()
+        if not completed:
+            self._status.showMessage(f"Import cancelled after {len(df):,} rows")
             return
-        self.table.setRowCount(max(len(df), 1))
-        for r, row in df.iterrows():
-            for c, key in enumerate(COLUMNS):
-                self.table.setItem(r, c, QTableWidgetItem(str(row.get(key, ""))))
-        self._status.showMessage(f"Loaded {Path(fn).name}")
+        self._source_path = fn
+        mem_mb = csv_handler.memory_usage(df) / 1_000_000
+        self._status.showMessage(f"Loaded {Path(fn).name} ({len(df):,} rows, {mem_mb:.1f} MB)")
+        if on_loaded is not None:
+            on_loaded()
 
     @Slot()
-    def _on_export(self):
-        fn, _ = QFileDialog.getSaveFileName(self, "Save CSV", filter="CSV files (*.csv)")
+    def _on_export(self) -> bool:
+        """Ask for a target and start exporting to it; return whether an export started."""
+        fn, _ = QFileDialog.getSaveFileName(self, "Save catalog", filter=FILE_FILTER)
         if not fn:
-            return
-        rows = [(
-            self._cell_text(r, 0),
-            self._cell_text(r, 1),
-            self._cell_text(r, 2),
-        ) for r in range(self.table.rowCount())]
-        try:
-            csv_handler.export_csv(pd.DataFrame(rows, columns=COLUMNS), fn)
-            self._status.showMessage("CSV exported")
-        except Exception as exc:
-            QMessageBox.critical(self, "Error", str(exc))
+            return False
+        if Path(fn).suffix.lower() not in csv_handler.SUPPORTED_SUFFIXES:
+            fn += ".csv"
+        # Export a snapshot so results arriving meanwhile cannot race the writer.
+        worker = _ExportWorker(self.model.dataframe().copy(), fn, self._begin_io(busy=False))
+        worker.progress.connect(self._on_export_progress)
+        worker.failed.connect(self._on_io_failed)
+        worker.finished.connect(self._on_export_finished)
+        self._io_target = fn
+        self._start_io(worker)
+        return True
+
+    @Slot(int, int)
+    def _on_export_progress(self, done: int, total: int):
+        self._io_progress.setRange(0, max(total, 1))
+        self._io_progress.setValue(done)
+        self._status.showMessage(f"Exporting… {done:,}/{total:,} rows")
+
+    @Slot(bool)
+    def _on_export_finished(self, completed: bool):
+        self._end_io()
+        self._status.showMessage(f"Exported {Path(self._io_target).name}" if completed else "Export cancelled")
+        if self._close_after_export:
+            self._close_after_export = False
+            if completed:
+                self._closing = True
+                self.close()
+
+    # ---------- background I/O ----------
+    def _begin_io(self, *, busy: bool) -> threading.Event:
+        self._io_cancel = threading.Event()
+        for btn in (self.import_btn, self.export_btn, self.generate_btn):
+            btn.setEnabled(False)
+        self._io_progress.setRange(0, 0 if busy else 1)  # (0, 0) shows a busy indicator
+        self._io_progress.setValue(0)
+        self._io_progress.show()
+        self._io_cancel_btn.show()
+        return self._io_cancel
+
+    def _start_io(self, worker: QObject) -> None:
+        self._io_worker = worker  # keep a reference until the thread is done
+        threading.Thread(target=worker.run, daemon=True).start()
+
+    def _end_io(self) -> None:
+        self._io_worker = None
+        self._io_cancel = None
+        self._io_progress.hide()
+        self._io_cancel_btn.hide()
+        self.export_btn.setEnabled(True)
+        if not self._generating():
+            self.import_btn.setEnabled(True)
+            self.generate_btn.setEnabled(True)
+
+    def _generating(self) -> bool:
+        return self._worker_thread is not None and self._worker_thread.is_alive()
+
+    @Slot()
+    def _on_cancel_io(self):
+        if self._io_cancel is not None:
+            self._io_cancel.set()
+
+    @Slot(str)
+    def _on_io_failed(self, message: str):
+        self._close_after_export = False  # stay open so the user can export elsewhere
+        self.model.finish_streaming()
+        self._end_io()
+        QMessageBox.critical(self, "Error", message)
 
     # ---------- API KEY ----------
     @Slot()
     def _on_api_key(self):
         dlg = ApiKeyDialog(self)
         if dlg.exec() == QDialog.Accepted and dlg.key:
-            if api_keys.validate_api_key(dlg.key):
-                api_keys.save_api_key(dlg.key)
-                settings.write_settings({"api_saved": True}, section="openai")
-                QMessageBox.information(self, "Saved", "API key saved")
-            else:
-                QMessageBox.warning(self, "Invalid", "Key invalid")
+            self._status.showMessage("Validating API key…")
+            self._key_check.start(dlg.key)
+
+    @Slot(str, object)
+    def _on_key_checked(self, key: str, info: api_keys.KeyInfo):
+        if not info.valid and info.reached:
+            self._status.showMessage("API key rejected")
+            QMessageBox.warning(self, "Invalid", info.error or "Key invalid")
+            return
+        # An unreachable API says nothing about the key: keep it, with nothing known about its models or limits.
+        status = api_keys.store_checked_key(key, info)
+        self._apply_model_access(info.models)
+        self._status.showMessage(status)
+
+    def _apply_model_access(self, models) -> None:
+        """Disable the models the current key cannot use.
+
+        An empty list means the probe could not tell, so every model stays enabled.
+        """
+        view_model = self.model_combo.model()
+        for row, name in enumerate(AVAILABLE_MODELS):
+            view_model.item(row).setEnabled(not models or name in models)
+        if models and self.model_combo.currentText() not in models:
+            self.model_combo.setCurrentText(models[0])
+
+    @staticmethod
+    def _probed_limiter(model: str) -> Optional[RateLimiter]:
+        """Limiter for the rpm/tpm the API reported for *model* and the saved key, if any."""
+        cfg = settings.read_settings(section="openai")
+        if cfg.get("limits_model") != model:
+            return None
+        try:
+            rpm, tpm = float(cfg.get("rpm") or 0), float(cfg.get("tpm") or 0)
+        except ValueError:
+            return None
+        return RateLimiter(rpm or None, tpm or None) if rpm or tpm else None
 
     # ---------- GENERATE ----------
     @Slot()
     def _on_generate(self):
-        if not api_keys.load_api_key():
+        api_key = api_keys.load_api_key()
+        if not api_key:
             QMessageBox.warning(self, "API", "Set API key first")
             return
-        pending: List[Tuple[int, str, str]] = []
-        for r in range(self.table.rowCount()):
-            name = self._cell_text(r, 0)
-            desc = self._cell_text(r, 1)
-            ad = self._cell_text(r, 2)
-            if row_is_complete(name, desc) and not ad:
-                pending.append((r, name, desc))
+        df = self.model.dataframe()
+        todo = df[pending_mask(df)]
+        pending: List[Tuple[int, str, str]] = list(zip(todo.index.tolist(), todo["name"], todo["description"]))
         if not pending:
             QMessageBox.information(self, "Info", "No rows to generate")
             return
 
+        tone = self.tone_combo.currentText()
+        model = self.model_combo.currentText()
+        params = {"max_tokens": self.tokens_spin.value(), "temperature": self.temp_spin.value()}
+
         self.generate_btn.setEnabled(False)
-        self._status.showMessage("Generating…")
+        self.import_btn.setEnabled(False)  # row indices must stay valid while results arrive
+        self._status.showMessage("Checking earlier jobs…")
 
+        # Rows finished by an earlier (possibly interrupted) job are filled from the manifest by the worker.
         worker = _Worker(
             pending,
-            tone=self.tone_combo.currentText(),
-            model=self.model_combo.currentText(),
-            max_tokens=self.tokens_spin.value(),
-            temperature=self.temp_spin.value(),
+            tone=tone,
+            model=model,
+            max_tokens=params["max_tokens"],
+            temperature=params["temperature"],
+            manifest=self._manifest,
+            source=self._source_path,
+            updates=self._updates,
+            api_key=api_key,
+            limiter=self._probed_limiter(model),
         )
         thread = threading.Thread(target=worker.run, daemon=True)
         self._worker_thread = thread
-        worker.result_row.connect(self._on_result_row)
-        worker.progress.connect(lambda p, t: self._status.showMessage(f"Processed {p}/{t}…"))
         worker.finished.connect(self._on_finished)
+        self._drain_timer.start()
         thread.start()
 
     @Slot()
-    def _on_finished(self):
-        self.generate_btn.setEnabled(True)
-        self._status.showMessage("Done ✔")
+    def _offer_resume(self):
+        job = self._manifest.last_unfinished_job()
+        if job is None or not job["source"] or not Path(job["source"]).exists():
+            return
+        answer = QMessageBox.question(
+            self,
+            "Resume",
+            f"Resume previous job for {Path(job['source']).name}?",
+            QMessageBox.Yes | QMessageBox.No,
+        )
+        if answer != QMessageBox.Yes:
+            self._manifest.finish_job(job["id"])
+            return
+        self.tone_combo.setCurrentText(job["tone"])
+        self.model_combo.setCurrentText(job["model"])
+        self.tokens_spin.setValue(int(job["params"].get("max_tokens", self.tokens_spin.value())))
+        self.temp_spin.setValue(float(job["params"].get("temperature", self.temp_spin.value())))
+        # The interrupted job is superseded by the one _on_generate starts.
+        self._manifest.finish_job(job["id"])
+        self._load_file(job["source"], on_loaded=self._on_generate)
+
+    @Slot(str)
+    def _on_finished(self, status: str):
+        self._drain_timer.stop()
+        self._drain_updates()
+        self._worker_thread = None
+        self.generate_btn.setEnabled(self._io_cancel is None)
+        self.import_btn.setEnabled(self._io_cancel is None)
+        self._status.showMessage(status)
         settings.write_settings({
             "max_tokens": self.tokens_spin.value(),
             "temperature": self.temp_spin.value(),
             "model": self.model_combo.currentText(),
         }, section="openai")
 
-    @Slot(int, str)
-    def _on_result_row(self, row: int, text: str):
-        self.table.setItem(row, 2, QTableWidgetItem(text))
+    @Slot()
+    def _drain_updates(self):
+        results, status = self._updates.drain()
+        self.model.set_ads(results)
+        if status:
+            self._status.showMessage(status)
 
     def closeEvent(self, event):  # noqa: N802
-        # Ask user to save CSV and keep API key
+        if self._closing:  # the export started on the first close request has finished
+            event.accept()
+            return
+        if self._close_after_export:  # still exporting; close when it finishes
+            event.ignore()
+            return
+        # Ask user to export the sheet and keep API key
         save_api = QMessageBox.question(self, "Exit", "Save API key before exit?", QMessageBox.Yes | QMessageBox.No)
         if save_api == QMessageBox.No:
             api_keys.save_api_key("")  # clear key
+        settings.flush_settings()
         save_csv = QMessageBox.question(self, "Exit", "Export spreadsheet before quit?", QMessageBox.Yes | QMessageBox.No)
         if save_csv == QMessageBox.Yes:
-            self._on_export()
+            if isinstance(self._io_worker, _ExportWorker):
+                self._close_after_export = True  # quit when the running export is written
+                event.ignore()
+                return
+            if self._io_worker is not None:
+                self._on_cancel_io()  # the sheet is still loading
+                QMessageBox.information(self, "Exit", "The import was cancelled; close again to export.")
+                event.ignore()
+                return
+            if self._on_export():
+                # The export runs on a worker thread; quit once it is written.
+                self._close_after_export = True
+                self._status.showMessage("Exporting before quit…")
+                event.ignore()
+                return
         event.accept()
 
-    # ---------- helpers ----------
-    def _cell_text(self, r: int, c: int) -> str:
-        itm = self.table.item(r, c)
-        return "" if itm is None else itm.text().strip()
+def start_preload() -> threading.Thread:
+    """Import pandas, pyarrow and openai on a background thread."""
+    thread = threading.Thread(target=preload, args=("pandas", "pyarrow", "openai"), daemon=True)
+    thread.start()
+    return thread
 
 
 def run_qt_app():
@@ -312,4 +636,6 @@ def run_qt_app():
     if icon_path.exists():
         window.setWindowIcon(QIcon(str(icon_path)))
     window.show()
+    # Warm up heavy dependencies once the window is on screen.
+    QTimer.singleShot(0, start_preload)
     sys.exit(app.exec())
@@ -0,0 +1,181 @@
+"""Qt table model that serves the spreadsheet straight from a DataFrame.
+
+Unlike ``QTableWidget`` no per-cell Qt objects are created: the view asks for
+the handful of cells it is painting and :meth:`SheetTableModel.data` looks them
+up in the underlying columns on demand. Loading a sheet therefore costs the
+same for 50 rows as for a million.
+
+While a file is streamed in by a background import, chunks are appended as
+separate frames (:meth:`SheetTableModel.append_chunk`) so the user can browse
+the first rows immediately. The import thread then builds the consolidated
+frame itself (:func:`consolidate_chunks`) and hands it over with
+:meth:`SheetTableModel.adopt_consolidated`, keeping the copy off the GUI
+thread.
+"""
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Any, Dict, List, Mapping, Tuple
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from core import csv_handler
+from utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+COLUMNS = ["name", "description", "ad"]
+HEADERS = ["Product Name", "Description", "Ad (output)"]
+AD_COLUMN = COLUMNS.index("ad")
+
+
+def _blank_frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({col: [""] * rows for col in COLUMNS})
+
+
+def consolidate_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """One compact frame from streamed chunks; safe to call on a worker thread."""
+    frame = pd.concat([chunk[COLUMNS] for chunk in chunks], ignore_index=True)
+    return csv_handler.compact_strings(frame)
+
+
+class SheetTableModel(QAbstractTableModel):
+    """Editable three-column model backed by a pandas DataFrame."""
+
+    def __init__(self, rows: int = 50, parent=None):
+        super().__init__(parent)
+        # The initial blank rows are only materialised (importing pandas) once
+        # something is written or the frame is requested.
+        self._frames: List[pd.DataFrame] = []
+        self._starts: List[int] = []
+        self._rows = rows
+        self._edited = False  # since streaming began
+
+    # ---------- Qt API ----------
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:  # noqa: N802
+        return 0 if parent.isValid() else self._rows
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:  # noqa: N802
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        if not self._frames:
+            return ""
+        frame, local = self._locate(index.row())
+        value = frame.iat[local, index.column()]
+        return "" if pd.isna(value) else str(value)
+
+    def setData(self, index: QModelIndex, value: Any, role: int = Qt.EditRole) -> bool:  # noqa: N802
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        self._set_cell(index.row(), index.column(), str(value))
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> Any:  # noqa: N802
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return None
+
+    # ---------- sheet API ----------
+    def load_dataframe(self, df: pd.DataFrame) -> None:
+        """Replace the sheet contents with *df* (canonical columns, any dtypes)."""
+        self.beginResetModel()
+        frame = df[COLUMNS].reset_index(drop=True) if len(df) else _blank_frame(1)
+        self._frames, self._starts, self._rows = [frame], [0], len(frame)
+        self.endResetModel()
+
+    def begin_streaming(self) -> None:
+        """Empty the sheet before chunks arrive through :meth:`append_chunk`."""
+        self.beginResetModel()
+        self._frames, self._starts, self._rows = [], [], 0
+        self._edited = False
+        self.endResetModel()
+
+    def append_chunk(self, chunk: pd.DataFrame) -> None:
+        """Append rows at the bottom of the sheet without touching existing ones."""
+        if not len(chunk):
+            return
+        self.beginInsertRows(QModelIndex(), self._rows, self._rows + len(chunk) - 1)
+        self._frames.append(chunk[COLUMNS].reset_index(drop=True))
+        self._starts.append(self._rows)
+        self._rows += len(chunk)
+        self.endInsertRows()
+
+    def adopt_consolidated(self, frame: pd.DataFrame) -> None:
+        """Replace the streamed chunks by *frame*, built from the same chunks elsewhere.
+
+        Ignored when the sheet was edited meanwhile; the chunks are then
+        consolidated on demand.
+        """
+        if not self._edited and len(frame) == self._rows:
+            self._frames, self._starts = [frame], [0]
+
+    def finish_streaming(self) -> None:
+        """End streaming; an empty import leaves one blank row."""
+        if not self._rows:
+            self.load_dataframe(_blank_frame(1))
+
+    def dataframe(self) -> pd.DataFrame:
+        """Return the backing DataFrame. Callers must not mutate it."""
+        self._materialise()
+        self._consolidate()
+        return self._frames[0]
+
+    def set_ads(self, updates: Mapping[int, str]) -> None:
+        """Write many ads at once and notify the view with a single signal."""
+        if not updates:
+            return
+        self._materialise()
+        self._edited = True
+        by_frame: Dict[int, List[Tuple[int, str]]] = defaultdict(list)
+        for row, text in updates.items():
+            frame_idx = bisect_right(self._starts, row) - 1
+            by_frame[frame_idx].append((row - self._starts[frame_idx], text))
+        for frame_idx, items in by_frame.items():
+            self._ensure_writable(frame_idx, AD_COLUMN)
+            local_rows, texts = zip(*items)
+            self._frames[frame_idx].iloc[list(local_rows), AD_COLUMN] = list(texts)
+        rows = list(updates)
+        self.dataChanged.emit(
+            self.index(min(rows), AD_COLUMN),
+            self.index(max(rows), AD_COLUMN),
+            [Qt.DisplayRole, Qt.EditRole],
+        )
+
+    # ---------- helpers ----------
+    def _locate(self, row: int) -> Tuple[pd.DataFrame, int]:
+        frame_idx = bisect_right(self._starts, row) - 1
+        return self._frames[frame_idx], row - self._starts[frame_idx]
+
+    def _materialise(self) -> None:
+        if not self._frames:
+            self._frames, self._starts = [_blank_frame(self._rows)], [0]
+
+    def _consolidate(self) -> None:
+        if len(self._frames) > 1:
+            self._frames = [pd.concat(self._frames, ignore_index=True)]
+            self._starts = [0]
+
+    def _set_cell(self, row: int, column: int, value: str) -> None:
+        self._materialise()
+        self._edited = True
+        frame_idx = bisect_right(self._starts, row) - 1
+        self._ensure_writable(frame_idx, column)
+        self._frames[frame_idx].iat[row - self._starts[frame_idx], column] = value
+
+    def _ensure_writable(self, frame_idx: int, column: int) -> None:
+        # Dictionary-encoded columns only accept known categories; fall back to
+        # plain strings for a column the user starts editing.
+        frame = self._frames[frame_idx]
+        name = COLUMNS[column]
+        if isinstance(frame[name].dtype, pd.CategoricalDtype):
+            frame[name] = frame[name].astype("string")
@@ -0,0 +1,167 @@
+"""Python-side data model for the Tk spreadsheet widgets.
+
+:class:`SheetData` is the authoritative copy of the sheet, stored column-wise
+in plain Python lists. :class:`VirtualRows` keeps a ``ttk.Treeview`` showing
+only the rows that fit on screen and re-renders that window when the user
+scrolls. Exporting, scanning for pending rows and autosaving read the lists
+directly and never make a Tcl call per row.
+"""
+from __future__ import annotations
+
+from tkinter import ttk
+from typing import List, Mapping, Sequence, Tuple
+
+import pandas as pd
+
+from utils.validation import pending_mask
+
+COLUMNS = ("name", "description", "ad")
+_AD = COLUMNS.index("ad")
+
+
+def _as_text_list(column: pd.Series) -> List[str]:
+    return ["" if pd.isna(value) else str(value) for value in column.tolist()]
+
+
+class SheetData:
+    """Column-oriented three-column sheet."""
+
+    def __init__(self, rows: int = 0):
+        self._columns: List[List[str]] = [[""] * rows for _ in COLUMNS]
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "SheetData":
+        data = cls()
+        data._columns = [_as_text_list(df[col]) if col in df.columns else [""] * len(df) for col in COLUMNS]
+        return data
+
+    def __len__(self) -> int:
+        return len(self._columns[0])
+
+    def row(self, index: int) -> Tuple[str, str, str]:
+        return tuple(column[index] for column in self._columns)  # type: ignore[return-value]
+
+    def set_cell(self, index: int, column: int, value: str) -> None:
+        """Set one cell; writing past the last row appends blank rows up to *index*."""
+        if index >= len(self):
+            if not value:
+                return
+            for values in self._columns:
+                values.extend([""] * (index + 1 - len(values)))
+        self._columns[column][index] = value
+
+    def set_ads(self, updates: Mapping[int, str]) -> None:
+        ads = self._columns[_AD]
+        for index, text in updates.items():
+            ads[index] = text
+
+    def as_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(dict(zip(COLUMNS, self._columns)))
+
+    def pending_rows(self) -> List[Tuple[int, str, str]]:
+        """Return ``(row, name, description)`` for rows that still need an ad."""
+        df = self.as_dataframe()
+        todo = df[pending_mask(df)]
+        return list(zip(todo.index.tolist(), todo["name"], todo["description"]))
+
+
+class VirtualRows:
+    """Render a window of :class:`SheetData` rows into a ``ttk.Treeview``.
+
+    The tree only ever holds as many items as fit in its viewport; the
+    scrollbar is driven from the Python side and scrolling just rewrites the
+    values of those recycled items.
+    """
+
+    def __init__(self, tree, scrollbar, data: SheetData, visible: int):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.data = data
+        self.top = 0
+        self._items: List[str] = []
+        self._resize(visible)
+
+        scrollbar.configure(command=self._on_scrollbar)
+        tree.bind("<MouseWheel>", self._on_wheel)
+        tree.bind("<Button-4>", lambda _e: self.scroll(-3))
+        tree.bind("<Button-5>", lambda _e: self.scroll(3))
+        tree.bind("<Configure>", self._on_configure)
+
+    # ---------- public ----------
+    def load(self, data: SheetData) -> None:
+        self.data = data
+        self.top = 0
+        self.render()
+
+    def row_for_item(self, item_id: str) -> int:
+        return self.top + self._items.index(item_id)
+
+    def set_cell(self, row: int, column: int, value: str) -> None:
+        """Edit a cell; editing one of the blank rows below the data extends the sheet."""
+        grows = row >= len(self.data)
+        self.data.set_cell(row, column, value)
+        if grows:
+            self.render()
+        else:
+            self.render_rows([row])
+
+    def set_ads(self, updates: Mapping[int, str]) -> None:
+        self.data.set_ads(updates)
+        self.render_rows(updates)
+
+    def scroll(self, delta: int) -> None:
+        self._scroll_to(self.top + delta)
+
+    def render(self) -> None:
+        for offset, item in enumerate(self._items):
+            self._render_item(item, self.top + offset)
+        self._update_scrollbar()
+
+    def render_rows(self, rows: Sequence[int] | Mapping[int, str]) -> None:
+        """Re-render only the given rows, and only if they are on screen."""
+        end = self.top + len(self._items)
+        for row in rows:
+            if self.top <= row < end:
+                self._render_item(self._items[row - self.top], row)
+
+    # ---------- internals ----------
+    def _render_item(self, item: str, row: int) -> None:
+        self.tree.item(item, values=self.data.row(row) if row < len(self.data) else ("", "", ""))
+
+    def _resize(self, visible: int) -> None:
+        visible = max(visible, 1)
+        while len(self._items) < visible:
+            self._items.append(self.tree.insert("", "end", values=("", "", "")))
+        while len(self._items) > visible:
+            self.tree.delete(self._items.pop())
+
+    def _scroll_to(self, top: int) -> None:
+        top = max(0, min(top, len(self.data) - len(self._items)))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def _update_scrollbar(self) -> None:
+        total = max(len(self.data), 1)
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + len(self._items)) / total))
+
+    def _on_scrollbar(self, action: str, amount: str, unit: str | None = None) -> None:
+        if action == "moveto":
+            self._scroll_to(int(float(amount) * len(self.data)))
+        elif action == "scroll":
+            step = len(self._items) if unit == "pages" else 1
+            self.scroll(int(amount) * step)
+
+    def _on_wheel(self, event) -> str:
+        self.scroll(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _on_configure(self, event) -> None:
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 26)
+        # Leave room for the heading row.
+        visible = max(1, event.height // row_height - 1)
+        if visible != len(self._items):
+            self._resize(visible)
+            self._scroll_to(self.top)
+            self.render()
+
@@ -1,15 +1,13 @@
 """Pure-ttk spreadsheet widget (no CustomTkinter), for maximum macOS compatibility."""
 from __future__ import annotations
 
-from typing import List, Tuple
+from typing import List, Mapping, Tuple
 
 import tkinter as tk
 from tkinter import ttk
 import pandas as pd
 
-from utils.validation import row_is_complete
-
-COLUMNS = ("name", "description", "ad")
+from .sheet_data import COLUMNS, SheetData, VirtualRows
 
 
 class SpreadsheetWidgetTTK(ttk.Frame):
@@ -42,36 +40,30 @@ class SpreadsheetWidgetTTK(ttk.Frame):
             self.tree.column(col, width=220 if col != "ad" else 360, stretch=True)
         self.tree.pack(side="left", fill="both", expand=True)
 
-        vsb = ttk.Scrollbar(container, orient="vertical", command=self.tree.yview)
+        vsb = ttk.Scrollbar(container, orient="vertical")
         vsb.pack(side="right", fill="y")
-        self.tree.configure(yscrollcommand=vsb.set)
 
-        for _ in range(rows):
-            self.tree.insert("", "end", values=("", "", ""))
+        # The tree only renders the visible rows; SheetData holds the full sheet.
+        self._rows = VirtualRows(self.tree, vsb, SheetData(rows), visible=rows)
+        self._rows.render()
 
         self.tree.bind("<Double-1>", self._on_double_click)
 
     def as_dataframe(self) -> pd.DataFrame:
-        data = [self.tree.item(i, "values") for i in self.tree.get_children()]
-        return pd.DataFrame(data, columns=COLUMNS)
+        return self._rows.data.as_dataframe()
 
     def load_dataframe(self, df: pd.DataFrame):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        for _, row in df.iterrows():
-            self.tree.insert("", "end", values=(row["name"], row["description"], row.get("ad", "")))
-
-    def iter_incomplete_rows(self) -> List[Tuple[str, str, str]]:
-        result = []
-        for item in self.tree.get_children():
-            name, desc, ad = self.tree.item(item, "values")
-            if row_is_complete(name, desc) and not str(ad).strip():
-                result.append((item, name, desc))
-        return result
-
-    def set_ad(self, item_id: str, ad_text: str):
-        name, desc, _ = self.tree.item(item_id, "values")
-        self.tree.item(item_id, values=(name, desc, ad_text))
+        self._rows.load(SheetData.from_dataframe(df))
+
+    def iter_incomplete_rows(self) -> List[Tuple[int, str, str]]:
+        return self._rows.data.pending_rows()
+
+    def set_ad(self, row: int, ad_text: str):
+        self._rows.set_ads({row: ad_text})
+
+    def set_ads(self, updates: Mapping[int, str]):
+        """Apply a batch of ``row -> ad_text`` updates drained from the worker."""
+        self._rows.set_ads(updates)
 
     def _on_double_click(self, event):
         region = self.tree.identify("region", event.x, event.y)
@@ -88,7 +80,7 @@ class SpreadsheetWidgetTTK(ttk.Frame):
         entry.focus()
 
         def _save_edit(_event):
-            self.tree.set(row_id, column, entry.get())
+            self._rows.set_cell(self._rows.row_for_item(row_id), int(column[1:]) - 1, entry.get())
             entry.destroy()
 
         entry.bind("<Return>", _save_edit)
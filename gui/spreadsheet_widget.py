@@ -2,15 +2,13 @@
 from __future__ import annotations
 
 import tkinter as tk
-from typing import Optional, List, Tuple
+from typing import Optional, List, Mapping, Tuple
 
 import pandas as pd
 import customtkinter as ctk
 from tkinter import ttk
 
-from utils.validation import row_is_complete
-
-COLUMNS = ("name", "description", "ad")
+from .sheet_data import COLUMNS, SheetData, VirtualRows
 
 
 class SpreadsheetWidget(ctk.CTkFrame):
@@ -50,43 +48,34 @@ class SpreadsheetWidget(ctk.CTkFrame):
 
         self.tree.pack(side="left", fill="both", expand=True, padx=(1, 0), pady=1)
 
-        vsb = ttk.Scrollbar(container, orient="vertical", command=self.tree.yview)
+        vsb = ttk.Scrollbar(container, orient="vertical")
         vsb.pack(side="right", fill="y")
-        self.tree.configure(yscrollcommand=vsb.set)
 
         # Double-click to edit cell
         self.tree.bind("<Double-1>", self._on_double_click)
 
-        # Prepopulate empty rows
-        for _ in range(rows):
-            self.tree.insert("", "end", values=("", "", ""))
+        # Only the visible rows live in the tree; SheetData holds the full sheet
+        self._rows = VirtualRows(self.tree, vsb, SheetData(rows), visible=rows)
+        self._rows.render()
 
     # -------------------- Data Helpers -------------------- #
 
     def as_dataframe(self) -> pd.DataFrame:
-        data = [self.tree.item(i, "values") for i in self.tree.get_children()]
-        return pd.DataFrame(data, columns=COLUMNS)
+        return self._rows.data.as_dataframe()
 
     def load_dataframe(self, df: pd.DataFrame):
-        # Clear existing
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        # Insert rows
-        for _, row in df.iterrows():
-            self.tree.insert("", "end", values=(row["name"], row["description"], row.get("ad", "")))
-
-    def iter_incomplete_rows(self) -> List[Tuple[str, str, str]]:
-        """Return (item_id, name, description) for rows missing an ad but having inputs."""
-        result = []
-        for idx, item in enumerate(self.tree.get_children()):
-            name, desc, ad = self.tree.item(item, "values")
-            if row_is_complete(name, desc) and not ad.strip():
-                result.append((item, name, desc))
-        return result
-
-    def set_ad(self, item_id: str, ad_text: str):
-        name, desc, _ = self.tree.item(item_id, "values")
-        self.tree.item(item_id, values=(name, desc, ad_text))
+        self._rows.load(SheetData.from_dataframe(df))
+
+    def iter_incomplete_rows(self) -> List[Tuple[int, str, str]]:
+        """Return (row, name, description) for rows missing an ad but having inputs."""
+        return self._rows.data.pending_rows()
+
+    def set_ad(self, row: int, ad_text: str):
+        self._rows.set_ads({row: ad_text})
+
+    def set_ads(self, updates: Mapping[int, str]):
+        """Apply a batch of ``row -> ad_text`` updates drained from the worker."""
+        self._rows.set_ads(updates)
 
     # -------------------- Cell Editing -------------------- #
 
@@ -105,7 +94,7 @@ class SpreadsheetWidget(ctk.CTkFrame):
         entry.focus()
 
         def _save_edit(event):
-            self.tree.set(row_id, column, entry.get())
+            self._rows.set_cell(self._rows.row_for_item(row_id), int(column[1:]) - 1, entry.get())
             entry.destroy()
 
         entry.bind("<Return>", _save_edit)
@@ -11,4 +11,13 @@ BASE_PROMPT: str = (
     "ტექსტი უნდა იყოს {tone} ტონში, 100%-ით ქართულ ენაზე, გრამატიკულად გამართული და პროფესიონალურად ჩამოყალიბებული. "
     "გამოიყენე მარკეტინგული ხრიკები, ემოციური და დამაჯერებელი ფრაზები, რათა მომხმარებელმა დაუყოვნებლივ იგრძნოს შეძენის სურვილი. "
     "არ ჩართო მისალმებები, ახსნა ან ზედმეტი ტექსტი — მხოლოდ სუფთა, მიზანმიმართული რეკლამა."
-)
\ No newline at end of file
+)
+# Used to turn the ad of one product variant into the ad of another
+# (``core.near_dup``): ``{ad}`` is the existing ad, ``{changes}`` lists the
+# differing attributes as "old → new" pairs.
+ADAPT_PROMPT: str = (
+    "ეს არის სარეკლამო ტექსტი ერთი პროდუქტისთვის: '{ad}'. "
+    "გადააკეთე ის იმავე პროდუქტის სხვა ვარიანტისთვის შემდეგი ცვლილებებით: {changes}. "
+    "შეცვალე მხოლოდ ეს დეტალები, სწორი ბრუნვით; დანარჩენი ტექსტი დატოვე უცვლელი. "
+    "დააბრუნე მხოლოდ ტექსტი."
+)
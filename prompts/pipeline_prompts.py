@@ -0,0 +1,28 @@
+"""Stage prompts for the multi-step generation pipeline.
+
+Used by :func:`core.pipeline.default_pipeline`. Besides ``{name}``,
+``{description}`` and ``{tone}``, each template may refer to the output of an
+earlier stage by its stage name (``{benefits}``, ``{draft}``) and to pipeline
+settings such as ``{max_chars}``.
+"""
+
+BENEFITS_PROMPT: str = (
+    "ჩამოწერე პროდუქტის '{name}' სამი მთავარი სარგებელი მყიდველისთვის, აღწერის მიხედვით: '{description}'. "
+    "თითო სარგებელი ერთ მოკლე ფრაზად, ქართულად, მძიმით გამოყოფილი. "
+    "არ დაამატო შესავალი, ნუმერაცია ან ახსნა."
+)
+
+DRAFT_PROMPT: str = (
+    "შენ ხარ მაღალკვალიფიციური ქართველი კოპირაიტერი. "
+    "დაწერე მოკლე (1–2 წინადადება), მკაფიო და დამამახსოვრებელი სარეკლამო ტექსტი "
+    "პროდუქტისთვის სახელად '{name}', რომლის აღწერაა: '{description}'. "
+    "ხაზი გაუსვი ამ სარგებელს: {benefits}. "
+    "ტექსტი უნდა იყოს {tone} ტონში, 100%-ით ქართულ ენაზე და გრამატიკულად გამართული. "
+    "არ ჩართო მისალმებები, ბრჭყალები, ახსნა ან ზედმეტი ტექსტი — მხოლოდ რეკლამა."
+)
+
+SHORTEN_PROMPT: str = (
+    "შეამოკლე ეს სარეკლამო ტექსტი მაქსიმუმ {max_chars} სიმბოლომდე, ისე რომ შეინარჩუნოს მთავარი აზრი, "
+    "{tone} ტონი და ქართული ენა: '{draft}'. "
+    "თუ ტექსტი უკვე საკმარისად მოკლეა, დააბრუნე უცვლელად. დააბრუნე მხოლოდ ტექსტი."
+)
@@ -0,0 +1,54 @@
+"""Deferred module imports for faster application start-up.
+
+``pd = lazy_import("pandas")`` binds a placeholder whose first attribute
+access performs the real import. Modules on the start-up path can therefore
+refer to pandas or openai at module level without paying for them before the
+main window is on screen.
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+from types import ModuleType
+from typing import Any, Optional
+
+__all__ = ["lazy_import", "preload"]
+
+
+class _LazyModule:
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self) -> ModuleType:
+        module: Optional[ModuleType] = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_import(name: str) -> Any:
+    """Return *name* if it is already imported, otherwise a lazy placeholder."""
+    module = sys.modules.get(name)
+    return module if module is not None else _LazyModule(name)
+
+
+def preload(*names: str) -> None:
+    """Import *names* now, ignoring ones that are not installed.
+
+    Meant to run on a background thread once the UI is visible so the first
+    user action does not stall on a cold import.
+    """
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
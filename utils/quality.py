@@ -0,0 +1,187 @@
+"""Post-generation quality gate for Georgian advertisements.
+
+:class:`QualityGate` checks a whole batch of generated ads at once with pandas
+string operations and returns one reason code per ad (``""`` when it passes):
+
+``empty``
+    no letters at all.
+``forbidden_prefix``
+    starts with a greeting, a label such as "რეკლამა:", quotes or an
+    English/Russian preamble.
+``not_georgian``
+    fewer than ``min_georgian_ratio`` of the letters are Mkhedruli; see
+    :func:`georgian_ratio`.
+``too_many_sentences`` / ``too_short`` / ``too_long``
+    outside the requested 1–2 sentences or the length bounds.
+``duplicate``
+    the same ad (ignoring case and punctuation) was already accepted for a
+    different product in this job.
+
+Callers re-request only the rejected rows; see
+:func:`core.runner.generate_file` and :func:`core.ad_generator.generate_batch`.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+__all__ = ["QualityRules", "QualityGate", "QualityError", "DEFAULT_FORBIDDEN_PREFIXES", "georgian_ratio"]
+
+DEFAULT_FORBIDDEN_PREFIXES: Tuple[str, ...] = (
+    "გამარჯობა",
+    "სალამი",
+    "რეკლამა:",
+    "სარეკლამო ტექსტი",
+    "აი თქვენი",
+    "here",
+    "sure",
+    "certainly",
+    "ad:",
+    "реклама",
+    "вот",
+    '"',
+    "'",
+    "„",
+    "“",
+    "«",
+    "*",
+    "#",
+    "-",
+)
+
+# Explicit ranges rather than \w: Arrow-backed string columns match with RE2,
+# whose \w is ASCII-only. Latin and Cyrillic cover the usual stray languages.
+_LETTER = r"[A-Za-zА-яЁёა-ჿ]"
+_GEORGIAN = r"[ა-ჿ]"
+_NOT_WORD = r"[^0-9A-Za-zА-яЁёა-ჿ]+"
+_SENTENCE_END = r"[.!?…]+(?=\s|$)"
+_WORD_RE = re.compile(r"[0-9A-Za-zА-яЁёა-ჿ]+")
+_LETTER_RE = re.compile(_LETTER)
+_GEORGIAN_RE = re.compile(_GEORGIAN)
+
+
+def georgian_ratio(text: str, source: str = "") -> Optional[float]:
+    """Share of the letters in *text* that are Mkhedruli, ``None`` without letters.
+
+    Words that also occur in *source* (the product's name and description)
+    are left out, so brand and model names copied from it are not foreign:
+
+    >>> georgian_ratio("Samsung Galaxy S24 — საუკეთესო სმარტფონი შენთვის!", "Samsung Galaxy S24")
+    1.0
+    >>> georgian_ratio("Nike Air Max 90 — სტილი და კომფორტი.", "Nike Air Max 90")
+    1.0
+    >>> georgian_ratio("Best running shoes for you.", "Nike Air Max 90")
+    0.0
+    """
+    if not _LETTER_RE.search(text):
+        return None
+    known = {word.lower() for word in _WORD_RE.findall(source)}
+    georgian = foreign = 0
+    for word in _WORD_RE.findall(text):
+        letters = len(_LETTER_RE.findall(word))
+        native = len(_GEORGIAN_RE.findall(word))
+        georgian += native
+        if native < letters and word.lower() not in known:
+            foreign += letters - native
+    return georgian / (georgian + foreign) if georgian + foreign else 0.0
+
+
+@dataclass(frozen=True)
+class QualityRules:
+    """Thresholds used by :class:`QualityGate`."""
+
+    min_georgian_ratio: float = 0.8
+    max_sentences: int = 2
+    min_chars: int = 15
+    max_chars: int = 300
+    forbidden_prefixes: Tuple[str, ...] = DEFAULT_FORBIDDEN_PREFIXES
+    check_duplicates: bool = True
+
+
+class QualityError(ValueError):
+    """An ad that still failed the quality gate after all retries."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"rejected by quality gate: {reason}")
+        self.reason = reason
+
+
+class QualityGate:
+    """Vectorized validator for generated ads.
+
+    One gate should be used for a whole job so duplicates are caught across
+    batches. Only accepted ads are remembered, so a rejected ad that is
+    regenerated is checked against the others again.
+    """
+
+    def __init__(self, rules: Optional[QualityRules] = None):
+        self.rules = rules or QualityRules()
+        prefixes = "|".join(re.escape(prefix) for prefix in self.rules.forbidden_prefixes)
+        self._prefix = re.compile(rf"^\s*(?:{prefixes})", re.IGNORECASE) if prefixes else None
+        self._accepted: Dict[str, str] = {}  # normalized ad -> product it was accepted for
+        self.checked = 0
+        self.rejections: Dict[str, int] = {}
+
+    def check(
+        self, ads: Sequence[str], names: Sequence[str], descriptions: Sequence[str], *, duplicates: bool = True
+    ) -> "pd.Series":
+        """Return the rejection reason for each ad, ``""`` for ads that pass.
+
+        The result keeps the index of *ads* when it is a Series. Ads derived
+        on purpose from an accepted one, such as a near-duplicate variant's,
+        are checked with ``duplicates=False``: the ``duplicate`` rule skips
+        them and they are not remembered.
+        """
+        rules = self.rules
+        text = pd.Series(ads, dtype="string").fillna("").str.strip()
+        reasons = pd.Series("", index=text.index, dtype=object)
+
+        def flag(mask, reason: str) -> None:
+            reasons[mask.fillna(False).to_numpy(dtype=bool) & (reasons == "").to_numpy()] = reason
+
+        length = text.str.len()
+        letters = text.str.count(_LETTER)
+        flag(letters == 0, "empty")
+        if self._prefix is not None:
+            flag(text.str.contains(self._prefix), "forbidden_prefix")
+        sources = (
+            pd.Series(list(names), index=text.index, dtype="string").fillna("")
+            + " "
+            + pd.Series(list(descriptions), index=text.index, dtype="string").fillna("")
+        )
+        ratio = pd.Series(
+            [georgian_ratio(ad, source) for ad, source in zip(text, sources)], index=text.index, dtype=float
+        )
+        flag(ratio < rules.min_georgian_ratio, "not_georgian")
+        sentences = text.str.count(_SENTENCE_END) + (~text.str.contains(r"[.!?…]$")).astype(int)
+        flag(sentences > rules.max_sentences, "too_many_sentences")
+        flag(length < rules.min_chars, "too_short")
+        flag(length > rules.max_chars, "too_long")
+
+        if rules.check_duplicates and duplicates:
+            products = (
+                pd.Series(list(names), index=text.index, dtype="string").str.strip()
+                + "\x1f"
+                + pd.Series(list(descriptions), index=text.index, dtype="string").str.strip()
+            )
+            normalized = text.str.lower().str.replace(_NOT_WORD, " ", regex=True).str.strip()
+            passing = reasons == ""
+            # Owner of each ad: the product it was accepted for earlier, else the
+            # first passing product in this batch that produced it.
+            earlier = normalized.map(self._accepted)
+            first = products[passing].groupby(normalized[passing]).transform("first")
+            owner = earlier.fillna(first.reindex(text.index))
+            flag(passing & owner.notna() & (owner != products), "duplicate")
+            accepted = reasons == ""
+            for ad, product in zip(normalized[accepted], products[accepted]):
+                self._accepted.setdefault(ad, product)
+
+        self.checked += len(reasons)
+        for reason, count in reasons[reasons != ""].value_counts().items():
+            self.rejections[reason] = self.rejections.get(reason, 0) + int(count)
+        return reasons
@@ -0,0 +1,197 @@
+"""Token-bucket rate limiting for OpenAI requests.
+
+OpenAI enforces two budgets per key: requests per minute (RPM) and tokens per
+minute (TPM). :class:`RateLimiter` keeps one :class:`TokenBucket` for each and
+makes a caller wait until both have room, so a batch job slows down to the
+allowed pace instead of collecting 429 errors.
+
+Buckets hand out *reservations*: taking from an empty bucket is allowed, it
+just returns how long the caller has to sleep before using what it took.
+Callers are therefore served in the order they asked, and the same bucket
+works for threads (:meth:`RateLimiter.acquire`) and asyncio tasks
+(:meth:`RateLimiter.wait`).
+
+:class:`FileTokenBucket` keeps the bucket state in a small file guarded by an
+OS file lock, so several worker processes can share one account's limits
+(see :meth:`RateLimiter.shared`).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+__all__ = ["TokenBucket", "FileTokenBucket", "RateLimiter"]
+
+_STATE = struct.Struct("<dd")  # tokens, last refill (wall clock)
+
+
+class TokenBucket:
+    """Refills at *rate* units per second up to *capacity* units."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, *, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, limit: float) -> "TokenBucket":
+        """Bucket for a per-minute limit, allowing up to a second's worth of burst."""
+        return cls(limit / 60.0, capacity=max(1.0, limit / 60.0))
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take *amount* units and return the seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """Give back units that were reserved but not used."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class FileTokenBucket:
+    """:class:`TokenBucket` whose state lives in *path*, shared between processes.
+
+    Every operation takes an exclusive lock on the file, reads the state,
+    updates it and writes it back; that costs a few microseconds, negligible
+    next to an API call. The wall clock is used because it is the same for
+    every process.
+    """
+
+    def __init__(self, path: str | Path, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.path = Path(path)
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._local = threading.Lock()  # the file lock does not exclude threads of one process
+
+    @classmethod
+    def per_minute(cls, path: str | Path, limit: float) -> "FileTokenBucket":
+        return cls(path, limit / 60.0, capacity=max(1.0, limit / 60.0))
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._state() as state:
+            state[0] -= amount
+            tokens = state[0]
+        return max(0.0, -tokens / self.rate)
+
+    def refund(self, amount: float) -> None:
+        with self._state() as state:
+            state[0] = min(self.capacity, state[0] + amount)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    @contextmanager
+    def _state(self) -> Iterator[List[float]]:
+        """Yield ``[tokens]`` refilled to now under the lock; store it on exit."""
+        with self._local:
+            _lock_file(self._fd)
+            try:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                raw = os.read(self._fd, _STATE.size)
+                now = time.time()
+                if len(raw) == _STATE.size:
+                    tokens, updated = _STATE.unpack(raw)
+                    tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+                else:
+                    tokens = self.capacity  # fresh file
+                state = [tokens]
+                yield state
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, _STATE.pack(state[0], now))
+            finally:
+                _unlock_file(self._fd)
+
+
+def _lock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    else:  # pragma: no cover - Windows
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:  # pragma: no cover - Windows
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class RateLimiter:
+    """Combined requests-per-minute and tokens-per-minute limit.
+
+    Either limit may be ``None`` (unlimited). A limiter with neither limit
+    never waits.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = TokenBucket.per_minute(rpm) if rpm else None
+        self._tokens = TokenBucket.per_minute(tpm) if tpm else None
+
+    @classmethod
+    def shared(cls, directory: str | Path, rpm: Optional[float] = None, tpm: Optional[float] = None) -> "RateLimiter":
+        """Limiter whose buckets live in *directory*, shared by every process using it."""
+        limiter = cls()
+        limiter.rpm, limiter.tpm = rpm, tpm
+        directory = Path(directory)
+        limiter._requests = FileTokenBucket.per_minute(directory / "rpm.bucket", rpm) if rpm else None
+        limiter._tokens = FileTokenBucket.per_minute(directory / "tpm.bucket", tpm) if tpm else None
+        return limiter
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Reserve one request and *tokens* tokens; return the delay to honour."""
+        delay = self._requests.reserve(1) if self._requests is not None else 0.0
+        if self._tokens is not None and tokens:
+            delay = max(delay, self._tokens.reserve(tokens))
+        return delay
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block the calling thread until the request may be sent."""
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+    async def wait(self, tokens: int = 0) -> None:
+        """Asynchronous version of :meth:`acquire`."""
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Correct a token reservation once the real usage is known."""
+        if self._tokens is not None and estimated > actual:
+            self._tokens.refund(estimated - actual)
+        elif self._tokens is not None and actual > estimated:
+            self._tokens.reserve(actual - estimated)
@@ -0,0 +1,42 @@
+"""Thread-safe mailbox for handing generation results to the GUI thread.
+
+Worker threads :meth:`UpdateQueue.put` results as they finish; the GUI drains
+the queue on a timer and applies everything that arrived since the last tick
+in one batch. The cost of updating the view therefore depends on the timer
+interval, not on how fast results come in.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+__all__ = ["UpdateQueue", "DRAIN_INTERVAL_MS"]
+
+K = TypeVar("K", bound=Hashable)
+
+DRAIN_INTERVAL_MS = 75
+
+
+class UpdateQueue(Generic[K]):
+    """Coalescing queue of ``key -> value`` updates plus a latest status line."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: Dict[K, str] = {}
+        self._status: Optional[str] = None
+
+    def put(self, key: K, value: str) -> None:
+        """Queue *value* for *key*; a newer value for the same key replaces it."""
+        with self._lock:
+            self._pending[key] = value
+
+    def put_status(self, text: str) -> None:
+        with self._lock:
+            self._status = text
+
+    def drain(self) -> Tuple[Dict[K, str], Optional[str]]:
+        """Return and clear everything queued since the previous call."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            status, self._status = self._status, None
+        return pending, status
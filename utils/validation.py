@@ -1,8 +1,62 @@
-"""Validation helpers for spreadsheet rows."""
+"""Validation helpers for spreadsheet rows.
 
-__all__ = ["row_is_complete"]
+:func:`row_is_complete` checks a single row; :func:`pending_mask` computes the
+same rule for a whole DataFrame at once and is what the front ends use to find
+rows that still need an advertisement.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+__all__ = ["row_is_complete", "filled_mask", "pending_mask"]
+
+
+def _is_blank(value: object) -> bool:
+    # ``value != value`` is only true for NaN, which pandas uses for empty cells.
+    return value is None or value != value or not str(value).strip()  # pylint: disable=comparison-with-itself
 
 
 def row_is_complete(name: str, description: str) -> bool:
     """Return True if both name and description are non-empty strings."""
-    return bool(str(name).strip()) and bool(str(description).strip())
+    return not _is_blank(name) and not _is_blank(description)
+
+
+def filled_mask(column: pd.Series) -> pd.Series:
+    """Return a boolean Series that is True where *column* holds non-blank text.
+
+    Missing values (``None``/``NaN``/``<NA>``) count as blank. Categorical
+    columns are evaluated once per category rather than once per row.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        per_category = filled_mask(pd.Series(column.cat.categories)).to_numpy()
+        codes = column.cat.codes.to_numpy()
+        if not len(per_category):
+            return pd.Series(False, index=column.index)
+        return pd.Series((codes >= 0) & per_category[codes.clip(min=0)], index=column.index)
+    text = column.astype("string").str.strip()
+    return text.str.len().fillna(0).gt(0).astype(bool)
+
+
+def pending_mask(
+    df: pd.DataFrame,
+    *,
+    max_name_length: Optional[int] = None,
+    max_description_length: Optional[int] = None,
+) -> pd.Series:
+    """Return a mask of rows that are eligible for ad generation.
+
+    A row is eligible when its name and description are non-blank, its ``ad``
+    cell is blank and, if limits are given, neither input exceeds them.
+    """
+    mask = filled_mask(df["name"]) & filled_mask(df["description"])
+    if "ad" in df.columns:
+        mask &= ~filled_mask(df["ad"])
+    if max_name_length is not None:
+        mask &= df["name"].astype("string").str.len().fillna(0).le(max_name_length)
+    if max_description_length is not None:
+        mask &= df["description"].astype("string").str.len().fillna(0).le(max_description_length)
+    return mask